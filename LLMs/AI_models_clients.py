@@ -1,14 +1,22 @@
 # AI_models_clients.py
 import base64
-import time
 import os
 import sys
-from openai import OpenAI
-from config import OPENAI_API_KEY, STATIC_DIR
+from config import STATIC_DIR
 from helpers.Manage_Json_files import JSONManager
+from LLMs.response_cache import cached_response
+from LLMs.client_pool import get_openai_client
+from LLMs.rate_limiter import estimate_tokens, get_rate_limiter
+
+def total_tokens_used(response):
+    return response.usage.total_tokens
+
+def rewound(audio_file):
+    # A retried upload has to send the file from its start again
+    if hasattr(audio_file, "seek"):
+        audio_file.seek(0)
+    return audio_file
 
-# Declare openai_client at the module level
-openai_client = None
 def get_base_path():
     """Determine and return the base path for application data."""
     if getattr(sys, 'frozen', False):
@@ -21,32 +29,26 @@ def get_base_path():
         base_path = os.path.abspath(os.path.join(current_dir, os.pardir))
         return base_path
 
-def initialize_openai_client():
-    global openai_client
-    if OPENAI_API_KEY:
-        openai_client = OpenAI(api_key=OPENAI_API_KEY)
-    else:
-        print("API key is not set. Please ensure the API key is correctly saved.")
-        openai_client = None
-
-
+@cached_response("gpt-4o-2024-08-06", temperature=0.1, max_tokens=16300)
 def generate_text(system_context, assistant_context, initial_prompt):
-    if not openai_client:
-        initialize_openai_client()
+    openai_client = get_openai_client()
     if not openai_client:
         # If the OpenAI client is not initialized, return a placeholder message or perform another fallback behavior
         return "OpenAI client is not initialized. Please set the OpenAI API key in User Preferences.", 0
 
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-2024-08-06",
-            temperature=0.1,
-            max_tokens=16300,
-            messages=[
-                {"role": "system", "content": system_context},
-                {"role": "assistant", "content": assistant_context},
-                {"role": "user", "content": initial_prompt}
-            ]
+        response = get_rate_limiter("gpt-4o-2024-08-06").call(
+            lambda: openai_client.chat.completions.create(
+                model="gpt-4o-2024-08-06",
+                temperature=0.1,
+                max_tokens=16300,
+                messages=[
+                    {"role": "system", "content": system_context},
+                    {"role": "assistant", "content": assistant_context},
+                    {"role": "user", "content": initial_prompt}
+                ]
+            ),
+            estimate_tokens(system_context, assistant_context, initial_prompt, max_tokens=16300), total_tokens_used
         )
 
         # Print total token consumption
@@ -60,23 +62,80 @@ def generate_text(system_context, assistant_context, initial_prompt):
         JSONManager.log_event('generate_text', error_message)
         return f"An error occurred while generating text: {e}. Please check the OpenAI API key and try again.", 0
 
-def generate_text_mini(system_context, assistant_context, initial_prompt):
+@cached_response("gpt-4o-2024-08-06", temperature=0.1, max_tokens=16300)
+def generate_text_stream(system_context, assistant_context, initial_prompt, model="gpt-4o-2024-08-06"):
+    """
+    Streams a completion like generate_text, yielding pieces of text as the model produces them.
+
+    The generator's return value (StopIteration.value) is (content, total tokens, error): error is None on
+    success, otherwise the error message, with the content received before the failure. Errors are never
+    yielded as text. Only opening the stream is rate limited and retried.
+    """
+    openai_client = get_openai_client()
     if not openai_client:
-        initialize_openai_client()
+        return "", 0, "OpenAI client is not initialized. Please set the OpenAI API key in User Preferences."
+
+    limiter = get_rate_limiter(model)
+    estimated_tokens = estimate_tokens(system_context, assistant_context, initial_prompt, max_tokens=16300)
+    parts = []
+    total_tokens = 0
+    stream = None
+    try:
+        stream = limiter.call(
+            lambda: openai_client.chat.completions.create(
+                model=model,
+                temperature=0.1,
+                max_tokens=16300,
+                stream=True,
+                stream_options={"include_usage": True},
+                messages=[
+                    {"role": "system", "content": system_context},
+                    {"role": "assistant", "content": assistant_context},
+                    {"role": "user", "content": initial_prompt}
+                ]
+            ),
+            estimated_tokens
+        )
+        for chunk in stream:
+            # The last chunk carries the usage and no choices
+            if chunk.usage is not None:
+                total_tokens = chunk.usage.total_tokens
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield parts[-1]
+        JSONManager.log_event('generate_text_stream', f"Total tokens used: {total_tokens}")
+        return "".join(parts), total_tokens, None
+
+    except Exception as e:
+        error_message = f"An error occurred while generating text: {e}"
+        JSONManager.log_event('generate_text_stream', error_message)
+        return "".join(parts), total_tokens, error_message
+    finally:
+        # Also when the stream breaks off or is abandoned: the usage reported so far (0 if none) replaces
+        # the reservation. A stream that never opened was settled by the limiter already
+        if stream is not None:
+            limiter.settle(estimated_tokens, total_tokens)
+
+@cached_response("gpt-4o-mini", temperature=0.1, max_tokens=16300)
+def generate_text_mini(system_context, assistant_context, initial_prompt):
+    openai_client = get_openai_client()
     if not openai_client:
         # If the OpenAI client is not initialized, return a placeholder message or perform another fallback behavior
         return "OpenAI client is not initialized. Please set the OpenAI API key in User Preferences.", 0
 
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            temperature=0.1,
-            max_tokens=16300,
-            messages=[
-                {"role": "system", "content": system_context},
-                {"role": "assistant", "content": assistant_context},
-                {"role": "user", "content": initial_prompt}
-            ]
+        response = get_rate_limiter("gpt-4o-mini").call(
+            lambda: openai_client.chat.completions.create(
+                model="gpt-4o-mini",
+                temperature=0.1,
+                max_tokens=16300,
+                messages=[
+                    {"role": "system", "content": system_context},
+                    {"role": "assistant", "content": assistant_context},
+                    {"role": "user", "content": initial_prompt}
+                ]
+            ),
+            estimate_tokens(system_context, assistant_context, initial_prompt, max_tokens=16300), total_tokens_used
         )
 
         # Print total token consumption
@@ -90,24 +149,27 @@ def generate_text_mini(system_context, assistant_context, initial_prompt):
         JSONManager.log_event('generate_text', error_message)
         return f"An error occurred while generating text: {e}. Please check the OpenAI API key and try again.", 0
 
+@cached_response("gpt-4o-mini", temperature=0.1, max_tokens=16300, response_format="json_object")
 def generate_text_mini_json(system_context, assistant_context, initial_prompt):
-    if not openai_client:
-        initialize_openai_client()
+    openai_client = get_openai_client()
     if not openai_client:
         # If the OpenAI client is not initialized, return a placeholder message or perform another fallback behavior
         return "OpenAI client is not initialized. Please set the OpenAI API key in User Preferences.", 0
 
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            temperature=0.1,
-            max_tokens=16300,
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": system_context},
-                {"role": "assistant", "content": assistant_context},
-                {"role": "user", "content": initial_prompt}
-            ]
+        response = get_rate_limiter("gpt-4o-mini").call(
+            lambda: openai_client.chat.completions.create(
+                model="gpt-4o-mini",
+                temperature=0.1,
+                max_tokens=16300,
+                response_format={"type": "json_object"},
+                messages=[
+                    {"role": "system", "content": system_context},
+                    {"role": "assistant", "content": assistant_context},
+                    {"role": "user", "content": initial_prompt}
+                ]
+            ),
+            estimate_tokens(system_context, assistant_context, initial_prompt, max_tokens=16300), total_tokens_used
         )
 
         # Print total token consumption
@@ -122,18 +184,16 @@ def generate_text_mini_json(system_context, assistant_context, initial_prompt):
         return f"An error occurred while generating text: {e}. Please check the OpenAI API key and try again.", 0
 
 
+@cached_response("gpt-4o-2024-08-06", temperature=0.1, max_tokens=15000, response_format="json_object")
 def generate_text_json(system_context, assistant_context, initial_prompt):
-    initialize_openai_client()
+    openai_client = get_openai_client()
     if not openai_client:
         return "OpenAI client is not initialized. Please set the OpenAI API key in User Preferences."
 
-    retries = 0
-    max_retries = 10  # Retry up to 10 times
-    retry_delay = 6  # Wait for 6 seconds before retrying
-
-    while retries < max_retries:
-        try:
-            response = openai_client.chat.completions.create(
+    try:
+        # Rate limits are waited out and retried by the limiter
+        response = get_rate_limiter("gpt-4o-2024-08-06").call(
+            lambda: openai_client.chat.completions.create(
                 model="gpt-4o-2024-08-06",
                 temperature=0.1,
                 max_tokens=15000,
@@ -143,87 +203,63 @@ def generate_text_json(system_context, assistant_context, initial_prompt):
                     {"role": "assistant", "content": assistant_context},
                     {"role": "user", "content": initial_prompt}
                 ]
-            )
-
-            total_tokens = response.usage.total_tokens
-            JSONManager.log_event('generate_text_json', f"Total tokens used: {total_tokens}")
-
-            return response.choices[0].message.content, total_tokens
+            ),
+            estimate_tokens(system_context, assistant_context, initial_prompt, max_tokens=15000), total_tokens_used
+        )
 
-        except Exception as e:
-            error_message = str(e)
-            JSONManager.log_event('generate_text_json', f"Error occurred: {error_message}")
+        total_tokens = response.usage.total_tokens
+        JSONManager.log_event('generate_text_json', f"Total tokens used: {total_tokens}")
 
-            if "rate limit" in error_message.lower():
-                retries += 1
-                JSONManager.log_event('rate_limit_retry', f"Rate limit error. Retrying {retries}/{max_retries} after {retry_delay} seconds.")
-                time.sleep(retry_delay)
-            else:
-                JSONManager.log_event('generate_text_json', f"Non-retryable error: {error_message}")
-                return f"An error occurred: {error_message}", 0
+        return response.choices[0].message.content, total_tokens
 
-    # If max retries are exhausted
-    final_error_message = "Rate limit exceeded. Please try again later."
-    JSONManager.log_event('generate_text_json', final_error_message)
-    return final_error_message, 0
+    except Exception as e:
+        error_message = str(e)
+        JSONManager.log_event('generate_text_json', f"Error occurred: {error_message}")
+        return f"An error occurred: {error_message}", 0
 
 
 def generate_text_json_o1(system_context, assistant_context, initial_prompt, model="o1-mini"):
     print("werre in")
-    initialize_openai_client()
+    openai_client = get_openai_client()
     if not openai_client:
         return "OpenAI client is not initialized. Please set the OpenAI API key in User Preferences."
 
-    retries = 0
-    max_retries = 10  # Retry up to 10 times
-    retry_delay = 6  # Wait for 6 seconds before retrying
-
     model_name = model
 
-    while retries < max_retries:
-        try:
-            # Check if the model supports the 'system' role
-            models_without_system_role = ["o1-mini", "o1-preview"]  # Add other user_model if necessary
-            if model_name in models_without_system_role:
-                # Append system context to assistant context
-                combined_assistant_context = f"{system_context}\n\n{assistant_context}"
-                messages = [
-                    {"role": "assistant", "content": combined_assistant_context},
-                    {"role": "user", "content": initial_prompt}
-                ]
-            else:
-                messages = [
-                    {"role": "system", "content": system_context},
-                    {"role": "assistant", "content": assistant_context},
-                    {"role": "user", "content": initial_prompt}
-                ]
+    try:
+        # Check if the model supports the 'system' role
+        models_without_system_role = ["o1-mini", "o1-preview"]  # Add other user_model if necessary
+        if model_name in models_without_system_role:
+            # Append system context to assistant context
+            combined_assistant_context = f"{system_context}\n\n{assistant_context}"
+            messages = [
+                {"role": "assistant", "content": combined_assistant_context},
+                {"role": "user", "content": initial_prompt}
+            ]
+        else:
+            messages = [
+                {"role": "system", "content": system_context},
+                {"role": "assistant", "content": assistant_context},
+                {"role": "user", "content": initial_prompt}
+            ]
 
-            response = openai_client.chat.completions.create(
+        response = get_rate_limiter(model_name).call(
+            lambda: openai_client.chat.completions.create(
                 model=model_name,
                 messages=messages
-            )
-
-            total_tokens = response.usage.total_tokens
-            JSONManager.log_event('generate_text_json', f"Total tokens used: {total_tokens}")
-
-            return response.choices[0].message.content, total_tokens
+            ),
+            estimate_tokens(system_context, assistant_context, initial_prompt), total_tokens_used
+        )
 
-        except Exception as e:
-            error_message = str(e)
-            JSONManager.log_event('generate_text_json', f"Error occurred: {error_message}")
+        total_tokens = response.usage.total_tokens
+        JSONManager.log_event('generate_text_json', f"Total tokens used: {total_tokens}")
 
-            if "rate limit" in error_message.lower():
-                retries += 1
-                JSONManager.log_event('rate_limit_retry', f"Rate limit error. Retrying {retries}/{max_retries} after {retry_delay} seconds.")
-                time.sleep(retry_delay)
-            else:
-                JSONManager.log_event('generate_text_json', f"Non-retryable error: {error_message}")
-                return f"An error occurred: {error_message}", 0
+        return response.choices[0].message.content, total_tokens
 
-    # If max retries are exhausted
-    final_error_message = "Rate limit exceeded. Please try again later."
-    JSONManager.log_event('generate_text_json', final_error_message)
-    return final_error_message, 0
+    except Exception as e:
+        error_message = str(e)
+        JSONManager.log_event('generate_text_json', f"Error occurred: {error_message}")
+        return f"An error occurred: {error_message}", 0
 
 
 
@@ -233,53 +269,59 @@ def encode_image(image_path):
         return base64.b64encode(image_file.read()).decode("utf-8")
 
 def vision(image_path, system_context, assistant_context, initial_prompt):
-    initialize_openai_client()
+    openai_client = get_openai_client()
     if not openai_client:
         return "OpenAI client is not initialized. Please set the OpenAI API key in User Preferences."
 
     base64_image = encode_image(image_path)
 
-    response = openai_client.chat.completions.create(
-        model="gpt-4o",
-        temperature=0.2,
-        max_tokens=4096,
-        response_format={"type": "json_object"},
-        messages=[
-            {"role": "system", "content": system_context},
-            {"role": "assistant", "content": assistant_context},
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": f"{initial_prompt}"},
-                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}}
-                ]
-            }
-        ]
+    response = get_rate_limiter("gpt-4o").call(
+        lambda: openai_client.chat.completions.create(
+            model="gpt-4o",
+            temperature=0.2,
+            max_tokens=4096,
+            response_format={"type": "json_object"},
+            messages=[
+                {"role": "system", "content": system_context},
+                {"role": "assistant", "content": assistant_context},
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": f"{initial_prompt}"},
+                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}}
+                    ]
+                }
+            ]
+        ),
+        estimate_tokens(system_context, assistant_context, initial_prompt, max_tokens=4096)
     )
     return response.choices[0].message.content
 
 def vision_text(image_path, system_context, assistant_context, initial_prompt):
-    initialize_openai_client()
+    openai_client = get_openai_client()
     if not openai_client:
         return "OpenAI client is not initialized. Please set the OpenAI API key in User Preferences."
 
     base64_image = encode_image(image_path)
 
-    response = openai_client.chat.completions.create(
-        model="gpt-4o",
-        temperature=0.2,
-        max_tokens=4096,
-        messages=[
-            {"role": "system", "content": system_context},
-            {"role": "assistant", "content": assistant_context},
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": f"{initial_prompt}"},
-                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}}
-                ]
-            }
-        ]
+    response = get_rate_limiter("gpt-4o").call(
+        lambda: openai_client.chat.completions.create(
+            model="gpt-4o",
+            temperature=0.2,
+            max_tokens=4096,
+            messages=[
+                {"role": "system", "content": system_context},
+                {"role": "assistant", "content": assistant_context},
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": f"{initial_prompt}"},
+                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}}
+                    ]
+                }
+            ]
+        ),
+        estimate_tokens(system_context, assistant_context, initial_prompt, max_tokens=4096)
     )
     return response.choices[0].message.content
 
@@ -292,7 +334,7 @@ def text_to_speech(text, output_path):
     """
 
 
-    initialize_openai_client()
+    openai_client = get_openai_client()
     if not openai_client:
         # If the OpenAI client is not initialized, return a placeholder message or perform another fallback behavior
         return "OpenAI client is not initialized. Please set the OpenAI API key in User Preferences."
@@ -308,10 +350,12 @@ def text_to_speech(text, output_path):
     audio_file_path = output_path
 
     # Generate the audio speech
-    response = openai_client.audio.speech.create(
-        model="tts-1",
-        voice="onyx",
-        input=text
+    response = get_rate_limiter("tts-1").call(
+        lambda: openai_client.audio.speech.create(
+            model="tts-1",
+            voice="onyx",
+            input=text
+        )
     )
 
     # Save the audio file to the specified path
@@ -319,17 +363,32 @@ def text_to_speech(text, output_path):
 
     return audio_file_path
 
-def transcribe_voice_to_text(audio_file_path):
-    initialize_openai_client()
+def transcribe_voice_to_text(audio_file):
+    """
+       Transcribes speech to text with Whisper.
+       :param audio_file: Path to an audio file, or an open/in-memory file object with a `name` (e.g. BytesIO)
+    """
+    openai_client = get_openai_client()
     if not openai_client:
         raise Exception("OpenAI client is not initialized. Please set the OpenAI API key in User Preferences.")
     try:
-        with open(audio_file_path, "rb") as audio_file:
-            transcript = openai_client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                response_format="text"
+        if hasattr(audio_file, "read"):
+            transcript = get_rate_limiter("whisper-1").call(
+                lambda: openai_client.audio.transcriptions.create(
+                    model="whisper-1",
+                    file=rewound(audio_file),
+                    response_format="text"
+                )
             )
+        else:
+            with open(audio_file, "rb") as audio_file_handle:
+                transcript = get_rate_limiter("whisper-1").call(
+                    lambda: openai_client.audio.transcriptions.create(
+                        model="whisper-1",
+                        file=rewound(audio_file_handle),
+                        response_format="text"
+                    )
+                )
         print("API Response:", transcript)  # Print the response to verify
 
         return transcript  # Directly return the transcript
@@ -338,7 +397,7 @@ def transcribe_voice_to_text(audio_file_path):
 
 
 def text_to_speech_file(input_text, filename="InitialGreeting.mp3"):
-    initialize_openai_client()
+    openai_client = get_openai_client()
     if not openai_client:
         return "OpenAI client is not initialized. Please set the OpenAI API key in User Preferences."
 
@@ -356,10 +415,12 @@ def text_to_speech_file(input_text, filename="InitialGreeting.mp3"):
     audio_file_path = os.path.join(static_dir, filename)
 
     # Generate the audio speech
-    response = openai_client.audio.speech.create(
-        model="tts-1",
-        voice="onyx",
-        input=input_text
+    response = get_rate_limiter("tts-1").call(
+        lambda: openai_client.audio.speech.create(
+            model="tts-1",
+            voice="onyx",
+            input=input_text
+        )
     )
 
     # Save the response content directly to a file
@@ -0,0 +1,335 @@
+# AI_models_clients_async.py
+"""
+asyncio versions of the calls in LLMs.AI_models_clients, with the same arguments, models and results.
+
+They run on one event loop instead of one thread per request, so a single thread can keep many requests
+in flight, e.g. the analyses of several meetings at once:
+
+    results = run_bounded(lambda prompt: generate_text(*prompt), prompts, limit=32)
+
+Each event loop gets its own pooled AsyncOpenAI client (see LLMs.client_pool).
+"""
+import asyncio
+import os
+from config import STATIC_DIR
+from helpers.Manage_Json_files import JSONManager
+from LLMs.AI_models_clients import encode_image, get_base_path, rewound, total_tokens_used
+from LLMs.response_cache import cached_response
+from LLMs.client_pool import ASYNC_POOL_LIMITS, close_async_clients, get_async_openai_client
+from LLMs.rate_limiter import estimate_tokens, get_rate_limiter
+
+NOT_INITIALIZED = "OpenAI client is not initialized. Please set the OpenAI API key in User Preferences."
+
+
+async def gather_bounded(awaitables, limit=None, return_exceptions=False):
+    """
+    Awaits every awaitable with at most `limit` running at once and returns their results in order.
+
+    Args:
+        awaitables (iterable): Coroutines or futures, e.g. [generate_text(...), ...].
+        limit (int): Concurrency cap; defaults to the async connection pool size.
+        return_exceptions (bool): Return exceptions in place of results instead of raising the first one.
+    """
+    semaphore = asyncio.Semaphore(limit or ASYNC_POOL_LIMITS['max_connections'])
+
+    async def bounded(awaitable):
+        async with semaphore:
+            return await awaitable
+
+    return await asyncio.gather(*(bounded(a) for a in awaitables), return_exceptions=return_exceptions)
+
+
+async def map_bounded(function, items, limit=None, return_exceptions=False):
+    """
+    Calls the coroutine function `function` on every item, at most `limit` at once, and returns the results
+    in order. Unlike gather_bounded, coroutines are only created once a slot is free.
+    """
+    semaphore = asyncio.Semaphore(limit or ASYNC_POOL_LIMITS['max_connections'])
+
+    async def bounded(item):
+        async with semaphore:
+            return await function(item)
+
+    return await asyncio.gather(*(bounded(item) for item in items), return_exceptions=return_exceptions)
+
+
+def run_bounded(function, items, limit=None, return_exceptions=False):
+    """
+    Runs map_bounded on a new event loop from synchronous code and closes the loop's clients afterwards.
+
+    Takes the coroutine function and its items rather than coroutines, so every coroutine is created on
+    the loop that awaits it and none is left unawaited when a call fails.
+    """
+    async def main():
+        try:
+            return await map_bounded(function, items, limit, return_exceptions)
+        finally:
+            await close_async_clients()
+
+    return asyncio.run(main())
+
+
+async def _chat_text(name, model, system_context, assistant_context, initial_prompt, json_mode=False):
+    # generate_text, generate_text_mini and generate_text_mini_json only differ in model and format
+    openai_client = get_async_openai_client()
+    if not openai_client:
+        return NOT_INITIALIZED, 0
+
+    try:
+        response = await get_rate_limiter(model).call_async(
+            lambda: openai_client.chat.completions.create(
+                model=model,
+                temperature=0.1,
+                max_tokens=16300,
+                **({'response_format': {"type": "json_object"}} if json_mode else {}),
+                messages=[
+                    {"role": "system", "content": system_context},
+                    {"role": "assistant", "content": assistant_context},
+                    {"role": "user", "content": initial_prompt}
+                ]
+            ),
+            estimate_tokens(system_context, assistant_context, initial_prompt, max_tokens=16300), total_tokens_used
+        )
+
+        total_tokens = response.usage.total_tokens
+        JSONManager.log_event(name, f"Total tokens used: {total_tokens}")
+
+        return response.choices[0].message.content, total_tokens
+
+    except Exception as e:
+        JSONManager.log_event(name, f"An error occurred while generating text: {e}")
+        return f"An error occurred while generating text: {e}. Please check the OpenAI API key and try again.", 0
+
+
+@cached_response("gpt-4o-2024-08-06", temperature=0.1, max_tokens=16300)
+async def generate_text(system_context, assistant_context, initial_prompt):
+    return await _chat_text('generate_text', "gpt-4o-2024-08-06", system_context, assistant_context, initial_prompt)
+
+
+async def generate_text_stream(system_context, assistant_context, initial_prompt, model="gpt-4o-2024-08-06"):
+    """
+    Async generator version of AI_models_clients.generate_text_stream. Async generators cannot return a
+    value, so the total token count is only logged, and errors are logged and raised rather than returned.
+    """
+    openai_client = get_async_openai_client()
+    if not openai_client:
+        raise RuntimeError(NOT_INITIALIZED)
+
+    limiter = get_rate_limiter(model)
+    estimated_tokens = estimate_tokens(system_context, assistant_context, initial_prompt, max_tokens=16300)
+    total_tokens = 0
+    stream = None
+    try:
+        stream = await limiter.call_async(
+            lambda: openai_client.chat.completions.create(
+                model=model,
+                temperature=0.1,
+                max_tokens=16300,
+                stream=True,
+                stream_options={"include_usage": True},
+                messages=[
+                    {"role": "system", "content": system_context},
+                    {"role": "assistant", "content": assistant_context},
+                    {"role": "user", "content": initial_prompt}
+                ]
+            ),
+            estimated_tokens
+        )
+        async for chunk in stream:
+            if chunk.usage is not None:
+                total_tokens = chunk.usage.total_tokens
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+        JSONManager.log_event('generate_text_stream', f"Total tokens used: {total_tokens}")
+
+    except Exception as e:
+        JSONManager.log_event('generate_text_stream', f"An error occurred while generating text: {e}")
+        raise
+    finally:
+        # Also when the stream breaks off: the usage reported so far (0 if none) replaces the reservation
+        if stream is not None:
+            limiter.settle(estimated_tokens, total_tokens)
+
+
+@cached_response("gpt-4o-mini", temperature=0.1, max_tokens=16300)
+async def generate_text_mini(system_context, assistant_context, initial_prompt):
+    return await _chat_text('generate_text', "gpt-4o-mini", system_context, assistant_context, initial_prompt)
+
+
+@cached_response("gpt-4o-mini", temperature=0.1, max_tokens=16300, response_format="json_object")
+async def generate_text_mini_json(system_context, assistant_context, initial_prompt):
+    return await _chat_text(
+        'generate_text', "gpt-4o-mini", system_context, assistant_context, initial_prompt, json_mode=True
+    )
+
+
+async def _chat_json(name, model, create, tokens):
+    # Rate limits are waited out and retried by the limiter
+    try:
+        response = await get_rate_limiter(model).call_async(create, tokens, total_tokens_used)
+
+        total_tokens = response.usage.total_tokens
+        JSONManager.log_event(name, f"Total tokens used: {total_tokens}")
+
+        return response.choices[0].message.content, total_tokens
+
+    except Exception as e:
+        error_message = str(e)
+        JSONManager.log_event(name, f"Error occurred: {error_message}")
+        return f"An error occurred: {error_message}", 0
+
+
+@cached_response("gpt-4o-2024-08-06", temperature=0.1, max_tokens=15000, response_format="json_object")
+async def generate_text_json(system_context, assistant_context, initial_prompt):
+    openai_client = get_async_openai_client()
+    if not openai_client:
+        return NOT_INITIALIZED
+
+    return await _chat_json(
+        'generate_text_json', "gpt-4o-2024-08-06",
+        lambda: openai_client.chat.completions.create(
+            model="gpt-4o-2024-08-06",
+            temperature=0.1,
+            max_tokens=15000,
+            response_format={"type": "json_object"},
+            messages=[
+                {"role": "system", "content": system_context},
+                {"role": "assistant", "content": assistant_context},
+                {"role": "user", "content": initial_prompt}
+            ]
+        ),
+        estimate_tokens(system_context, assistant_context, initial_prompt, max_tokens=15000),
+    )
+
+
+async def generate_text_json_o1(system_context, assistant_context, initial_prompt, model="o1-mini"):
+    openai_client = get_async_openai_client()
+    if not openai_client:
+        return NOT_INITIALIZED
+
+    # o1-mini and o1-preview do not accept a system message
+    if model in ["o1-mini", "o1-preview"]:
+        messages = [
+            {"role": "assistant", "content": f"{system_context}\n\n{assistant_context}"},
+            {"role": "user", "content": initial_prompt}
+        ]
+    else:
+        messages = [
+            {"role": "system", "content": system_context},
+            {"role": "assistant", "content": assistant_context},
+            {"role": "user", "content": initial_prompt}
+        ]
+
+    return await _chat_json(
+        'generate_text_json', model,
+        lambda: openai_client.chat.completions.create(model=model, messages=messages),
+        estimate_tokens(system_context, assistant_context, initial_prompt),
+    )
+
+
+async def _vision(image_path, system_context, assistant_context, initial_prompt, json_mode):
+    openai_client = get_async_openai_client()
+    if not openai_client:
+        return NOT_INITIALIZED
+
+    base64_image = await asyncio.to_thread(encode_image, image_path)
+
+    response = await get_rate_limiter("gpt-4o").call_async(
+        lambda: openai_client.chat.completions.create(
+            model="gpt-4o",
+            temperature=0.2,
+            max_tokens=4096,
+            **({'response_format': {"type": "json_object"}} if json_mode else {}),
+            messages=[
+                {"role": "system", "content": system_context},
+                {"role": "assistant", "content": assistant_context},
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": f"{initial_prompt}"},
+                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}}
+                    ]
+                }
+            ]
+        ),
+        estimate_tokens(system_context, assistant_context, initial_prompt, max_tokens=4096)
+    )
+    return response.choices[0].message.content
+
+
+async def vision(image_path, system_context, assistant_context, initial_prompt):
+    return await _vision(image_path, system_context, assistant_context, initial_prompt, json_mode=True)
+
+
+async def vision_text(image_path, system_context, assistant_context, initial_prompt):
+    return await _vision(image_path, system_context, assistant_context, initial_prompt, json_mode=False)
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _write_file(path, content):
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+async def _speech_to_file(text, audio_file_path):
+    openai_client = get_async_openai_client()
+    if not openai_client:
+        return NOT_INITIALIZED
+
+    static_dir = os.path.dirname(audio_file_path)
+    if static_dir and not os.path.exists(static_dir):
+        os.makedirs(static_dir)
+
+    response = await get_rate_limiter("tts-1").call_async(
+        lambda: openai_client.audio.speech.create(
+            model="tts-1",
+            voice="onyx",
+            input=text
+        )
+    )
+
+    # File writes happen off the event loop
+    await asyncio.to_thread(_write_file, audio_file_path, response.content)
+
+    return audio_file_path
+
+
+async def text_to_speech(text, output_path):
+    """
+    Converts text to speech and saves the audio to `output_path`.
+    """
+    if not os.path.exists(STATIC_DIR):
+        os.makedirs(STATIC_DIR)
+    return await _speech_to_file(text, output_path)
+
+
+async def text_to_speech_file(input_text, filename="InitialGreeting.mp3"):
+    """
+    Converts text to speech and saves the audio as `filename` in the application's static folder.
+    """
+    return await _speech_to_file(input_text, os.path.join(get_base_path(), 'static', filename))
+
+
+async def transcribe_voice_to_text(audio_file):
+    """
+    Transcribes speech to text with Whisper.
+    :param audio_file: Path to an audio file, or an open/in-memory file object with a `name` (e.g. BytesIO)
+    """
+    openai_client = get_async_openai_client()
+    if not openai_client:
+        raise Exception(NOT_INITIALIZED)
+    if hasattr(audio_file, "read"):
+        upload = audio_file
+    else:
+        upload = (os.path.basename(audio_file), await asyncio.to_thread(_read_file, audio_file))
+    return await get_rate_limiter("whisper-1").call_async(
+        lambda: openai_client.audio.transcriptions.create(
+            model="whisper-1",
+            file=rewound(upload),
+            response_format="text"
+        )
+    )
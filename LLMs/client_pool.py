@@ -0,0 +1,268 @@
+# client_pool.py
+import asyncio
+import threading
+import time
+import weakref
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from config import OPENAI_API_KEY
+from helpers.Manage_Json_files import JSONManager
+
+# Keep-alive pool shared by every request of a client. max_connections should cover the workers that call
+# the API at the same time; requests beyond it wait for a free connection instead of opening another.
+POOL_LIMITS = {
+    'max_connections': 16,
+    'max_keepalive_connections': 16,
+    'keepalive_expiry': 60.0,  # seconds an idle connection is kept open
+}
+# Async clients keep many more requests in flight from a single thread
+ASYNC_POOL_LIMITS = {
+    'max_connections': 64,
+    'max_keepalive_connections': 64,
+    'keepalive_expiry': 60.0,
+}
+
+_lock = threading.Lock()
+_clients = {}  # api key -> OpenAI
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> {api key -> AsyncOpenAI}
+_transports = weakref.WeakSet()  # transports of the open clients; a client dropped unclosed takes its own along
+# Counts of the transports already closed, so the stats cover every client created
+_closed = {'requests': 0, 'new_connections': 0, 'reused': 0, 'tls_handshakes': 0, 'errors': 0, 'connect_total': 0.0,
+           'clients': 0}
+
+
+def _retire(transport):
+    # Folds a closed transport's counts into _closed and stops tracking it
+    stats = transport.stats()
+    with _lock:
+        if transport not in _transports:
+            return
+        _transports.discard(transport)
+        for key in ('requests', 'new_connections', 'reused', 'tls_handshakes', 'errors'):
+            _closed[key] += stats[key]
+        _closed['connect_total'] += stats['connect_avg'] * stats['new_connections']
+        _closed['clients'] += 1
+
+
+class PoolStatsTransport(httpx.BaseTransport):
+    """
+    httpx transport that counts how many requests reuse a pooled connection.
+
+    Wraps the regular HTTPTransport and listens to httpcore's trace events: a request that opens a new
+    connection emits a TCP connect (and a TLS handshake), a request served by a kept-alive connection
+    does not.
+    """
+
+    def __init__(self, limits):
+        """
+        Args:
+            limits (httpx.Limits): Pool size and keep-alive expiry.
+        """
+        self.transport = self.make_transport(limits)
+        self.requests = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+        self.connect_total = 0.0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def make_transport(self, limits):
+        return httpx.HTTPTransport(limits=limits)
+
+    def count_event(self, event, started):
+        if event in ('connection.connect_tcp.started', 'connection.start_tls.started'):
+            started[event] = time.perf_counter()
+        elif event == 'connection.connect_tcp.complete':
+            with self._lock:
+                self.connections += 1
+                self.connect_total += time.perf_counter() - started['connection.connect_tcp.started']
+        elif event == 'connection.start_tls.complete':
+            with self._lock:
+                self.tls_handshakes += 1
+                self.connect_total += time.perf_counter() - started['connection.start_tls.started']
+
+    def count_request(self, failed=False):
+        # Only requests that got a response count towards reuse; failures are counted apart
+        with self._lock:
+            self.requests += int(not failed)
+            self.errors += int(failed)
+
+    def handle_request(self, request):
+        started = {}
+        upstream = request.extensions.get('trace')
+
+        def trace(event, info):
+            self.count_event(event, started)
+            if upstream is not None:
+                upstream(event, info)
+
+        request.extensions['trace'] = trace
+        try:
+            response = self.transport.handle_request(request)
+        except Exception:
+            self.count_request(failed=True)
+            raise
+        self.count_request()
+        return response
+
+    def close(self):
+        self.transport.close()
+        _retire(self)
+
+    def stats(self):
+        with self._lock:
+            reused = max(0, self.requests - self.connections)
+            return {
+                'requests': self.requests,
+                'new_connections': self.connections,
+                'reused': reused,
+                'reuse_rate': round(reused / self.requests, 3) if self.requests else 0,
+                'tls_handshakes': self.tls_handshakes,
+                'connect_avg': round(self.connect_total / self.connections, 4) if self.connections else 0,
+                'errors': self.errors,
+            }
+
+
+class AsyncPoolStatsTransport(PoolStatsTransport, httpx.AsyncBaseTransport):
+    """
+    PoolStatsTransport for httpx.AsyncClient.
+    """
+
+    def make_transport(self, limits):
+        return httpx.AsyncHTTPTransport(limits=limits)
+
+    async def handle_async_request(self, request):
+        started = {}
+        upstream = request.extensions.get('trace')
+
+        async def trace(event, info):
+            self.count_event(event, started)
+            if upstream is not None:
+                await upstream(event, info)
+
+        request.extensions['trace'] = trace
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception:
+            self.count_request(failed=True)
+            raise
+        self.count_request()
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+        _retire(self)
+
+
+def configure_client_pool(max_connections, max_keepalive_connections=None, keepalive_expiry=None, is_async=False):
+    """
+    Sizes the connection pool of the clients created from now on, e.g. to the number of worker threads, or
+    with `is_async` to the concurrency of the async calls.
+    """
+    limits = ASYNC_POOL_LIMITS if is_async else POOL_LIMITS
+    with _lock:
+        limits['max_connections'] = max_connections
+        limits['max_keepalive_connections'] = max_keepalive_connections or max_connections
+        if keepalive_expiry is not None:
+            limits['keepalive_expiry'] = keepalive_expiry
+        if _clients or len(_async_clients):
+            JSONManager.log_event("OpenAI Client", "Pool limits changed; they apply to clients created from now on.")
+
+
+def get_openai_client(api_key=None):
+    """
+    Returns the shared OpenAI client for `api_key` (the configured key by default), creating it on first use.
+
+    The client and its connection pool are created once and reused by every call and thread, so requests
+    after the first skip the TCP connect and TLS handshake.
+
+    Returns:
+        OpenAI: The client, or None if no API key is set.
+    """
+    api_key = api_key or OPENAI_API_KEY
+    if not api_key:
+        print("API key is not set. Please ensure the API key is correctly saved.")
+        return None
+    client = _clients.get(api_key)
+    if client is not None:
+        return client
+    with _lock:
+        if api_key not in _clients:
+            transport = PoolStatsTransport(httpx.Limits(**POOL_LIMITS))
+            _transports.add(transport)
+            # Retries are left to LLMs.rate_limiter, which also honours Retry-After across threads
+            _clients[api_key] = OpenAI(api_key=api_key, max_retries=0, http_client=httpx.Client(transport=transport))
+            JSONManager.log_event("OpenAI Client", f"Created the shared OpenAI client, pool limits {POOL_LIMITS}.")
+        return _clients[api_key]
+
+
+def get_async_openai_client(api_key=None):
+    """
+    Returns the shared AsyncOpenAI client for `api_key` on the running event loop, creating it on first use.
+
+    An async connection pool belongs to the event loop it was opened on, so each loop gets its own client;
+    it is dropped with the loop. Must be called from a coroutine.
+
+    Returns:
+        AsyncOpenAI: The client, or None if no API key is set.
+    """
+    api_key = api_key or OPENAI_API_KEY
+    if not api_key:
+        print("API key is not set. Please ensure the API key is correctly saved.")
+        return None
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        if api_key not in clients:
+            transport = AsyncPoolStatsTransport(httpx.Limits(**ASYNC_POOL_LIMITS))
+            _transports.add(transport)
+            clients[api_key] = AsyncOpenAI(
+                api_key=api_key, max_retries=0, http_client=httpx.AsyncClient(transport=transport)
+            )
+            JSONManager.log_event(
+                "OpenAI Client", f"Created an async OpenAI client for this event loop, pool limits {ASYNC_POOL_LIMITS}."
+            )
+        return clients[api_key]
+
+
+async def close_async_clients():
+    """
+    Closes the async clients of the running event loop. Call it before the loop finishes.
+    """
+    with _lock:
+        clients = list(_async_clients.pop(asyncio.get_running_loop(), {}).values())
+    for client in clients:
+        await client.close()
+
+
+def client_pool_stats():
+    """
+    Connection reuse of every client created so far (open and closed), added together.
+    """
+    with _lock:
+        transports = list(_transports)
+        totals = {key: _closed[key] for key in ('requests', 'new_connections', 'reused', 'tls_handshakes', 'errors')}
+        connect_total = _closed['connect_total']
+        closed_clients = _closed['clients']
+    for transport in transports:
+        stats = transport.stats()
+        for key in totals:
+            totals[key] += stats[key]
+        connect_total += stats['connect_avg'] * stats['new_connections']
+    totals['reuse_rate'] = round(totals['reused'] / totals['requests'], 3) if totals['requests'] else 0
+    totals['connect_avg'] = round(connect_total / totals['new_connections'], 4) if totals['new_connections'] else 0
+    totals['clients'] = len(transports)
+    totals['closed_clients'] = closed_clients
+    return totals
+
+
+def close_clients():
+    """
+    Closes every pooled connection. The next call creates a fresh client.
+    """
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+    JSONManager.log_event("OpenAI Client", f"Closed {len(clients)} OpenAI clients.")
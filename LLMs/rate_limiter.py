@@ -0,0 +1,295 @@
+# rate_limiter.py
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from config import LLM_RATE_LIMITS
+from helpers.Manage_Json_files import JSONManager
+
+# Completion tokens reserved per request before its actual usage is known (capped at its max_tokens)
+EXPECTED_COMPLETION_TOKENS = 1000
+
+RETRYABLE_STATUS = (408, 409, 429, 500, 502, 503, 504)
+RETRYABLE_ERRORS = ('APIConnectionError', 'APITimeoutError', 'RateLimitError', 'InternalServerError')
+
+
+def parse_rate_limits(text):
+    """
+    Parses "model=rpm:tpm" pairs separated by commas (config.LLM_RATE_LIMITS) into
+    {model: {'rpm', 'tpm'}}; a missing or empty rpm or tpm is unlimited.
+    """
+    limits = {}
+    for pair in text.split(','):
+        if not pair.strip():
+            continue
+        model, _, values = pair.partition('=')
+        rpm, _, tpm = values.partition(':')
+        limits[model.strip()] = {'rpm': int(rpm) if rpm.strip() else None, 'tpm': int(tpm) if tpm.strip() else None}
+    return limits
+
+
+# Requests and tokens per minute allowed per model. No limits unless configured: the account's limits
+# depend on its usage tier, and pacing to the wrong ones would queue calls the server would accept
+RATE_LIMITS = dict({'default': {'rpm': None, 'tpm': None}}, **parse_rate_limits(LLM_RATE_LIMITS))
+
+
+def estimate_tokens(*texts, max_tokens=0):
+    """
+    Rough token count of a request before it is sent: about four characters per token of prompt, plus a
+    typical completion (EXPECTED_COMPLETION_TOKENS, capped at `max_tokens`) rather than the whole budget,
+    which most answers come nowhere near. The limiter settles the difference once the usage is known.
+    """
+    prompt = sum(len(text) // 4 for text in texts if isinstance(text, str))
+    return prompt + min(max_tokens, EXPECTED_COMPLETION_TOKENS)
+
+
+def retry_after(error):
+    """
+    Seconds the server asked us to wait (Retry-After / retry-after-ms headers of the error's response), or None.
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        value = headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    # An exhausted quota is reported as a 429 but never clears by waiting
+    if getattr(error, 'code', None) == 'insufficient_quota':
+        return False
+    if getattr(error, 'status_code', None) in RETRYABLE_STATUS:
+        return True
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+
+class RateLimiter:
+    """
+    Client-side requests-per-minute and tokens-per-minute limiter with retries. Either limit may be None
+    (unlimited); with both unlimited, calls are only retried.
+
+    Both limits are token buckets that refill continuously and start full. A call reserves one request and
+    its estimated tokens up front; the buckets may go into debt, and the caller then waits until the debt
+    is paid off, so waiting callers are served in arrival order and each sleeps only once. Actual token
+    usage is settled afterwards with `settle`.
+
+    Failed calls that can succeed later (rate limits, timeouts, connection and server errors) are retried
+    with exponential backoff and full jitter, or after the server's Retry-After when it sends one; a
+    Retry-After also holds back every other call through this limiter for that long.
+    """
+
+    def __init__(self, rpm, tpm=None, max_retries=6, base_delay=1.0, max_delay=60.0, name='default'):
+        """
+        Args:
+            rpm (int): Requests per minute; None for no request limit.
+            tpm (int): Tokens per minute; None for calls limited by requests only.
+            max_retries (int): Retries of one call before its error is raised.
+            base_delay (float): Backoff before the first retry, in seconds; doubles with every retry.
+            max_delay (float): Cap on a single backoff.
+            name (str): Model name, for the log.
+        """
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.requests_available = float(rpm or 0)
+        self.tokens_available = float(tpm or 0)
+        self.blocked_until = 0.0
+        self.updated = time.monotonic()
+        self.calls = 0
+        self.queued = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.retries = 0
+        self.retry_wait_total = 0.0
+        self.server_throttled = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=0):
+        """
+        Takes one request and `tokens` tokens from the buckets.
+
+        Returns:
+            float: Seconds the caller must wait before sending the request.
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self.updated
+            self.updated = now
+            wait = 0.0
+            if self.rpm:
+                self.requests_available = min(self.rpm, self.requests_available + elapsed * self.rpm / 60)
+                self.requests_available -= 1
+                wait = max(wait, -self.requests_available * 60 / self.rpm)
+            if self.tpm:
+                self.tokens_available = min(self.tpm, self.tokens_available + elapsed * self.tpm / 60)
+                # A request larger than the whole bucket would otherwise never be served
+                self.tokens_available -= min(tokens, self.tpm)
+                wait = max(wait, -self.tokens_available * 60 / self.tpm)
+            wait = max(wait, self.blocked_until - now)
+            self.calls += 1
+            if wait > 0:
+                self.queued += 1
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+            return wait
+
+    def settle(self, estimated_tokens, used_tokens):
+        """
+        Returns the tokens a call reserved but did not use (or takes the extra ones it did use).
+        """
+        if not self.tpm or used_tokens is None:
+            return
+        with self._lock:
+            self.tokens_available = min(self.tpm, self.tokens_available + min(estimated_tokens, self.tpm) - used_tokens)
+
+    def backoff(self, error, attempt):
+        """
+        Seconds to wait before retry `attempt` (1-based) of a call that failed with `error`.
+        """
+        server_delay = retry_after(error)
+        if server_delay is not None:
+            with self._lock:
+                self.server_throttled += 1
+                self.blocked_until = max(self.blocked_until, time.monotonic() + server_delay)
+            return server_delay
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def _should_retry(self, error, attempt):
+        if attempt > self.max_retries or not is_retryable(error):
+            with self._lock:
+                self.failures += 1
+            return False
+        return True
+
+    def _log_retry(self, error, attempt, delay):
+        with self._lock:
+            self.retries += 1
+            self.retry_wait_total += delay
+        JSONManager.log_event(
+            'rate_limit_retry', f"{self.name}: {type(error).__name__}: {error}. "
+                                f"Retrying {attempt}/{self.max_retries} in {delay:.1f} seconds."
+        )
+
+    def call(self, request, tokens=0, usage=None):
+        """
+        Sends `request()` when the limits allow it, retrying retryable errors.
+
+        Args:
+            request (callable): Sends the request and returns the response.
+            tokens (int): Estimated tokens of the request (see estimate_tokens).
+            usage (callable): Gets the tokens actually used from the response, to settle the estimate.
+
+        Returns:
+            The response. Raises the last error once the retries are used up.
+        """
+        attempt = 0
+        while True:
+            wait = self.reserve(tokens)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                response = request()
+            except Exception as error:
+                self.settle(tokens, 0)
+                attempt += 1
+                if not self._should_retry(error, attempt):
+                    raise
+                delay = self.backoff(error, attempt)
+                self._log_retry(error, attempt, delay)
+                time.sleep(delay)
+                continue
+            self.settle(tokens, usage(response) if usage else None)
+            return response
+
+    async def call_async(self, request, tokens=0, usage=None):
+        """
+        Like `call`, for a coroutine function `request`; waits without blocking the event loop.
+        """
+        attempt = 0
+        while True:
+            wait = self.reserve(tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                response = await request()
+            except Exception as error:
+                self.settle(tokens, 0)
+                attempt += 1
+                if not self._should_retry(error, attempt):
+                    raise
+                delay = self.backoff(error, attempt)
+                self._log_retry(error, attempt, delay)
+                await asyncio.sleep(delay)
+                continue
+            self.settle(tokens, usage(response) if usage else None)
+            return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rpm': self.rpm,
+                'tpm': self.tpm,
+                'calls': self.calls,
+                'queued': self.queued,
+                'queued_wait_total': round(self.wait_total, 3),
+                'queued_wait_avg': round(self.wait_total / self.queued, 3) if self.queued else 0,
+                'queued_wait_max': round(self.wait_max, 3),
+                'retries': self.retries,
+                'retry_wait_total': round(self.retry_wait_total, 3),
+                'server_throttled': self.server_throttled,
+                'failures': self.failures,
+            }
+
+
+_lock = threading.Lock()
+_limiters = {}  # model -> RateLimiter
+
+
+def get_rate_limiter(model):
+    """
+    Returns the limiter shared by every call to `model`, with that model's RATE_LIMITS.
+    """
+    limiter = _limiters.get(model)
+    if limiter is not None:
+        return limiter
+    with _lock:
+        if model not in _limiters:
+            limits = RATE_LIMITS.get(model, RATE_LIMITS['default'])
+            _limiters[model] = RateLimiter(limits['rpm'], limits['tpm'], name=model)
+        return _limiters[model]
+
+
+def configure_rate_limits(model, rpm, tpm=None):
+    """
+    Sets the limits of `model` ('default' for every model without its own), replacing its limiter.
+    """
+    with _lock:
+        RATE_LIMITS[model] = {'rpm': rpm, 'tpm': tpm}
+        _limiters.pop(model, None)
+        if model == 'default':
+            _limiters.clear()
+
+
+def rate_limiter_stats():
+    """
+    Stats of every limiter used so far, by model.
+    """
+    with _lock:
+        limiters = dict(_limiters)
+    return {model: limiter.stats() for model, limiter in limiters.items()}
@@ -0,0 +1,280 @@
+# response_cache.py
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from helpers.Manage_Json_files import JSONManager
+
+
+def request_key(**request):
+    """
+    Content address of a request: the SHA-256 of its canonical JSON, so identical requests share a key.
+    """
+    canonical = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache of model responses keyed by request_key.
+
+    The memory tier is an LRU of the most recent `max_memory_entries` responses. The disk tier keeps one
+    small JSON file per response under `directory`, so results survive restarts; it is trimmed oldest
+    first (by last use) once it grows past `max_disk_bytes`. Entries older than `ttl` seconds are misses
+    in both tiers and are removed when found.
+    """
+
+    def __init__(self, directory=None, max_memory_entries=256, max_disk_bytes=256 * 1024 * 1024, ttl=7 * 24 * 3600):
+        """
+        Args:
+            directory (str): Folder of the disk tier; defaults to storage/llm_cache.
+            max_memory_entries (int): Responses kept in memory.
+            max_disk_bytes (int): Size of the disk tier before the least recently used files are deleted.
+            ttl (float): Seconds a response stays valid; None keeps responses until they are evicted.
+        """
+        self.directory = directory or os.path.join(JSONManager.get_storage_dir(), 'llm_cache')
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.memory = OrderedDict()  # key -> (created, content, total_tokens)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.expired = 0
+        self.evicted = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+        self.disk_bytes = sum(os.path.getsize(path) for path in self._disk_files())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _disk_files(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.json'):
+                    yield os.path.join(root, name)
+
+    def _fresh(self, created):
+        return self.ttl is None or time.time() - created < self.ttl
+
+    def get(self, key):
+        """
+        Returns the cached (content, total_tokens) for `key`, or None.
+        """
+        with self._lock:
+            entry = self.memory.get(key)
+            if entry is not None and not self._fresh(entry[0]):
+                # Counted as expired when the disk copy is found stale too
+                del self.memory[key]
+                entry = None
+            if entry is not None:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                self.tokens_saved += entry[2]
+                return entry[1], entry[2]
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self._remember(key, entry)
+            self.disk_hits += 1
+            self.tokens_saved += entry[2]
+            return entry[1], entry[2]
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not self._fresh(stored['created']):
+            self._delete(path)
+            with self._lock:
+                self.expired += 1
+            return None
+        # The file's modification time is its last use, for eviction
+        os.utime(path)
+        return stored['created'], stored['content'], stored['total_tokens']
+
+    def _remember(self, key, entry):
+        # Called with the lock held
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def put(self, key, content, total_tokens):
+        """
+        Stores a response in both tiers.
+        """
+        entry = (time.time(), content, total_tokens)
+        with self._lock:
+            self._remember(key, entry)
+            self.stores += 1
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps({'created': entry[0], 'content': content, 'total_tokens': total_tokens}).encode('utf-8')
+        previous = os.path.getsize(path) if os.path.exists(path) else 0
+        # Written aside and renamed, so readers never see half a file
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+        with self._lock:
+            self.disk_bytes += len(data) - previous
+            over = self.disk_bytes > self.max_disk_bytes
+        if over:
+            self.evict()
+
+    def _delete(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self.disk_bytes -= size
+
+    def evict(self):
+        """
+        Deletes the least recently used disk entries until the disk tier is back under 90% of its limit.
+        """
+        files = sorted(self._disk_files(), key=lambda path: os.path.getmtime(path))
+        target = self.max_disk_bytes * 0.9
+        for path in files:
+            if self.disk_bytes <= target:
+                break
+            self._delete(path)
+            with self._lock:
+                self.evicted += 1
+
+    def clear(self):
+        with self._lock:
+            self.memory.clear()
+        for path in list(self._disk_files()):
+            self._delete(path)
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                'lookups': lookups,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'tokens_saved': self.tokens_saved,
+                'stores': self.stores,
+                'expired': self.expired,
+                'evicted': self.evicted,
+                'memory_entries': len(self.memory),
+                'disk_bytes': self.disk_bytes,
+            }
+
+
+# Off unless enabled, since a cached answer is never regenerated
+_cache = None
+
+
+def enable_response_cache(**kwargs):
+    """
+    Turns the response cache on for the cached model calls. Takes ResponseCache's arguments.
+    """
+    global _cache
+    _cache = ResponseCache(**kwargs)
+    JSONManager.log_event("Response Cache", f"Response cache enabled in {_cache.directory}.")
+    return _cache
+
+
+def disable_response_cache():
+    global _cache
+    if _cache is not None:
+        JSONManager.log_event("Response Cache", f"Response cache disabled: {_cache.stats()}")
+    _cache = None
+
+
+def response_cache_stats():
+    return _cache.stats() if _cache is not None else {'enabled': False}
+
+
+def cached_response(model, **options):
+    """
+    Decorator for model calls taking (system_context, assistant_context, initial_prompt) and returning
+    (content, total_tokens). While the cache is enabled, a request identical to an earlier one (same call,
+    model, options and contexts) returns the stored result instead of calling the model. Only successful
+    results (total_tokens > 0) are stored. Works on plain and async functions, and on generators that
+    stream the content and return (content, total_tokens, error): a cached answer is yielded in one piece,
+    and results with an error are not stored.
+    Keyword arguments of the call (e.g. a model override) are part of the key.
+
+    Args:
+        model (str): Model the function calls, part of the key.
+        options: Other request settings that change the answer (temperature, response format...).
+    """
+    def decorator(function):
+        def key_for(system_context, assistant_context, initial_prompt, **arguments):
+            return request_key(
+                call=function.__name__, model=model, options=dict(options, **arguments),
+                system_context=system_context, assistant_context=assistant_context, initial_prompt=initial_prompt,
+            )
+
+        def store(cache, key, result):
+            # (content, total_tokens), or (content, total_tokens, error) from a generator
+            if isinstance(result, tuple) and len(result) in (2, 3) and result[1] and result[2:] in ((), (None,)):
+                cache.put(key, result[0], result[1])
+
+        if inspect.isgeneratorfunction(function):
+            @functools.wraps(function)
+            def generator_wrapper(system_context, assistant_context, initial_prompt, **arguments):
+                cache = _cache
+                if cache is None:
+                    return (yield from function(system_context, assistant_context, initial_prompt, **arguments))
+                key = key_for(system_context, assistant_context, initial_prompt, **arguments)
+                cached = cache.get(key)
+                if cached is not None:
+                    yield cached[0]
+                    return cached[0], cached[1], None
+                result = yield from function(system_context, assistant_context, initial_prompt, **arguments)
+                store(cache, key, result)
+                return result
+            return generator_wrapper
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(system_context, assistant_context, initial_prompt):
+                cache = _cache
+                if cache is None:
+                    return await function(system_context, assistant_context, initial_prompt)
+                key = key_for(system_context, assistant_context, initial_prompt)
+                cached = cache.get(key)
+                if cached is not None:
+                    return cached
+                result = await function(system_context, assistant_context, initial_prompt)
+                store(cache, key, result)
+                return result
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(system_context, assistant_context, initial_prompt):
+            cache = _cache
+            if cache is None:
+                return function(system_context, assistant_context, initial_prompt)
+            key = key_for(system_context, assistant_context, initial_prompt)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+            result = function(system_context, assistant_context, initial_prompt)
+            store(cache, key, result)
+            return result
+        return wrapper
+    return decorator
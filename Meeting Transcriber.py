@@ -3,18 +3,27 @@ import tkinter as tk
 from tkinter import ttk
 import threading
 import pyaudio
-import wave
 import time
 import os
-import uuid
-from queue import Queue, Empty
+import glob
+from queue import Empty
 from tkinter import scrolledtext, messagebox
 from concurrent.futures import ThreadPoolExecutor
 from LLMs.AI_models_clients import transcribe_voice_to_text, generate_text
+from LLMs.client_pool import client_pool_stats, close_clients, configure_client_pool
+from LLMs.response_cache import enable_response_cache, response_cache_stats
+from LLMs.rate_limiter import rate_limiter_stats
+from config import LLM_RESPONSE_CACHE
 from helpers.Manage_Json_files import JSONManager
 from mongodatabase.mango_connection import save_meeting_data_to_mongo
 from bson.son import SON
 from helpers.voice_profiler import VoiceManager
+from helpers.audio_buffer import PCMRingBuffer, merge_chunks
+from helpers.vad import VoiceActivityGate, PauseAlignedChunker
+from helpers.audio_encoding import ChunkEncoder
+from helpers.bounded_queue import BackpressureQueue
+from helpers.reorder_buffer import ReorderBuffer
+from helpers.transcript_merge import BoundaryDeduplicator
 from datetime import datetime
 
 # -- NEW IMPORTS FOR PHASE 1 --
@@ -35,12 +44,56 @@ RATE = 16000  # Whisper works well with 16000 Hz
 TRANSCRIPTION_INTERVAL = 5  # seconds
 OVERLAP_DURATION = 0.5  # seconds
 
+# Chunking: 'fixed' cuts every TRANSCRIPTION_INTERVAL, 'adaptive' ends segments at pauses
+CHUNKING_MODE = 'adaptive'
+MIN_SEGMENT_DURATION = 2  # seconds
+MAX_SEGMENT_DURATION = 15  # seconds, overlap is only added when a segment is cut here
+PAUSE_DURATION = 0.4  # seconds of silence that count as a pause
+RING_BUFFER_SECONDS = 120  # how long a queued chunk view stays valid before the ring overwrites it
+
+# Voice activity gating: 'energy' (energy + zero-crossing rate), 'webrtc' (model-based) or None to queue every window
+VAD_DETECTOR = 'energy'
+
+# Codec used for transcription uploads: 'wav', 'flac' (lossless), 'opus' or 'vorbis'
+UPLOAD_CODEC = 'flac'
+
+# Capture: 'callback' lets PortAudio push frames into the ring on its own thread while the recorder
+# thread does the chunking; 'blocking' reads the stream on the recorder thread
+CAPTURE_MODE = 'callback'
+
+# Speaker embedding: 'process' runs the encoder in a worker process fed through shared memory,
+# 'thread' runs it on the audio workers
+EMBEDDING_MODE = 'process'
+
+# Split chunks at speaker changes (sliding-window partial embeddings); parts that may be crosstalk or noise are
+# transcribed under "Unknown". Off until the coherence threshold is calibrated on real recordings
+DIARIZATION = False
+# Drop those possible crosstalk or noise parts instead of transcribing them
+SKIP_CROSSTALK = False
+
+# Voice profile search: 'exact' scores every stored profile, 'ivf' only the closest partitions of the store
+SPEAKER_INDEX = 'ivf'
+
+# Voice profile precision: 'float32', 'float16' (half the size on disk, matched as float32) or 'int8' (a quarter
+# of the size on disk and in memory, as fast as float32); see benchmarks/quantized_matching.py
+PROFILE_STORAGE = 'float32'
+
 # Maximum number of concurrent threads
 MAX_THREADS = 15
 
+# Backpressure: audio chunks waiting for a worker, and what to do when that backlog is full
+AUDIO_QUEUE_SIZE = 8
+AUDIO_QUEUE_POLICY = 'coalesce'  # 'block', 'coalesce' (merge into the newest queued chunk) or 'drop_oldest'
+MAX_COALESCED_DURATION = 30  # seconds; longer merges fall back to dropping the oldest chunk
+TRANSCRIPT_QUEUE_SIZE = 64
+
+# Streamed summary text reaches the Summary tab in batches at most this often (milliseconds)
+SUMMARY_STREAM_INTERVAL = 100
+
 
 class MeetingTranscriberApp:
     def __init__(self, root):
+        started = time.perf_counter()
         self.root = root
         self.root.title("Meeting Transcriber")
         self.root.state('zoomed')
@@ -67,11 +120,22 @@ class MeetingTranscriberApp:
 
         # Log initialization
         JSONManager.log_event("Initialization", "MeetingTranscriberApp initialized successfully.")
+        self.window_ready_seconds = round(time.perf_counter() - started, 3)
+        self.voice_manager.encoder_ready.add_done_callback(self.log_startup_report)
+
+    def log_startup_report(self, _future=None):
+        """
+        Logs how long the window took to come up and what loading the speaker encoder cost in the background.
+        """
+        JSONManager.log_event(
+            "Startup",
+            f"Window ready in {self.window_ready_seconds}s; speaker encoder (background): "
+            f"{self.voice_manager.encoder_load_report()}"
+        )
 
     def init_variables(self):
         # Initialize variables
-        self.audio_queue = Queue()
-        self.transcript_queue = Queue()
+        self.create_queues()
         self.unprocessed_transcriptions = []
         self.stop_event = threading.Event()
         self.pause_event = threading.Event()
@@ -91,7 +155,8 @@ class MeetingTranscriberApp:
         self.insights = {}
         self.gui_update_interval = 1000  # milliseconds
         self.total_tokens = 0
-        self.voice_manager = VoiceManager()
+        self.voice_manager = VoiceManager(index=SPEAKER_INDEX, embedding_mode=EMBEDDING_MODE, storage=PROFILE_STORAGE)
+        self.chunk_encoder = ChunkEncoder(UPLOAD_CODEC, RATE)
 
         # -- NEW FOR PHASE 1: Parallel analysis structures --
         self.analysis_data = {
@@ -103,6 +168,30 @@ class MeetingTranscriberApp:
         }
         # ----------------------------------------------------
 
+    def create_queues(self):
+        """
+        Creates the bounded audio and transcript queues and resets the worker metrics.
+        """
+        # Transcript entries are released to the UI, analyzers and storage in capture order,
+        # after the words repeated from the previous chunk's overlap are removed
+        self.reorder_buffer = ReorderBuffer(self.release_transcript_entries)
+        self.deduplicator = BoundaryDeduplicator()
+        self.last_released_seq = -1
+        self.audio_queue = BackpressureQueue(
+            AUDIO_QUEUE_SIZE,
+            policy=AUDIO_QUEUE_POLICY,
+            coalesce=lambda older, newer: merge_chunks(older, newer, max_samples=RATE * MAX_COALESCED_DURATION),
+            on_drop=lambda chunk: self.reorder_buffer.complete(chunk['seqs']),
+        )
+        self.transcript_queue = BackpressureQueue(TRANSCRIPT_QUEUE_SIZE, policy='block')
+        # Set once the recorder has queued its last chunk, so the transcription thread drains the queue before it stops
+        self.audio_done = threading.Event()
+        # Set once every transcript has been released, so the summarizer drains the queue before it stops
+        self.transcripts_done = threading.Event()
+        self.worker_stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'in_flight': 0, 'in_flight_max': 0,
+                             'overwritten': 0, 'latency_total': 0.0, 'latency_max': 0.0}
+        self.worker_stats_lock = threading.Lock()
+
     def create_input_frame(self):
         # Input Frame
         self.input_frame = ttk.LabelFrame(self.root, text="Meeting Setup", padding="10")
@@ -225,12 +314,30 @@ class MeetingTranscriberApp:
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
 
     def initialize_threads_and_events(self):
-        # Thread Pool Executor
+        # Thread Pool Executor; audio chunks may only occupy MAX_THREADS workers at once, so any
+        # backlog stays in the bounded audio queue where its overflow policy applies
         self.executor = ThreadPoolExecutor(max_workers=MAX_THREADS)
+        self.audio_worker_slots = threading.BoundedSemaphore(MAX_THREADS)
+        # Every worker can hold an API connection; the summary thread gets one more
+        configure_client_pool(MAX_THREADS + 1)
+        if LLM_RESPONSE_CACHE:
+            enable_response_cache()
         # Directory for saving Meetings.json
         self.storage_dir = JSONManager.get_storage_dir()
         os.makedirs(self.storage_dir, exist_ok=True)
         self.meetings_file = JSONManager.get_json_path('Meetings.json')
+        self.remove_stale_audio_chunks()
+
+    def remove_stale_audio_chunks(self):
+        """
+        Deletes temporary WAV chunks left in the static directory by earlier versions or crashed sessions.
+        """
+        for file_path in glob.glob(os.path.join(JSONManager.get_static_dir(), 'audio_chunk_*.wav')):
+            try:
+                os.remove(file_path)
+                JSONManager.log_event("Delete Audio File", f"Deleted stale audio file {file_path}")
+            except Exception as e:
+                JSONManager.log_event("Delete Audio File Error", f"Error deleting audio file {file_path}: {e}")
 
     def set_window_icon(self):
         """Set the window icon using LogoIcon.ico from the static directory."""
@@ -264,6 +371,8 @@ class MeetingTranscriberApp:
         self.summary = ""
         self.summary_json = {}
         self.total_tokens = 0
+        self.chunk_encoder = ChunkEncoder(UPLOAD_CODEC, RATE)
+        self.voice_manager.start_session()
         self.start_time = time.time()
         self.last_summary_time = time.time()
         self.is_recording = True
@@ -271,8 +380,7 @@ class MeetingTranscriberApp:
 
         self.stop_event.clear()
         self.pause_event.clear()
-        self.audio_queue = Queue()
-        self.transcript_queue = Queue()
+        self.create_queues()
         self.unprocessed_transcriptions = []
 
         # -- Reset our parallel analysis data --
@@ -369,18 +477,24 @@ class MeetingTranscriberApp:
         # Record end time
         self.end_time = time.time()
 
-        # Process remaining audio in the queue
-        while not self.audio_queue.empty():
-            audio_data = self.audio_queue.get()
-            self.process_audio_data(audio_data)
-
+        # Let the recorder queue its last chunk; the transcription thread drains the queue before it exits
+        if self.recorder:
+            self.recorder.join()
+        self.audio_done.set()
         if self.transcription_thread:
             self.transcription_thread.join()
+        self.wait_for_audio_workers()
+        # The summarizer is still running here, so the released entries can always be queued
+        self.reorder_buffer.flush()
+        self.transcripts_done.set()
+        self.voice_manager.save_profiles()
         if self.summarization_thread:
             self.summarization_thread.join()
 
         # Process any unprocessed transcriptions before final summary
         self.process_remaining_transcriptions()
+        JSONManager.log_event("Upload Encoding", f"Upload encoding stats: {self.chunk_encoder.stats()}")
+        self.log_pipeline_stats()
 
         # -- PHASE 1: We do NOT do any final polishing here yet --
         # We will keep your existing final summary generation, plus we can expand it later.
@@ -394,10 +508,19 @@ class MeetingTranscriberApp:
         Processes audio chunks from the audio queue by transcribing and associating with speaker IDs.
         """
         JSONManager.log_event("Transcription", "Audio chunk processing started.")
-        while self.is_recording or not self.audio_queue.empty():
+        while not self.audio_done.is_set() or not self.audio_queue.empty():
             try:
-                audio_data = self.audio_queue.get(timeout=1)
-                self.executor.submit(self.process_audio_data, audio_data)
+                chunk = self.audio_queue.get(timeout=1)
+                self.audio_worker_slots.acquire()
+                with self.worker_stats_lock:
+                    self.worker_stats['submitted'] += 1
+                    self.worker_stats['in_flight'] += 1
+                    self.worker_stats['in_flight_max'] = max(
+                        self.worker_stats['in_flight_max'], self.worker_stats['in_flight']
+                    )
+                submitted_at = time.monotonic()
+                future = self.executor.submit(self.process_audio_data, chunk)
+                future.add_done_callback(lambda f, c=chunk, t=submitted_at: self.on_audio_chunk_done(f, c, t))
             except Empty:
                 continue
             except Exception as e:
@@ -407,35 +530,115 @@ class MeetingTranscriberApp:
                 continue
         JSONManager.log_event("Transcription", "Audio chunk processing stopped.")
 
-    def process_audio_data(self, audio_data):
-        """
-        Processes a single audio chunk: saves it, identifies the speaker, transcribes, and associates the transcription with the speaker ID.
-        """
-        audio_file_path = self.save_audio_to_wav(audio_data)
-        if audio_file_path:
-            # Identify speaker
-            speaker_id = self.voice_manager.match_voice(audio_file_path)
-            if not speaker_id:
-                speaker_id = "Unknown"
-
-            # Transcribe audio
-            transcription = transcribe_voice_to_text(audio_file_path)
-            if transcription:
-                timestamp = datetime.now().strftime("%H:%M:%S")
-                entry = {
-                    'timestamp': timestamp,
-                    'speaker_id': speaker_id,
-                    'text': transcription
-                }
-                self.full_transcript.append(entry)
-                self.transcript_queue.put(transcription)
-                self.root.after(0, self.update_transcription_tab, entry)
-            # Delete the audio file after transcription
-            try:
-                os.remove(audio_file_path)
-                JSONManager.log_event("Delete Audio File", f"Deleted audio file {audio_file_path}")
-            except Exception as e:
-                JSONManager.log_event("Delete Audio File Error", f"Error deleting audio file {audio_file_path}: {e}")
+    def on_audio_chunk_done(self, future, chunk, submitted_at):
+        """
+        Hands a finished chunk's transcript entries to the reorder buffer, frees its worker slot and records
+        its latency.
+        """
+        error = future.exception()
+        if error:
+            JSONManager.log_event("Transcription Exception", f"Error in process_audio_data: {error}")
+        self.reorder_buffer.complete(chunk['seqs'], None if error else future.result())
+        self.audio_worker_slots.release()
+        latency = time.monotonic() - submitted_at
+        with self.worker_stats_lock:
+            self.worker_stats['in_flight'] -= 1
+            self.worker_stats['failed' if error else 'completed'] += 1
+            self.worker_stats['latency_total'] += latency
+            self.worker_stats['latency_max'] = max(self.worker_stats['latency_max'], latency)
+
+    def wait_for_audio_workers(self):
+        """
+        Blocks until every audio chunk handed to the executor has finished.
+        """
+        for _ in range(MAX_THREADS):
+            self.audio_worker_slots.acquire()
+        for _ in range(MAX_THREADS):
+            self.audio_worker_slots.release()
+
+    def release_transcript_entries(self, entries):
+        """
+        Publishes a chunk's transcript entries once every earlier chunk has been released.
+        """
+        follows_previous = entries[0]['seqs'][0] == self.last_released_seq + 1
+        self.last_released_seq = entries[0]['seqs'][-1]
+        for entry in entries:
+            entry['text'] = self.deduplicator.process(entry['text'], entry['overlap'] and follows_previous)
+            if not entry['text'].strip():
+                continue
+            self.full_transcript.append(entry)
+            self.transcript_queue.put(entry['text'])
+            self.root.after(0, self.update_transcription_tab, entry)
+
+    def log_pipeline_stats(self):
+        """
+        Logs queue occupancy, lag and worker latency, the data for sizing MAX_THREADS and the queue limits.
+        """
+        with self.worker_stats_lock:
+            finished = self.worker_stats['completed'] + self.worker_stats['failed']
+            workers = dict(self.worker_stats)
+        workers['latency_avg'] = round(workers.pop('latency_total') / finished, 3) if finished else 0
+        workers['latency_max'] = round(workers['latency_max'], 3)
+        JSONManager.log_event(
+            "Pipeline Stats",
+            f"audio_queue: {self.audio_queue.stats()}, transcript_queue: {self.transcript_queue.stats()}, "
+            f"audio workers: {workers}, reorder buffer: {self.reorder_buffer.stats()}, "
+            f"boundary dedup: {self.deduplicator.stats()}, profile store: {self.voice_manager.store.stats()}, "
+            f"embedding: {self.voice_manager.embedding_stats()}, speakers: {self.voice_manager.stats()}, "
+            f"openai connections: {client_pool_stats()}, response cache: {response_cache_stats()}, "
+            f"rate limits: {rate_limiter_stats()}"
+        )
+
+    def process_audio_data(self, chunk):
+        """
+        Processes a single audio chunk in memory: identifies the speakers and transcribes it.
+
+        With DIARIZATION on, a chunk in which the speaker changes is split at the change points and each part
+        is transcribed under its own speaker; parts that may be crosstalk or noise are transcribed as "Unknown",
+        or dropped with SKIP_CROSSTALK.
+
+        Returns:
+            list: The chunk's transcript entries in order, stamped with their capture time, or None if silent
+                or lost.
+        """
+        # The chunk is a view into the recorder's ring: copy it out before the slow calls below, since the
+        # writer keeps going (the coalesce policy never blocks it) and would otherwise overwrite it in place
+        audio_data = self.recorder.ring.detach(chunk['pcm'], chunk['start_sample']) if self.recorder else chunk['pcm']
+        if audio_data is None:
+            with self.worker_stats_lock:
+                self.worker_stats['overwritten'] += 1
+            JSONManager.log_event(
+                "Transcription", f"Chunk {chunk['seqs']} was overwritten in the ring before it was processed; dropped."
+            )
+            return None
+        if len(audio_data) == 0:
+            return None
+        segments = self.voice_manager.diarize(
+            audio_data, RATE, skip_low_coherence=SKIP_CROSSTALK
+        ) if DIARIZATION else None
+        if segments is None:
+            # Identify speaker straight from the int16 samples
+            speaker_id = self.voice_manager.match_voice(audio_data)
+            segments = [{'start': 0, 'end': len(audio_data), 'speaker_id': speaker_id}]
+
+        entries = []
+        for segment in segments:
+            # Transcribe audio from an in-memory file in the configured upload codec
+            pcm = audio_data[segment['start']:segment['end']]
+            transcription = transcribe_voice_to_text(self.chunk_encoder.encode(pcm))
+            if not transcription:
+                continue
+            entries.append({
+                'seqs': chunk['seqs'],
+                'overlap': chunk['overlap_samples'] > 0 and segment['start'] == 0,
+                'offset': (chunk['start_sample'] + segment['start']) / RATE,
+                'timestamp': datetime.fromtimestamp(
+                    chunk['captured_at'] + segment['start'] / RATE
+                ).strftime("%H:%M:%S"),
+                'speaker_id': segment['speaker_id'] or "Unknown",
+                'text': transcription
+            })
+        return entries or None
 
     def process_transcriptions(self):
         """
@@ -445,7 +648,7 @@ class MeetingTranscriberApp:
         JSONManager.log_event(
             "Summarization", "Transcription processing for summarization started."
         )
-        while self.is_recording or not self.transcript_queue.empty():
+        while not self.transcripts_done.is_set() or not self.transcript_queue.empty():
             try:
                 transcription = self.transcript_queue.get(timeout=1)
                 if transcription:
@@ -586,7 +789,6 @@ class MeetingTranscriberApp:
         """
         Generates the final meeting summary using the AI LLMs and saves all data.
         """
-        # For now, this code remains as is. We'll integrate "final_polish" calls in future phases.
         self.root.after(0, self.show_processing_popup)
 
         # Wait briefly for concurrency to settle
@@ -614,10 +816,89 @@ class MeetingTranscriberApp:
 
     def generate_final_summary(self):
         """
-        Stub. In the future, we'll incorporate final polishing of all analysis data.
-        For now, we just pass.
+        Writes the final summary with the language model, streaming it into the Summary tab as it is generated.
+        """
+        transcript_text = self.compile_transcript_text()
+        if not transcript_text:
+            return
+        self.root.after(0, lambda: self.notebook.select(self.tab_summary))
+        details = (transcript_text, self.analysis_data['summary'], self.meeting_name, self.meeting_objective)
+        summary, tokens = self.stream_to_summary_tab(
+            summary_analysis.final_polish_stream(*details), lambda: summary_analysis.final_summary(*details)
+        )
+        # final_summary hands back the running summary when it fails too
+        self.analysis_data['summary'] = summary
+        self.total_tokens += tokens
+        if not tokens:
+            raise RuntimeError("The final summary could not be generated; the running summary was kept.")
+
+    def stream_to_summary_tab(self, deltas, fallback):
+        """
+        Replaces the Summary tab's text with streamed text as it arrives. Runs on a worker thread: pieces are
+        buffered here and appended on the Tk thread in one root.after batch at most every
+        SUMMARY_STREAM_INTERVAL ms, so a fast stream does not flood the event loop.
+
+        If the stream fails, the partial text is replaced with the result of `fallback`, so an interrupted
+        stream never ends up as the summary.
+
+        Args:
+            deltas (generator): Text pieces from generate_text_stream, returning (content, tokens, error).
+            fallback (callable): Produces (content, tokens) without streaming.
+
+        Returns:
+            tuple: (content, total tokens) of the stream, or of the fallback.
         """
-        pass
+        pending = []
+        state = {'scheduled': False, 'batches': 0}
+        lock = threading.Lock()
+
+        def flush():
+            with lock:
+                text = "".join(pending)
+                pending.clear()
+                state['scheduled'] = False
+            if text:
+                self.summary_text.config(state='normal')
+                self.summary_text.insert(tk.END, text)
+                self.summary_text.see(tk.END)
+                self.summary_text.config(state='disabled')
+
+        def replace(text):
+            self.summary_text.config(state='normal')
+            self.summary_text.delete(1.0, tk.END)
+            self.summary_text.insert(tk.END, text)
+            self.summary_text.config(state='disabled')
+
+        self.root.after(0, lambda: replace(""))
+        started = time.perf_counter()
+        first_delta = None
+        while True:
+            try:
+                delta = next(deltas)
+            except StopIteration as done:
+                result = done.value
+                break
+            if first_delta is None:
+                first_delta = time.perf_counter() - started
+            with lock:
+                pending.append(delta)
+                if not state['scheduled']:
+                    state['scheduled'] = True
+                    state['batches'] += 1
+                    self.root.after(SUMMARY_STREAM_INTERVAL, flush)
+        self.root.after(0, flush)
+        JSONManager.log_event(
+            "Summary Stream",
+            f"First text after {first_delta or 0:.2f}s, complete after {time.perf_counter() - started:.2f}s, "
+            f"{state['batches']} UI updates."
+        )
+        content, tokens, error = result
+        if error is None:
+            return content, tokens
+        JSONManager.log_event("Summary Stream", f"Stream failed ({error}); generating the summary without streaming.")
+        content, tokens = fallback()
+        self.root.after(0, lambda: replace(content))
+        return content, tokens
 
     def show_processing_popup(self):
         """
@@ -671,30 +952,18 @@ class MeetingTranscriberApp:
         """
         self.processing_popup.destroy()
 
-    def save_audio_to_wav(self, audio_data):
+    def compile_transcript_text(self):
         """
-        Saves raw audio data to a WAV file.
+        The full transcript as text, one line per entry with its timestamp and speaker ID.
+
+        Entries are labelled as the chunk was matched; speakers merged since are written under the profile
+        they were merged into, and provisional speakers that were never confirmed as "Unknown".
         """
-        if not audio_data:
-            return None
-        try:
-            static_dir = JSONManager.get_static_dir()
-            os.makedirs(static_dir, exist_ok=True)
-            filename = f"audio_chunk_{uuid.uuid4()}.wav"
-            file_path = os.path.join(static_dir, filename)
-
-            wf = wave.open(file_path, 'wb')
-            wf.setnchannels(CHANNELS)
-            wf.setsampwidth(pyaudio.get_sample_size(FORMAT))
-            wf.setframerate(RATE)
-            wf.writeframes(audio_data)
-            wf.close()
-
-            JSONManager.log_event("Save Audio to WAV", f"Audio chunk saved to {file_path}")
-            return file_path
-        except Exception as e:
-            JSONManager.log_event("Save Audio to WAV Exception", f"Error saving audio to WAV: {e}")
-            return None
+        speakers = self.voice_manager.resolve_many([entry['speaker_id'] for entry in self.full_transcript])
+        return "\n".join([
+            f"[{entry['timestamp']}] Speaker {speaker or 'Unknown'}: {entry['text']}"
+            for entry, speaker in zip(self.full_transcript, speakers)
+        ]).strip()
 
     def save_meeting_data(self):
         """
@@ -711,11 +980,7 @@ class MeetingTranscriberApp:
         else:
             duration = 0
 
-        # Compile full transcript text with speaker IDs and timestamps
-        transcript_text = "\n".join([
-            f"[{entry['timestamp']}] Speaker {entry['speaker_id']}: {entry['text']}"
-            for entry in self.full_transcript
-        ])
+        transcript_text = self.compile_transcript_text()
 
         meeting_data = SON([
             ("meeting_title", self.meeting_name),
@@ -785,61 +1050,189 @@ class AudioRecorder(threading.Thread):
         self.pause_event = pause_event
         self.p = pyaudio.PyAudio()
         self.stream = None
-        self.overlap_buffer = []
-        self.chunk_frames = []
+        self.samples_per_chunk = int(RATE * TRANSCRIPTION_INTERVAL)
+        self.samples_per_overlap = int(RATE * OVERLAP_DURATION)
+        self.chunker = PauseAlignedChunker(
+            VAD_DETECTOR or 'energy', sample_rate=RATE, min_duration=MIN_SEGMENT_DURATION,
+            max_duration=MAX_SEGMENT_DURATION, pause_duration=PAUSE_DURATION, overlap_duration=OVERLAP_DURATION,
+        ) if CHUNKING_MODE == 'adaptive' else None
+        longest_segment = self.chunker.max_samples if self.chunker else self.samples_per_chunk
+        # Reads are CHUNK-granular, so a window can run up to one read past the nominal segment length
+        max_window = self.samples_per_overlap + longest_segment + CHUNK
+        # Queued chunks are views into the ring, so it must outlast a full queue plus every busy worker
+        windows_in_flight = AUDIO_QUEUE_SIZE + MAX_THREADS + 2
+        self.ring = PCMRingBuffer(
+            capacity_samples=max(int(RATE * RING_BUFFER_SECONDS), windows_in_flight * max_window),
+            max_window_samples=max_window,
+        )
+        self.chunk_start = 0  # Absolute sample index where the current chunk's new audio begins
+        self.next_seq = 0
+        self.vad = VoiceActivityGate(VAD_DETECTOR, sample_rate=RATE) if VAD_DETECTOR else None
+        # Written by the PortAudio callback thread (dropped_frames by the recorder thread); read via stats()
+        self.capture_stats = {'callbacks': 0, 'overflow_callbacks': 0, 'paused_frames': 0, 'dropped_frames': 0}
+
+    def on_audio(self, in_data, frame_count, time_info, status_flags):
+        """
+        PortAudio callback: copies the new frames into the ring and returns straight away.
+
+        It takes no locks: the ring's write position and the capture counters other than dropped_frames are
+        only written here, on the PortAudio thread, and other threads only read them (see stats()).
+        overflow_callbacks counts the callbacks flagged with an input overflow, not the frames lost in it.
+        """
+        self.capture_stats['callbacks'] += 1
+        if status_flags & pyaudio.paInputOverflow:
+            self.capture_stats['overflow_callbacks'] += 1
+        if self.pause_event.is_set():
+            self.capture_stats['paused_frames'] += frame_count
+        else:
+            self.ring.write(in_data)
+        return None, pyaudio.paContinue
+
+    def stats(self):
+        """
+        Returns a snapshot of the capture counters. The copy is taken in one step, so the PortAudio thread
+        updating them meanwhile does not change the values a caller logs or compares.
+        """
+        return dict(self.capture_stats)
+
+    def process_captured_audio(self):
+        """
+        Cuts the audio written to the ring since the last call into chunks and queues them.
+        """
+        # If chunking fell so far behind that the writer lapped it, skip the lost audio and count it
+        safe_start = self.ring.write_pos - self.ring.capacity + 4 * CHUNK
+        oldest_needed = self.chunker.oldest_needed() if self.chunker else self.chunk_start - self.samples_per_overlap
+        if oldest_needed < safe_start and self.ring.write_pos > self.ring.capacity:
+            self.capture_stats['dropped_frames'] += safe_start - oldest_needed
+            JSONManager.log_event("AudioRecorder", f"Chunking fell behind; skipped {safe_start - oldest_needed} frames.")
+            if self.chunker:
+                self.chunker.resync(safe_start + self.samples_per_overlap)
+            else:
+                self.chunk_start = safe_start + self.samples_per_overlap
+
+        if self.chunker is not None:
+            emitted = self.emit_segments()
+        elif self.ring.write_pos - self.chunk_start >= self.samples_per_chunk:
+            emitted = self.emit_chunk()
+        else:
+            emitted = False
+        if emitted:
+            JSONManager.log_event(
+                "AudioRecorder", "Audio chunk added to queue for transcription."
+            )
+
+    def emit_chunk(self):
+        """
+        Queues the fixed-interval chunk captured since the last one, prefixed with the overlap.
+        """
+        if self.ring.write_pos <= self.chunk_start:
+            return False
+        window_start = max(0, self.chunk_start - self.samples_per_overlap)
+        emitted = self.emit_window(window_start, self.ring.write_pos, self.chunk_start - window_start)
+        self.chunk_start = self.ring.write_pos
+        return emitted
+
+    def emit_segments(self, final=False):
+        """
+        Queues the pause-aligned segments the chunker has closed since the last read.
+        """
+        windows = self.chunker.flush(self.ring) if final else self.chunker.update(self.ring)
+        emitted = False
+        for start, end, overlap in windows:
+            emitted = self.emit_window(start, end, overlap) or emitted
+        return emitted
+
+    def emit_window(self, start, end, overlap):
+        """
+        Passes the window [start, end) through voice activity gating and queues it as a view into the ring.
+        """
+        chunk = {
+            'pcm': self.ring.window(start, end),
+            'overlap_samples': overlap,
+            'start_sample': start,
+            # Wall-clock time at which the first sample of the chunk was captured
+            'captured_at': time.time() - (self.ring.write_pos - start) / RATE,
+        }
+        return self.queue_chunks([chunk] if self.vad is None else self.vad.process(chunk))
+
+    def queue_chunks(self, chunks):
+        """
+        Tags the chunks that passed voice activity gating with their sequence number and queues them.
+        """
+        for chunk in chunks:
+            chunk['seq'] = self.next_seq
+            chunk['seqs'] = [self.next_seq]
+            self.next_seq += 1
+            self.audio_queue.put(chunk)
+        return bool(chunks)
+
+    def run_callback_consumer(self):
+        """
+        Chunks the audio PortAudio writes into the ring, waking once per buffer period, until stopped.
+        """
+        while not self.stop_event.wait(CHUNK / RATE):
+            try:
+                self.process_captured_audio()
+            except Exception as e:
+                JSONManager.log_event(
+                    "AudioRecorder Exception", f"Error processing captured audio: {e}"
+                )
+        # No more callbacks after this, so the final chunk sees every captured frame
+        self.stream.stop_stream()
+
+    def run_blocking_capture(self):
+        """
+        Reads the stream on this thread and chunks it as it arrives, until stopped.
+        """
+        while not self.stop_event.is_set():
+            if self.pause_event.is_set():
+                self.stop_event.wait(0.1)
+                continue
+            try:
+                data = self.stream.read(CHUNK, exception_on_overflow=False)
+                self.ring.write(data)
+                self.process_captured_audio()
+            except Exception as e:
+                JSONManager.log_event(
+                    "AudioRecorder Exception", f"Error reading audio stream: {e}"
+                )
+                continue
 
     def run(self):
         """
         Starts the audio stream and continuously captures audio until stopped.
         """
         try:
+            callback_mode = CAPTURE_MODE == 'callback'
             self.stream = self.p.open(
                 format=FORMAT,
                 channels=CHANNELS,
                 rate=RATE,
                 input=True,
                 frames_per_buffer=CHUNK,
+                stream_callback=self.on_audio if callback_mode else None,
             )
-            JSONManager.log_event("AudioRecorder", "Audio stream opened successfully.")
+            JSONManager.log_event("AudioRecorder", f"Audio stream opened successfully ({CAPTURE_MODE} mode).")
             print("Recording started.")
 
-            frames_per_chunk = int((RATE * TRANSCRIPTION_INTERVAL) / CHUNK)
-            frames_per_overlap = int((RATE * OVERLAP_DURATION) / CHUNK)
-
-            while not self.stop_event.is_set():
-                if self.pause_event.is_set():
-                    time.sleep(0.1)
-                    continue
-                try:
-                    data = self.stream.read(CHUNK, exception_on_overflow=False)
-                    self.chunk_frames.append(data)
-
-                    if len(self.chunk_frames) >= frames_per_chunk:
-                        frames = self.overlap_buffer + self.chunk_frames
-                        self.overlap_buffer = self.chunk_frames[-frames_per_overlap:]
-                        audio_data = b''.join(frames)
-                        if audio_data:
-                            self.audio_queue.put(audio_data)
-                            JSONManager.log_event(
-                                "AudioRecorder", "Audio chunk added to queue for transcription."
-                            )
-                        self.chunk_frames = []
-                except Exception as e:
-                    JSONManager.log_event(
-                        "AudioRecorder Exception", f"Error reading audio stream: {e}"
-                    )
-                    continue
-
-            # Handle remaining frames when stop_event is set
-            if self.chunk_frames:
-                frames = self.overlap_buffer + self.chunk_frames
-                audio_data = b''.join(frames)
-                if audio_data:
-                    self.audio_queue.put(audio_data)
-                    JSONManager.log_event(
-                        "AudioRecorder",
-                        "Remaining audio data added to queue for transcription.",
-                    )
+            if callback_mode:
+                self.run_callback_consumer()
+            else:
+                self.run_blocking_capture()
+
+            # Handle remaining samples when stop_event is set
+            if self.emit_segments(final=True) if self.chunker is not None else self.emit_chunk():
+                JSONManager.log_event(
+                    "AudioRecorder",
+                    "Remaining audio data added to queue for transcription.",
+                )
+            if self.vad is not None:
+                self.queue_chunks(self.vad.flush())
+                self.vad.log_stats()
+            if self.chunker is not None:
+                JSONManager.log_event("AudioRecorder", f"Chunker stats: {self.chunker.stats()}")
+            JSONManager.log_event("AudioRecorder", f"Ring buffer stats: {self.ring.stats()}")
+            JSONManager.log_event("AudioRecorder", f"Capture stats: {self.stats()}")
 
             print("Recording stopped.")
 
@@ -861,6 +1254,8 @@ def main():
     app = MeetingTranscriberApp(root)
     root.protocol("WM_DELETE_WINDOW", app.stop_recording_and_close)
     root.mainloop()
+    app.voice_manager.close()
+    close_clients()
 
 
 if __name__ == "__main__":
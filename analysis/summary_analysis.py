@@ -1,4 +1,11 @@
 # summary_analysis.py
+from LLMs.AI_models_clients import generate_text, generate_text_stream
+
+FINAL_SUMMARY_SYSTEM = (
+    "You write meeting summaries. From the transcript, write a concise summary in Markdown with the purpose "
+    "of the meeting, the main points discussed, decisions made and follow-ups with their owners. "
+    "Refer to speakers as they appear in the transcript and do not invent details."
+)
 
 def incremental_update(chunk_text, previous_summary):
     """
@@ -14,6 +21,39 @@ def incremental_update(chunk_text, previous_summary):
 def final_polish(full_transcript, partial_summary):
     """
     Generate a final polished summary from partial_summary + the entire transcript.
+
+    Makes a model call; use final_summary when the tokens it used have to be counted.
+    """
+    return final_summary(full_transcript, partial_summary)[0]
+
+
+def final_summary_context(partial_summary, meeting_name="", meeting_objective=""):
+    # The running summary is passed as notes, next to the meeting's details
+    details = f"Meeting: {meeting_name}\nObjective: {meeting_objective}\nNotes taken during the meeting:\n"
+    return details + (partial_summary or "")
+
+
+def final_summary(full_transcript, partial_summary, meeting_name="", meeting_objective=""):
+    """
+    Writes the final summary with the language model in one call.
+
+    Returns:
+        tuple: (summary, total tokens), or (partial_summary, 0) if there is no transcript or the call failed.
+    """
+    if not full_transcript.strip():
+        return partial_summary, 0
+    context = final_summary_context(partial_summary, meeting_name, meeting_objective)
+    summary, total_tokens = generate_text(FINAL_SUMMARY_SYSTEM, context, full_transcript)
+    return (summary, total_tokens) if total_tokens else (partial_summary, 0)
+
+
+def final_polish_stream(full_transcript, partial_summary, meeting_name="", meeting_objective=""):
+    """
+    Writes the final summary with the language model, streaming it.
+
+    Returns:
+        generator: Yields the summary text as it is generated; its return value is (summary, total tokens,
+            error), see generate_text_stream.
     """
-    final_summary = partial_summary + "\n**Final polish** (placeholder)."
-    return final_summary
+    context = final_summary_context(partial_summary, meeting_name, meeting_objective)
+    return generate_text_stream(FINAL_SUMMARY_SYSTEM, context, full_transcript)
@@ -0,0 +1,265 @@
+# batch_transcriber.py
+"""
+Headless transcription of existing recordings.
+
+Streams a 16-bit PCM WAV file through memory-mapped reads, cuts it at pauses, runs speaker
+matching and transcription on the chunks in parallel, runs the analysis modules in parallel,
+and saves the meeting to MongoDB the same way the live app does.
+
+    python batch_transcriber.py recording.wav [more.wav ...] --title "Weekly sync" --workers 15
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bson.son import SON
+from LLMs.AI_models_clients import transcribe_voice_to_text
+from LLMs.client_pool import client_pool_stats, configure_client_pool
+from LLMs.response_cache import enable_response_cache, response_cache_stats
+from LLMs.rate_limiter import rate_limiter_stats
+from config import LLM_RESPONSE_CACHE
+from helpers.Manage_Json_files import JSONManager
+from helpers.voice_profiler import VoiceManager
+from helpers.audio_buffer import MappedPCM
+from helpers.audio_encoding import ChunkEncoder
+from helpers.vad import PauseAlignedChunker
+from helpers.transcript_merge import BoundaryDeduplicator
+from mongodatabase.mango_connection import save_meeting_data_to_mongo
+from analysis import theme_analysis
+from analysis import insights_analysis
+from analysis import summary_analysis
+from analysis import questions_analysis
+from analysis import action_items_analysis
+
+# Chunking, same meaning as in Meeting Transcriber.py
+VAD_DETECTOR = 'energy'
+MIN_SEGMENT_DURATION = 2  # seconds
+MAX_SEGMENT_DURATION = 15  # seconds
+PAUSE_DURATION = 0.4  # seconds
+OVERLAP_DURATION = 0.5  # seconds
+
+UPLOAD_CODEC = 'flac'
+SPEAKER_INDEX = 'ivf'
+PROFILE_STORAGE = 'float32'
+DIARIZATION = False  # off until the low-coherence threshold is calibrated on real recordings
+SKIP_CROSSTALK = False  # drop low-coherence parts instead of transcribing them under "Unknown"
+ANALYSIS_INTERVAL = 30  # seconds of audio folded into each incremental analysis update
+MAX_THREADS = 15
+
+ANALYZERS = {
+    'themes': theme_analysis,
+    'insights': insights_analysis,
+    'summary': summary_analysis,
+    'questions': questions_analysis,
+    'action_items': action_items_analysis,
+}
+
+
+def format_offset(seconds):
+    return time.strftime("%H:%M:%S", time.gmtime(seconds))
+
+
+class BatchTranscriber:
+    def __init__(self, max_workers=MAX_THREADS, codec=UPLOAD_CODEC, voice_manager=None, diarization=DIARIZATION):
+        """
+        Initializes the batch transcriber.
+
+        Args:
+            max_workers (int): Chunks transcribed concurrently.
+            codec (str): Upload codec, see helpers.audio_encoding.UPLOAD_CODECS.
+            voice_manager (VoiceManager): Shared profile store; a new one is created if omitted.
+            diarization (bool): Split chunks at speaker changes and label each part with its own speaker.
+        """
+        self.max_workers = max_workers
+        self.codec = codec
+        self.diarization = diarization
+        self.voice_manager = voice_manager or VoiceManager(index=SPEAKER_INDEX, storage=PROFILE_STORAGE)
+        configure_client_pool(max_workers)
+
+    def split(self, audio):
+        """
+        Cuts a mapped recording into pause-aligned chunks.
+
+        Returns:
+            list: (start, end, overlap_samples) sample ranges.
+        """
+        chunker = PauseAlignedChunker(
+            VAD_DETECTOR, sample_rate=audio.sample_rate, min_duration=MIN_SEGMENT_DURATION,
+            max_duration=MAX_SEGMENT_DURATION, pause_duration=PAUSE_DURATION, overlap_duration=OVERLAP_DURATION,
+        )
+        return chunker.flush(audio)
+
+    def process_chunk(self, audio, encoder, start, end, overlap):
+        """
+        Identifies the speakers of one chunk and transcribes it, one part per speaker when diarizing.
+
+        Returns:
+            list: The chunk's transcript entries, in order (empty if nothing was transcribed).
+        """
+        pcm = audio.window(start, end)
+        segments = self.voice_manager.diarize(
+            pcm, audio.sample_rate, skip_low_coherence=SKIP_CROSSTALK
+        ) if self.diarization else None
+        if segments is None:
+            speaker_id = self.voice_manager.match_voice(pcm, sample_rate=audio.sample_rate)
+            segments = [{'start': 0, 'end': len(pcm), 'speaker_id': speaker_id}]
+        entries = []
+        for segment in segments:
+            segment_start = start + segment['start']
+            try:
+                transcription = transcribe_voice_to_text(encoder.encode(pcm[segment['start']:segment['end']]))
+            except Exception as e:
+                JSONManager.log_event(
+                    "Batch Transcription Error",
+                    f"Error transcribing samples {segment_start}-{start + segment['end']}: {e}"
+                )
+                continue
+            if not transcription:
+                continue
+            entries.append({
+                'overlap': overlap > 0 and segment['start'] == 0,
+                'timestamp': format_offset(segment_start / audio.sample_rate),
+                'offset': segment_start / audio.sample_rate,
+                'speaker_id': segment['speaker_id'] or "Unknown",
+                'text': transcription,
+            })
+        return entries
+
+    def transcribe_file(self, path):
+        """
+        Transcribes a recording.
+
+        Returns:
+            tuple: (transcript entries in recording order, duration in seconds)
+        """
+        audio = MappedPCM.from_wav(path)
+        chunks = self.split(audio)
+        JSONManager.log_event("Batch Transcription", f"{path}: {len(chunks)} chunks to transcribe.")
+        encoder = ChunkEncoder(self.codec, audio.sample_rate)
+        self.voice_manager.start_session()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            entries = list(executor.map(lambda chunk: self.process_chunk(audio, encoder, *chunk), chunks))
+        self.voice_manager.save_profiles()
+        JSONManager.log_event("Batch Transcription", f"{path}: embedding stats: {self.voice_manager.embedding_stats()}")
+        JSONManager.log_event("Batch Transcription", f"{path}: speaker stats: {self.voice_manager.stats()}")
+        JSONManager.log_event("Batch Transcription", f"{path}: upload encoding stats: {encoder.stats()}")
+        JSONManager.log_event("Batch Transcription", f"{path}: openai connections: {client_pool_stats()}")
+        JSONManager.log_event("Batch Transcription", f"{path}: response cache: {response_cache_stats()}")
+        JSONManager.log_event("Batch Transcription", f"{path}: rate limits: {rate_limiter_stats()}")
+        entries = self.remove_duplicate_words(entries)
+        # Label entries with the profile each speaker ended up under, now that merges and confirmations are done
+        speakers = self.voice_manager.resolve_many([entry['speaker_id'] for entry in entries])
+        for entry, speaker in zip(entries, speakers):
+            entry['speaker_id'] = speaker or "Unknown"
+        return entries, audio.write_pos / audio.sample_rate
+
+    def remove_duplicate_words(self, chunk_entries):
+        """
+        Drops the words each entry repeats from the previous chunk's overlap. `chunk_entries` holds one
+        list of entries per chunk, in order, empty where nothing was transcribed.
+        """
+        deduplicator = BoundaryDeduplicator()
+        kept = []
+        previous = None
+        for entries in chunk_entries:
+            for entry in entries:
+                entry['text'] = deduplicator.process(entry['text'], entry['overlap'] and bool(previous))
+                if entry['text'].strip():
+                    kept.append(entry)
+            previous = entries
+        JSONManager.log_event("Batch Transcription", f"Boundary dedup stats: {deduplicator.stats()}")
+        return kept
+
+    def analyze(self, entries, meeting_title=""):
+        """
+        Runs every analysis module over the transcript in parallel, each folding incremental updates
+        over ANALYSIS_INTERVAL blocks and finishing with final_polish. The summary is finished with
+        summary_analysis.final_summary instead, which also reports the tokens the model call used.
+
+        Returns:
+            tuple: (analysis results by module name, total tokens used)
+        """
+        blocks = {}
+        for entry in entries:
+            blocks.setdefault(int(entry['offset'] // ANALYSIS_INTERVAL), []).append(entry['text'])
+        block_texts = [" ".join(blocks[key]).strip() for key in sorted(blocks)]
+        full_text = "\n".join(entry['text'] for entry in entries)
+
+        def run_analyzer(module, initial):
+            result = initial
+            for text in block_texts:
+                result = module.incremental_update(text, result)
+            if module is summary_analysis:
+                return summary_analysis.final_summary(full_text, result, meeting_title)
+            return module.final_polish(full_text, result), 0
+
+        with ThreadPoolExecutor(max_workers=len(ANALYZERS)) as executor:
+            futures = {
+                name: executor.submit(run_analyzer, module, "" if name == 'summary' else [])
+                for name, module in ANALYZERS.items()
+            }
+            results = {name: future.result() for name, future in futures.items()}
+        tokens_used = sum(tokens for _, tokens in results.values())
+        return {name: result for name, (result, _) in results.items()}, tokens_used
+
+    def run(self, path, meeting_title=None, date=None, save=True):
+        """
+        Transcribes, analyzes and (optionally) saves one recording.
+
+        Returns:
+            SON: The meeting document, with the analysis results under 'analysis'.
+        """
+        meeting_title = meeting_title or os.path.splitext(os.path.basename(path))[0]
+        date = date or time.strftime("%Y-%m-%d", time.localtime(os.path.getmtime(path)))
+        entries, duration = self.transcribe_file(path)
+        analysis_data, tokens_used = self.analyze(entries, meeting_title)
+
+        transcript_text = "\n".join(
+            f"[{entry['timestamp']}] Speaker {entry['speaker_id']}: {entry['text']}" for entry in entries
+        )
+        meeting_data = SON([
+            ("meeting_title", meeting_title),
+            ("date", date),
+            ("start_time", ""),
+            ("end_time", ""),
+            ("duration", format_offset(duration)),
+            ("full_transcript", transcript_text.strip()),
+            ("summary", analysis_data['summary']),
+            ("tokens_used", tokens_used),
+        ])
+        if save:
+            if save_meeting_data_to_mongo(meeting_data):
+                JSONManager.log_event("Save to MongoDB", f"Meeting '{meeting_title}' data saved successfully.")
+            else:
+                JSONManager.log_event("Save to MongoDB", f"Error saving meeting '{meeting_title}' data.")
+        meeting_data["analysis"] = analysis_data
+        return meeting_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe existing recordings without the GUI.")
+    parser.add_argument('recordings', nargs='+', help="16-bit PCM WAV files")
+    parser.add_argument('--title', help="Meeting title (defaults to the file name; only valid with one file)")
+    parser.add_argument('--date', help="Meeting date as YYYY-MM-DD (defaults to the file's modification date)")
+    parser.add_argument('--workers', type=int, default=MAX_THREADS, help="Chunks transcribed concurrently")
+    parser.add_argument('--codec', default=UPLOAD_CODEC, help="Upload codec: wav, flac, opus or vorbis")
+    parser.add_argument('--no-save', action='store_true', help="Print the transcript instead of saving to MongoDB")
+    parser.add_argument('--cache-responses', action='store_true', default=LLM_RESPONSE_CACHE,
+                        help="Reuse stored answers to identical model requests (for reprocessing meetings)")
+    args = parser.parse_args()
+    if args.title and len(args.recordings) > 1:
+        parser.error("--title can only be used with a single recording.")
+
+    if args.cache_responses:
+        enable_response_cache()
+    transcriber = BatchTranscriber(max_workers=args.workers, codec=args.codec)
+    for path in args.recordings:
+        started = time.time()
+        meeting_data = transcriber.run(path, meeting_title=args.title, date=args.date, save=not args.no_save)
+        print(f"{path}: {meeting_data['duration']} of audio in {time.time() - started:.0f}s")
+        if args.no_save:
+            print(meeting_data['full_transcript'])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# ann_recall.py
+"""
+Recall and latency of the IVF profile index against exact search.
+
+Builds synthetic stores of unit-norm, non-negative embeddings (resemblyzer embeddings come out of a
+ReLU, so they live in the positive orthant) and queries each with noisy copies of stored profiles,
+the way a new chunk of a known speaker arrives. Recall@1 is the fraction of queries for which the
+IVF index returns the same profile as exact search. Run from the repository root:
+
+    python -m benchmarks.ann_recall --sizes 1000 10000 100000 --nprobe 4 8 16
+"""
+import argparse
+import time
+
+import numpy as np
+
+from helpers.ann_index import IVFIndex
+from helpers.embedding_index import EmbeddingMatrix, normalize_rows
+
+
+def synthetic_profiles(count, dim, rng):
+    return normalize_rows(np.abs(rng.normal(size=(count, dim))).astype(np.float32) ** 2)
+
+
+def noisy_queries(profiles, count, noise, rng):
+    targets = rng.choice(len(profiles), count, replace=False)
+    queries = profiles[targets] + rng.normal(scale=noise, size=(count, profiles.shape[1])).astype(np.float32)
+    return normalize_rows(np.abs(queries))
+
+
+def time_queries(index, queries):
+    # One query per call, as match_voice issues them
+    started = time.perf_counter()
+    rows = np.array([index.search(query)[0][0] for query in queries])
+    return rows, (time.perf_counter() - started) / len(queries)
+
+
+def run(sizes, nprobes, dim=256, queries=500, noise=0.04, seed=0):
+    rng = np.random.default_rng(seed)
+    print(f"{'profiles':>9} {'index':>12} {'build s':>8} {'query ms':>9} {'recall@1':>9} {'candidates':>11}")
+    for size in sizes:
+        profiles = synthetic_profiles(size, dim, rng)
+        probe_queries = noisy_queries(profiles, min(queries, size), noise, rng)
+
+        exact = EmbeddingMatrix.from_normalized([str(i) for i in range(size)], profiles)
+        truth, exact_latency = time_queries(exact, probe_queries)
+        print(f"{size:>9} {'exact':>12} {0:>8.2f} {exact_latency * 1000:>9.3f} {1:>9.3f} {size:>11}")
+
+        for nprobe in nprobes:
+            started = time.perf_counter()
+            ivf = IVFIndex.from_normalized(
+                [str(i) for i in range(size)], profiles, nprobe=nprobe, min_train_size=min(2048, size)
+            )
+            build = time.perf_counter() - started
+            found, latency = time_queries(ivf, probe_queries)
+            recall = float(np.mean(found == truth))
+            stats = ivf.stats()
+            label = f"ivf {nprobe}/{stats['nlist']}"
+            print(
+                f"{size:>9} {label:>12} {build:>8.2f} {latency * 1000:>9.3f} "
+                f"{recall:>9.3f} {stats['avg_candidates']:>11}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall/latency of the IVF voice profile index.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help="Profile store sizes")
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16], help="Lists scored per query")
+    parser.add_argument('--queries', type=int, default=500, help="Queries per store size")
+    parser.add_argument('--noise', type=float, default=0.04, help="Per-dimension noise added to each query")
+    args = parser.parse_args()
+    run(args.sizes, args.nprobe, queries=args.queries, noise=args.noise)
+
+
+if __name__ == "__main__":
+    main()
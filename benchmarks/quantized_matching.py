@@ -0,0 +1,105 @@
+# quantized_matching.py
+"""
+Match accuracy, memory and latency of float16 and int8 voice profiles against float32.
+
+With recordings, each is cut into chunks that are embedded with the speaker encoder; every other chunk
+is stored as a profile and the rest are matched against them, the way later chunks of a meeting meet the
+profiles of its earlier ones. The profiles are padded with synthetic distractors so the store has a
+realistic size. Without recordings, synthetic profiles and noisy queries are used (see ann_recall).
+
+For each storage the benchmark reports how often the best profile and the match decision (similarity
+above the VoiceManager threshold) agree with float32, the largest similarity error, the bytes per
+profile and the time to score one query against the whole store. Run from the repository root:
+
+    python -m benchmarks.quantized_matching recordings/*.wav --distractors 50000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.ann_recall import noisy_queries, synthetic_profiles
+from benchmarks.upload_codecs import read_chunks
+from helpers.audio_encoding import pcm_to_float
+from helpers.embedding_index import EmbeddingMatrix, distance_to_similarity, normalize_rows
+from helpers.quantization import STORAGE_CODES, record_dtype
+
+
+def embed_recordings(paths, chunk_seconds):
+    """
+    Embeds fixed-length chunks of each recording.
+
+    Returns:
+        np.ndarray: (chunks, dim) unit-norm embeddings, in recording order.
+    """
+    from helpers.voice_encoder import get_encoder
+
+    encoder, preprocess_wav = get_encoder()
+    embeddings = []
+    for path in paths:
+        sample_rate, chunks = read_chunks(path, chunk_seconds)
+        for chunk in chunks:
+            wav = preprocess_wav(pcm_to_float(chunk), source_sr=sample_rate)
+            if len(wav) >= sample_rate // 2:
+                embeddings.append(encoder.embed_utterance(wav))
+        print(f"{path}: {len(chunks)} chunks")
+    return normalize_rows(embeddings)
+
+
+def time_queries(index, queries):
+    # One query per call, as match_voice issues them
+    started = time.perf_counter()
+    results = [index.search(query) for query in queries]
+    latency = (time.perf_counter() - started) / len(queries)
+    rows = np.array([row[0] for row, _ in results])
+    similarities = np.array([similarity[0] for _, similarity in results])
+    return rows, similarities, latency
+
+
+def run(profiles, queries, tolerance=0.6):
+    min_similarity = distance_to_similarity(tolerance)
+    ids = [str(i) for i in range(len(profiles))]
+    print(f"{len(profiles)} profiles, {len(queries)} queries, match threshold {min_similarity:.3f}")
+    print(f"{'storage':>8} {'bytes':>6} {'query ms':>9} {'top-1':>7} {'decision':>9} {'max err':>9} {'mean err':>9}")
+    baseline = None
+    for storage in STORAGE_CODES:
+        index = EmbeddingMatrix(dim=profiles.shape[1], initial_capacity=len(profiles), storage=storage)
+        index.add_many(ids, profiles)
+        rows, similarities, latency = time_queries(index, queries)
+        if baseline is None:
+            baseline = rows, similarities
+        top1 = float(np.mean(rows == baseline[0]))
+        decision = float(np.mean((similarities >= min_similarity) == (baseline[1] >= min_similarity)))
+        # Error of each query's score against the float32 profile, wherever the best match landed
+        exact = np.einsum('ij,ij->i', queries, profiles[rows])
+        error = np.abs(similarities - exact)
+        print(
+            f"{storage:>8} {record_dtype(storage, profiles.shape[1]).itemsize:>6} {latency * 1000:>9.3f} "
+            f"{top1:>7.4f} {decision:>9.4f} {error.max():>9.5f} {error.mean():>9.5f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy of quantized voice profiles against float32.")
+    parser.add_argument('recordings', nargs='*', help="16-bit PCM WAV files; synthetic embeddings when omitted")
+    parser.add_argument('--chunk-seconds', type=float, default=5.0, help="Length of each embedded chunk")
+    parser.add_argument('--distractors', type=int, default=20000, help="Synthetic profiles added to the store")
+    parser.add_argument('--queries', type=int, default=1000, help="Queries when no recordings are given")
+    parser.add_argument('--noise', type=float, default=0.04, help="Per-dimension noise of synthetic queries")
+    parser.add_argument('--tolerance', type=float, default=0.6, help="VoiceManager match tolerance")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.recordings:
+        embeddings = embed_recordings(args.recordings, args.chunk_seconds)
+        recorded, queries = embeddings[::2], embeddings[1::2]
+        distractors = synthetic_profiles(args.distractors, embeddings.shape[1], rng)
+        profiles = np.vstack([recorded, distractors])
+    else:
+        profiles = synthetic_profiles(args.distractors, 256, rng)
+        queries = noisy_queries(profiles, min(args.queries, len(profiles)), args.noise, rng)
+    run(profiles, queries, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# upload_codecs.py
+"""
+Compares upload codecs for transcription chunks against a local stand-in endpoint.
+
+Each chunk of the recording is encoded with every codec and posted as multipart form data,
+the way the transcription upload is sent, to a local server that reads the body at a
+throttled rate to simulate the office uplink. Run from the repository root:
+
+    python -m benchmarks.upload_codecs path/to/recording.wav --uplink-kbps 2000
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import Request, urlopen
+
+import numpy as np
+
+from helpers.audio_encoding import UPLOAD_CODECS, codec_report, encode_pcm
+
+
+def make_handler(uplink_kbps):
+    bytes_per_second = uplink_kbps * 1000 / 8
+
+    class StandInTranscriptionHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers['Content-Length'])
+            remaining = length
+            while remaining:
+                block = min(remaining, 16384)
+                self.rfile.read(block)
+                remaining -= block
+                if bytes_per_second:
+                    time.sleep(block / bytes_per_second)
+            body = json.dumps({'text': '', 'received_bytes': length}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StandInTranscriptionHandler
+
+
+def multipart_body(encoded):
+    """
+    Builds the multipart form body for one upload, mirroring the transcription request fields.
+    """
+    boundary = uuid.uuid4().hex
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="model"\r\n\r\nwhisper-1\r\n'.encode(),
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{encoded.name}"\r\n'
+        f'Content-Type: application/octet-stream\r\n\r\n'.encode(),
+        encoded.getvalue(),
+        f'\r\n--{boundary}--\r\n'.encode(),
+    ]
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def read_chunks(path, chunk_seconds):
+    """
+    Reads a 16-bit WAV recording and splits it into int16 chunks (first channel only).
+    """
+    with wave.open(path, 'rb') as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError("The benchmark expects a 16-bit PCM WAV file.")
+        sample_rate = wf.getframerate()
+        samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        samples = samples[::wf.getnchannels()]
+    chunk_samples = int(sample_rate * chunk_seconds)
+    return sample_rate, [samples[i:i + chunk_samples] for i in range(0, len(samples), chunk_samples)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recording', help="16-bit PCM WAV file to split into chunks")
+    parser.add_argument('--chunk-seconds', type=float, default=5.5)
+    parser.add_argument('--uplink-kbps', type=float, default=2000, help="Simulated uplink bandwidth, 0 for unthrottled")
+    parser.add_argument('--codecs', nargs='+', default=list(UPLOAD_CODECS), choices=list(UPLOAD_CODECS))
+    args = parser.parse_args()
+
+    sample_rate, chunks = read_chunks(args.recording, args.chunk_seconds)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(args.uplink_kbps))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/v1/audio/transcriptions'
+
+    print(f"{len(chunks)} chunks of {args.chunk_seconds}s at {sample_rate} Hz, uplink {args.uplink_kbps} kbps")
+    print("Single-chunk encode report:", json.dumps(codec_report(chunks[0], sample_rate, args.codecs)))
+    print(f"{'codec':<8}{'bytes/chunk':>14}{'encode ms':>12}{'upload ms':>12}{'total ms':>12}")
+    for codec in args.codecs:
+        total_bytes = encode_seconds = upload_seconds = 0.0
+        try:
+            for chunk in chunks:
+                start = time.perf_counter()
+                encoded = encode_pcm(chunk, sample_rate, codec)
+                encode_seconds += time.perf_counter() - start
+                body, content_type = multipart_body(encoded)
+                total_bytes += len(body)
+                start = time.perf_counter()
+                with urlopen(Request(url, data=body, headers={'Content-Type': content_type})) as response:
+                    response.read()
+                upload_seconds += time.perf_counter() - start
+        except Exception as e:
+            print(f"{codec:<8} unavailable: {e}")
+            continue
+        n = len(chunks)
+        print(f"{codec:<8}{total_bytes / n:>14.0f}{1000 * encode_seconds / n:>12.2f}"
+              f"{1000 * upload_seconds / n:>12.2f}{1000 * (encode_seconds + upload_seconds) / n:>12.2f}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -16,6 +16,15 @@ USER_INFO_FILE = os.path.join(storage_dir, 'user_info.json')
 # OpenAI API Key
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 
+# Reuse stored answers to identical generate_text* requests, such as the final meeting summary
+# (see LLMs/response_cache.py). Cached prompts contain meeting transcripts; they live in storage/llm_cache
+LLM_RESPONSE_CACHE = os.getenv('LLM_RESPONSE_CACHE', '').lower() in ('1', 'true', 'yes')
+
+# Client-side rate limits per model as comma-separated "model=rpm:tpm" pairs, e.g.
+# "default=500:30000,gpt-4o-mini=500:200000" for OpenAI usage tier 1; leave tpm out to limit requests only.
+# Unset, calls are not paced and only the server's rate-limit errors are retried (see LLMs/rate_limiter.py)
+LLM_RATE_LIMITS = os.getenv('LLM_RATE_LIMITS', '')
+
 LOGO_PATH = os.path.join(STATIC_DIR, 'LogoIcon.png')
 
 # MongoDB configuration
@@ -0,0 +1,184 @@
+# ann_index.py
+import numpy as np
+from helpers.embedding_index import EmbeddingMatrix, normalize_rows, top_k
+
+
+def spherical_kmeans(vectors, clusters, iterations=10, seed=0):
+    """
+    Clusters unit vectors by cosine similarity.
+
+    Returns:
+        np.ndarray: (clusters, dim) unit-norm centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        sizes = np.bincount(assignment, minlength=clusters)
+        empty = np.flatnonzero(sizes == 0)
+        # Restart empty clusters from random points so every list gets used
+        sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex(EmbeddingMatrix):
+    """
+    Inverted-file index over an EmbeddingMatrix.
+
+    The rows are partitioned into `nlist` lists by spherical k-means. A search scores the query against
+    the list centroids, scores every row in the `nprobe` closest lists exactly against the stored records,
+    and returns the best of those. Below `min_train_size` rows, or until the lists are trained,
+    searches are exact. New rows are assigned to their nearest list as they are added, and the lists are
+    retrained whenever the index has doubled in size since the last training.
+    """
+
+    def __init__(self, dim=None, initial_capacity=64, storage='float32', nlist=None, nprobe=16, min_train_size=2048,
+                 train_iterations=10, seed=0):
+        """
+        Args:
+            dim (int): Embedding size; taken from the first embedding added when omitted.
+            initial_capacity (int): Rows allocated up front.
+            storage (str): 'float32', 'float16' or 'int8'.
+            nlist (int): Number of lists; defaults to the square root of the row count at training time.
+            nprobe (int): Lists scored per query.
+            min_train_size (int): Rows needed before the lists are trained.
+            train_iterations (int): k-means iterations per training.
+            seed (int): Seed for the k-means initialisation.
+        """
+        super().__init__(dim=dim, initial_capacity=initial_capacity, storage=storage)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.train_iterations = train_iterations
+        self.seed = seed
+        self.centroids = None
+        self.trained_count = 0
+        self.assignment = np.empty(0, dtype=np.int32)
+        self.lists = []
+        self.list_sizes = np.empty(0, dtype=np.int64)
+        self.queries = 0
+        self.candidates = 0
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def rebuild(self):
+        if self.count >= self.min_train_size:
+            self.train()
+
+    def train(self):
+        """
+        (Re)builds the lists from the current rows.
+        """
+        vectors = self.matrix
+        nlist = min(self.nlist or max(1, int(np.sqrt(self.count))), self.count)
+        rng = np.random.default_rng(self.seed)
+        sample = rng.choice(self.count, min(self.count, nlist * 64), replace=False)
+        self.centroids = spherical_kmeans(vectors[np.sort(sample)], nlist, self.train_iterations, self.seed)
+        self.assignment = np.empty(max(self.count, 64), dtype=np.int32)
+        self.assignment[:self.count] = self._assign(vectors)
+        order = np.argsort(self.assignment[:self.count], kind='stable')
+        sizes = np.bincount(self.assignment[:self.count], minlength=nlist)
+        self.lists = [rows.copy() for rows in np.split(order, np.cumsum(sizes)[:-1])]
+        self.list_sizes = sizes.astype(np.int64)
+        self.trained_count = self.count
+
+    def _assign(self, vectors, block=16384):
+        assignment = np.empty(len(vectors), dtype=np.int32)
+        for first in range(0, len(vectors), block):
+            assignment[first:first + block] = np.argmax(vectors[first:first + block] @ self.centroids.T, axis=1)
+        return assignment
+
+    def _append_to_list(self, list_id, row):
+        rows = self.lists[list_id]
+        size = self.list_sizes[list_id]
+        if size == len(rows):
+            grown = np.empty(max(8, 2 * len(rows)), dtype=np.int64)
+            grown[:size] = rows[:size]
+            self.lists[list_id] = rows = grown
+        rows[size] = row
+        self.list_sizes[list_id] = size + 1
+
+    def _remove_from_list(self, list_id, row):
+        rows = self.lists[list_id]
+        size = self.list_sizes[list_id]
+        position = np.flatnonzero(rows[:size] == row)[0]
+        rows[position] = rows[size - 1]
+        self.list_sizes[list_id] = size - 1
+
+    def add_many(self, profile_ids, embeddings):
+        first = super().add_many(profile_ids, embeddings)
+        if not self.trained:
+            if self.count >= self.min_train_size:
+                self.train()
+        elif self.count >= 2 * self.trained_count:
+            self.train()
+        else:
+            if self.count > len(self.assignment):
+                grown = np.empty(max(self.count, 2 * len(self.assignment)), dtype=np.int32)
+                grown[:first] = self.assignment[:first]
+                self.assignment = grown
+            self.assignment[first:self.count] = self._assign(self.get(slice(first, self.count)))
+            for row in range(first, self.count):
+                self._append_to_list(self.assignment[row], row)
+        return first
+
+    def update(self, row, embedding):
+        super().update(row, embedding)
+        if self.trained:
+            list_id = self._assign(self.get(slice(row, row + 1)))[0]
+            if list_id != self.assignment[row]:
+                self._remove_from_list(self.assignment[row], row)
+                self._append_to_list(list_id, row)
+                self.assignment[row] = list_id
+
+    def search(self, queries):
+        if not self.trained:
+            return super().search(queries)
+        rows, similarities = self.search_k(queries, 1)
+        return rows[:, 0], similarities[:, 0]
+
+    def search_k(self, queries, k):
+        if not self.trained:
+            return super().search_k(queries, k)
+        queries = normalize_rows(queries)
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        best_rows = np.full((len(queries), k), -1)
+        best_similarities = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for i, (query, lists) in enumerate(zip(queries, probes)):
+            candidates = np.concatenate([self.lists[l][:self.list_sizes[l]] for l in lists])
+            self.candidates += len(candidates)
+            similarities = self.score(query[None, :], candidates)
+            best_rows[i], best_similarities[i] = (values[0] for values in top_k(similarities, candidates, k))
+        self.queries += len(queries)
+        return best_rows, best_similarities
+
+    def stats(self):
+        return {
+            'rows': self.count,
+            'storage': self.storage,
+            'trained': self.trained,
+            'nlist': len(self.centroids) if self.trained else 0,
+            'nprobe': self.nprobe,
+            'avg_candidates': round(self.candidates / self.queries, 1) if self.queries else 0,
+        }
+
+
+ANN_INDEXES = {
+    'exact': EmbeddingMatrix,
+    'ivf': IVFIndex,
+}
+
+
+def create_index(name, **kwargs):
+    """
+    Builds an empty embedding index by name ('exact' or 'ivf').
+    """
+    if name not in ANN_INDEXES:
+        raise ValueError(f"Unknown embedding index '{name}'. Choose one of: {', '.join(ANN_INDEXES)}.")
+    return ANN_INDEXES[name](**kwargs)
@@ -0,0 +1,219 @@
+# audio_buffer.py
+import os
+import numpy as np
+
+
+class PCMRingBuffer:
+    """
+    Fixed-size PCM ring buffer that hands out overlapping windows as zero-copy views.
+
+    The storage is allocated once. The first `max_window_samples` samples of the ring are
+    mirrored past its end, so any window up to that length is a single contiguous slice
+    of the storage, even when it wraps around.
+    """
+
+    def __init__(self, capacity_samples, max_window_samples, dtype=np.int16):
+        """
+        Initializes the ring buffer.
+
+        Args:
+            capacity_samples (int): Number of samples kept before the oldest audio is overwritten.
+            max_window_samples (int): Longest window that can be requested as a view.
+            dtype: Sample type of the PCM stream.
+        """
+        if max_window_samples > capacity_samples:
+            raise ValueError("max_window_samples cannot be larger than capacity_samples.")
+        self.capacity = int(capacity_samples)
+        self.max_window = int(max_window_samples)
+        self.dtype = np.dtype(dtype)
+        self._buffer = np.zeros(self.capacity + self.max_window, dtype=self.dtype)
+        self.write_pos = 0  # Total number of samples written since creation
+        self.writing_to = 0  # write_pos once the write in progress completes
+        self.allocations = 1
+        self.windows_issued = 0
+        self.window_copies = 0
+        self.detached_copies = 0
+        self.overruns = 0
+
+    def write(self, data):
+        """
+        Copies raw PCM bytes (or a sample array) into the preallocated storage.
+        """
+        samples = np.frombuffer(data, dtype=self.dtype) if isinstance(data, (bytes, bytearray)) else data
+        # Announced before any storage is touched, so readers checking validity see the write coming
+        self.writing_to = self.write_pos + len(samples)
+        if len(samples) > self.capacity:
+            # Only the newest `capacity` samples fit; the older ones still count as written
+            self.write_pos += len(samples) - self.capacity
+            samples = samples[-self.capacity:]
+        index = self.write_pos % self.capacity
+        first = min(len(samples), self.capacity - index)
+        self._store(index, samples[:first])
+        if first < len(samples):
+            self._store(0, samples[first:])
+        self.write_pos += len(samples)
+
+    def _store(self, index, samples):
+        """
+        Writes a non-wrapping run of samples and keeps the mirrored tail in sync.
+        """
+        end = index + len(samples)
+        self._buffer[index:end] = samples
+        if index < self.max_window:
+            mirror_end = min(end, self.max_window)
+            self._buffer[self.capacity + index:self.capacity + mirror_end] = samples[:mirror_end - index]
+
+    def is_valid(self, start):
+        """
+        Returns True while the audio starting at absolute sample `start` has not been overwritten,
+        including by a write that is still in progress.
+        """
+        return self.writing_to - start <= self.capacity
+
+    def window(self, start, end, copy=False):
+        """
+        Returns the samples in [start, end) as a read-only view into the ring.
+
+        The view stays valid until the writer has advanced `capacity` samples past `start`;
+        pass copy=True when the caller needs to keep the audio longer than that.
+        """
+        length = end - start
+        if length > self.max_window:
+            raise ValueError(f"Requested window of {length} samples exceeds max_window ({self.max_window}).")
+        if end > self.write_pos:
+            raise ValueError("Requested window extends past the data written so far.")
+        if not self.is_valid(start):
+            self.overruns += 1
+            raise ValueError("Requested window has already been overwritten.")
+        index = start % self.capacity
+        view = self._buffer[index:index + length]
+        self.windows_issued += 1
+        if copy:
+            self.window_copies += 1
+            return view.copy()
+        view.flags.writeable = False
+        return view
+
+    def detach(self, view, start):
+        """
+        Copies a window returned by `window` (starting at absolute sample `start`) out of the ring, so it
+        can be kept past the point where the writer reuses its storage. Arrays that are not views into the
+        ring are returned as they are.
+
+        Returns:
+            np.ndarray: The copy, or None if the writer has already overwritten part of the window.
+        """
+        if not np.may_share_memory(view, self._buffer):
+            return view
+        if not self.is_valid(start):
+            return None
+        samples = view.copy()
+        self.detached_copies += 1
+        # The writer may have lapped the window while it was being copied
+        return samples if self.is_valid(start) else None
+
+    def stats(self):
+        """
+        Reports memory use and copy counts. Capture itself never allocates: 'window_copies' counts windows
+        requested as copies, and 'detached_copies' the windows copied out with `detach`, one per chunk a
+        consumer keeps past the ring's lifetime.
+        """
+        return {
+            'capacity_samples': self.capacity,
+            'allocated_bytes': self._buffer.nbytes,
+            'allocations': self.allocations,
+            'samples_written': self.write_pos,
+            'windows_issued': self.windows_issued,
+            'window_copies': self.window_copies,
+            'detached_copies': self.detached_copies,
+            'overruns': self.overruns,
+        }
+
+
+class MappedPCM:
+    """
+    Read-only, memory-mapped PCM samples from a WAV file.
+
+    Exposes the same read interface as PCMRingBuffer (write_pos, max_window, window), so the
+    chunkers can walk a long recording without loading it into memory.
+    """
+
+    def __init__(self, samples, sample_rate, max_window_samples=None):
+        """
+        Args:
+            samples (np.ndarray): int16 samples, typically an np.memmap.
+            sample_rate (int): Sample rate of the samples.
+            max_window_samples (int): Largest block handed out at once for analysis (default 60 s).
+        """
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.write_pos = len(samples)
+        self.max_window = int(max_window_samples or sample_rate * 60)
+
+    @classmethod
+    def from_wav(cls, path, max_window_samples=None):
+        """
+        Maps the data chunk of a 16-bit PCM WAV file. Multichannel files are read from their first channel.
+        """
+        with open(path, 'rb') as f:
+            header = f.read(12)
+            if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+                raise ValueError(f"{path} is not a RIFF/WAVE file.")
+            channels = sample_rate = None
+            while True:
+                chunk_header = f.read(8)
+                if len(chunk_header) < 8:
+                    raise ValueError(f"{path} has no data chunk.")
+                chunk_id = chunk_header[:4]
+                chunk_size = int.from_bytes(chunk_header[4:], 'little')
+                if chunk_id == b'fmt ':
+                    fmt = f.read(chunk_size)
+                    audio_format = int.from_bytes(fmt[0:2], 'little')
+                    channels = int.from_bytes(fmt[2:4], 'little')
+                    sample_rate = int.from_bytes(fmt[4:8], 'little')
+                    bits = int.from_bytes(fmt[14:16], 'little')
+                    if audio_format not in (1, 0xFFFE) or bits != 16:
+                        raise ValueError(f"{path} is not 16-bit PCM; convert it first, e.g. "
+                                         f"`ffmpeg -i input -ac 1 -ar 16000 -c:a pcm_s16le output.wav`.")
+                    f.seek(chunk_size % 2, 1)
+                elif chunk_id == b'data':
+                    if channels is None:
+                        raise ValueError(f"{path} has its data chunk before the fmt chunk.")
+                    data_offset = f.tell()
+                    break
+                else:
+                    f.seek(chunk_size + chunk_size % 2, 1)
+            # Recorders that never patched the header leave chunk_size at 0 or 0xFFFFFFFF
+            available = os.path.getsize(path) - data_offset
+            data_size = chunk_size if 0 < chunk_size <= available else available
+        frames = data_size // (2 * channels)
+        samples = np.memmap(path, dtype='<i2', mode='r', offset=data_offset, shape=(frames, channels))[:, 0]
+        return cls(samples, sample_rate, max_window_samples)
+
+    def window(self, start, end, copy=False):
+        """
+        Returns the samples in [start, end) as a view backed by the file.
+
+        Windows of a multichannel file are strided through the interleaved frames, so they are copied
+        into a contiguous array; the encoders and wave.writeframes only accept contiguous buffers.
+        """
+        view = self.samples[start:end]
+        return np.array(view) if copy else np.ascontiguousarray(view)
+
+
+def merge_chunks(first, second, max_samples=None):
+    """
+    Joins two consecutive audio chunks into one, dropping the overlap `second` repeats from `first`.
+
+    Chunks are dicts with at least 'pcm' (int16 samples) and 'overlap_samples'. The merged chunk keeps
+    the other keys of `first`, and covers the sequence numbers ('seqs') of both. Returns None when the
+    result would be longer than `max_samples`.
+    """
+    tail = second['pcm'][second['overlap_samples']:]
+    if max_samples and len(first['pcm']) + len(tail) > max_samples:
+        return None
+    merged = dict(first)
+    merged['pcm'] = np.concatenate([first['pcm'], tail])
+    if 'seqs' in first:
+        merged['seqs'] = first['seqs'] + second['seqs']
+    return merged
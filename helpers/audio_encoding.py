@@ -0,0 +1,165 @@
+# audio_encoding.py
+import io
+import threading
+import time
+import wave
+import numpy as np
+from helpers.Manage_Json_files import JSONManager
+
+
+def pcm_to_wav_file(pcm, sample_rate=16000, channels=1, name='audio_chunk.wav'):
+    """
+    Wraps int16 PCM samples in an in-memory WAV file that can be uploaded like an open file.
+
+    Args:
+        pcm (np.ndarray or bytes): 16-bit PCM samples.
+        sample_rate (int): Sample rate of the samples.
+        channels (int): Number of interleaved channels.
+        name (str): File name reported to the upload API, which uses the extension to detect the format.
+
+    Returns:
+        io.BytesIO: The WAV data, positioned at the start.
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm)
+    buffer.seek(0)
+    buffer.name = name
+    return buffer
+
+
+def pcm_to_float(pcm):
+    """
+    Converts int16 PCM samples to float32 in [-1, 1], the format the voice encoder expects.
+    """
+    samples = np.asarray(pcm).astype(np.float32)
+    samples /= 32768.0
+    return samples
+
+
+# Upload codecs: name -> (soundfile format, soundfile subtype, file extension). 'wav' needs no extra packages.
+UPLOAD_CODECS = {
+    'wav': ('WAV', 'PCM_16', 'wav'),
+    'flac': ('FLAC', 'PCM_16', 'flac'),
+    'opus': ('OGG', 'OPUS', 'ogg'),
+    'vorbis': ('OGG', 'VORBIS', 'ogg'),
+}
+
+
+def encode_pcm(pcm, sample_rate=16000, codec='wav', name='audio_chunk'):
+    """
+    Encodes int16 PCM samples into an in-memory file for upload.
+
+    Args:
+        pcm (np.ndarray): 16-bit PCM samples (mono).
+        sample_rate (int): Sample rate of the samples.
+        codec (str): One of UPLOAD_CODECS. FLAC is lossless; Opus and Vorbis are lossy.
+        name (str): File name without extension.
+
+    Returns:
+        io.BytesIO: The encoded file, positioned at the start, with a `name` carrying the right extension.
+    """
+    if codec not in UPLOAD_CODECS:
+        raise ValueError(f"Unknown codec '{codec}'. Choose one of: {', '.join(UPLOAD_CODECS)}.")
+    file_format, subtype, extension = UPLOAD_CODECS[codec]
+    if codec == 'wav':
+        return pcm_to_wav_file(pcm, sample_rate, name=f"{name}.{extension}")
+    try:
+        import soundfile
+    except ImportError:
+        raise ImportError(f"The '{codec}' codec requires soundfile. Install it with `pip install soundfile`.")
+    buffer = io.BytesIO()
+    soundfile.write(buffer, np.asarray(pcm, dtype=np.int16), sample_rate, format=file_format, subtype=subtype)
+    buffer.seek(0)
+    buffer.name = f"{name}.{extension}"
+    return buffer
+
+
+class ChunkEncoder:
+    """
+    Encodes chunks for upload with a fixed codec and keeps size and latency totals.
+
+    The codec is tried once on construction and replaced by WAV (with a log entry) if it can't be used on
+    this machine, so every worker encodes with the same codec. A chunk that still fails to encode is sent
+    as WAV on its own.
+    """
+
+    def __init__(self, codec='wav', sample_rate=16000):
+        self.sample_rate = sample_rate
+        self.codec = codec
+        if codec != 'wav':
+            try:
+                encode_pcm(np.zeros(sample_rate // 10, dtype=np.int16), sample_rate, codec)
+            except Exception as e:
+                JSONManager.log_event("ChunkEncoder Error", f"Cannot encode with '{codec}', using WAV instead: {e}")
+                self.codec = 'wav'
+        self.chunks = 0
+        self.fallbacks = 0
+        self.raw_bytes = 0
+        self.encoded_bytes = 0
+        self.encode_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def encode(self, pcm):
+        """
+        Returns the chunk as an uploadable in-memory file.
+        """
+        start = time.perf_counter()
+        fallback = False
+        try:
+            encoded = encode_pcm(pcm, self.sample_rate, self.codec)
+        except Exception as e:
+            if self.codec == 'wav':
+                raise
+            JSONManager.log_event("ChunkEncoder Error", f"Cannot encode chunk with '{self.codec}', sending WAV: {e}")
+            encoded = encode_pcm(pcm, self.sample_rate, 'wav')
+            fallback = True
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.encode_seconds += elapsed
+            self.chunks += 1
+            self.fallbacks += fallback
+            self.raw_bytes += len(pcm) * 2
+            self.encoded_bytes += encoded.getbuffer().nbytes
+        return encoded
+
+    def stats(self):
+        """
+        Reports the upload size saved by the codec and what encoding cost.
+        """
+        return {
+            'codec': self.codec,
+            'chunks': self.chunks,
+            'fallbacks': self.fallbacks,
+            'raw_bytes': self.raw_bytes,
+            'encoded_bytes': self.encoded_bytes,
+            'compression_ratio': round(self.raw_bytes / self.encoded_bytes, 2) if self.encoded_bytes else None,
+            'avg_encode_ms': round(1000 * self.encode_seconds / self.chunks, 2) if self.chunks else None,
+        }
+
+
+def codec_report(pcm, sample_rate=16000, codecs=None, repeats=5):
+    """
+    Encodes the same chunk with each codec and reports size and encode latency.
+
+    Codecs that can't be used on this machine are reported with an 'error' instead.
+    """
+    report = {}
+    for codec in codecs or UPLOAD_CODECS:
+        try:
+            start = time.perf_counter()
+            for _ in range(repeats):
+                encoded = encode_pcm(pcm, sample_rate, codec)
+            elapsed = (time.perf_counter() - start) / repeats
+            size = encoded.getbuffer().nbytes
+            report[codec] = {
+                'bytes': size,
+                'compression_ratio': round(len(pcm) * 2 / size, 2),
+                'encode_ms': round(elapsed * 1000, 2),
+            }
+        except Exception as e:
+            report[codec] = {'error': str(e)}
+    return report
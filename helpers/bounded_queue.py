@@ -0,0 +1,109 @@
+# bounded_queue.py
+import threading
+import time
+from queue import Queue
+
+
+class BackpressureQueue(Queue):
+    """
+    Bounded queue with a selectable overflow policy and occupancy/lag metrics.
+
+    Policies when the queue is full:
+        'block'        the producer waits for space (standard Queue behaviour).
+        'coalesce'     the incoming item is merged into the newest queued item with `coalesce(older, newer)`.
+                       If `coalesce` returns None the items can't be merged and the oldest item is dropped.
+        'drop_oldest'  the oldest queued item is discarded and passed to `on_drop`.
+    """
+
+    POLICIES = ('block', 'coalesce', 'drop_oldest')
+
+    def __init__(self, maxsize, policy='block', coalesce=None, on_drop=None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown queue policy '{policy}'. Choose one of: {', '.join(self.POLICIES)}.")
+        if policy == 'coalesce' and coalesce is None:
+            raise ValueError("The 'coalesce' policy needs a coalesce function.")
+        super().__init__(maxsize)
+        self.policy = policy
+        self.coalesce = coalesce
+        self.on_drop = on_drop
+        self.puts = 0
+        self.gets = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.high_water = 0
+        self.occupancy_total = 0
+        self.blocked_seconds = 0.0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._stats_lock = threading.Lock()
+
+    # Items are stored with their enqueue time so the time spent waiting can be measured
+    def _put(self, item):
+        self.queue.append((time.monotonic(), item))
+
+    def _get(self):
+        enqueued_at, item = self.queue.popleft()
+        wait = time.monotonic() - enqueued_at
+        self.gets += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        return item
+
+    def _record_put(self):
+        # Called with the queue mutex held
+        size = self._qsize()
+        self.puts += 1
+        self.occupancy_total += size
+        self.high_water = max(self.high_water, size)
+
+    def put(self, item, block=True, timeout=None):
+        if self.policy == 'block' or self.maxsize <= 0:
+            start = time.monotonic()
+            super().put(item, block, timeout)
+            with self._stats_lock:
+                self.blocked_seconds += time.monotonic() - start
+            with self.mutex:
+                self._record_put()
+            return
+
+        dropped = None
+        with self.not_full:
+            if self._qsize() >= self.maxsize:
+                if self.policy == 'coalesce':
+                    enqueued_at, newest = self.queue[-1]
+                    merged = self.coalesce(newest, item)
+                    if merged is not None:
+                        self.queue[-1] = (enqueued_at, merged)
+                        self.coalesced += 1
+                        self._record_put()
+                        return
+                _, dropped = self.queue.popleft()
+                self.dropped += 1
+            else:
+                # A dropped item takes its unfinished task with it, so the new item reuses it
+                self.unfinished_tasks += 1
+            self._put(item)
+            self._record_put()
+            self.not_empty.notify()
+        if dropped is not None and self.on_drop:
+            self.on_drop(dropped)
+
+    def stats(self):
+        """
+        Reports occupancy, overflow handling and how long items waited in the queue.
+        """
+        with self.mutex:
+            return {
+                'policy': self.policy,
+                'maxsize': self.maxsize,
+                'size': self._qsize(),
+                'high_water': self.high_water,
+                'avg_occupancy': round(self.occupancy_total / self.puts, 2) if self.puts else 0,
+                'puts': self.puts,
+                'gets': self.gets,
+                'dropped': self.dropped,
+                'coalesced': self.coalesced,
+                'blocked_seconds': round(self.blocked_seconds, 3),
+                'avg_wait_seconds': round(self.wait_total / self.gets, 3) if self.gets else 0,
+                'max_wait_seconds': round(self.wait_max, 3),
+            }
@@ -0,0 +1,92 @@
+# diarization.py
+import numpy as np
+from helpers.embedding_index import normalize_rows
+
+
+def change_scores(partials, context):
+    """
+    Similarity between the mean of the `context` partial embeddings before each boundary and the mean of
+    the `context` partials after it. Boundary b lies between partial b - 1 and partial b, for b in 1..n-1.
+    """
+    cumulative = np.vstack([np.zeros((1, partials.shape[1]), dtype=partials.dtype), np.cumsum(partials, axis=0)])
+    scores = np.empty(len(partials) - 1, dtype=np.float32)
+    for b in range(1, len(partials)):
+        left = cumulative[b] - cumulative[max(0, b - context)]
+        right = cumulative[min(len(partials), b + context)] - cumulative[b]
+        scores[b - 1] = normalize_rows(left)[0] @ normalize_rows(right)[0]
+    return scores
+
+
+def find_change_points(scores, change_similarity, min_segment_partials):
+    """
+    Picks boundaries where the speaker changes: local minima of `scores` below `change_similarity`, lowest
+    first, keeping every segment at least `min_segment_partials` partials long.
+
+    Returns:
+        list: Sorted boundary indices b (a segment starts at partial b).
+    """
+    count = len(scores) + 1
+    candidates = [
+        b for b in range(1, count)
+        if scores[b - 1] < change_similarity
+        and (b == 1 or scores[b - 1] <= scores[b - 2])
+        and (b == count - 1 or scores[b - 1] <= scores[b])
+    ]
+    chosen = []
+    for b in sorted(candidates, key=lambda b: scores[b - 1]):
+        edges = [0, count] + chosen
+        if all(abs(b - edge) >= min_segment_partials for edge in edges):
+            chosen.append(b)
+    return sorted(chosen)
+
+
+def boundary_sample(partial_starts, b, window):
+    # Midway between the centres of partials b - 1 and b
+    return int((partial_starts[b - 1] + partial_starts[b] + window) // 2)
+
+
+def segment_partials(partials, partial_starts, window, total_samples, change_similarity=0.7, min_segment_partials=3,
+                     min_coherence=0.8):
+    """
+    Splits a chunk into single-speaker segments from its sliding-window partial embeddings.
+
+    Args:
+        partials (np.ndarray): (n, dim) unit-norm partial embeddings, in time order.
+        partial_starts (np.ndarray): First sample of each partial's window, in the chunk's samples.
+        window (int): Length of a partial window, in the chunk's samples.
+        total_samples (int): Length of the chunk.
+        change_similarity (float): Boundaries whose before/after similarity falls below this are speaker changes.
+        min_segment_partials (int): Shortest segment, in partials.
+        min_coherence (float): Segments whose partials agree less than this (norm of their mean, 1.0 when
+            identical) may be crosstalk or noise and are flagged 'low_coherence'. Not yet calibrated on real
+            recordings, so by default the flag only withholds a speaker label and the audio is still
+            transcribed; VoiceManager.diarize(skip_low_coherence=True) drops flagged segments instead.
+
+    Returns:
+        list: {'start', 'end', 'embedding', 'coherence', 'low_coherence'} per segment, in order.
+    """
+    partials = normalize_rows(partials)
+    partial_starts = np.asarray(partial_starts)
+    boundaries = []
+    if len(partials) > 1:
+        # Compare windows that do not overlap each other
+        step = max(1, int(partial_starts[1] - partial_starts[0]))
+        context = max(1, int(np.ceil(window / step)))
+        boundaries = find_change_points(change_scores(partials, context), change_similarity, min_segment_partials)
+
+    segments = []
+    edges = [0] + boundaries + [len(partials)]
+    for first, last in zip(edges[:-1], edges[1:]):
+        mean = partials[first:last].mean(axis=0)
+        coherence = float(np.linalg.norm(mean))
+        # A change falls between the centres of the partials either side of it
+        start = 0 if first == 0 else boundary_sample(partial_starts, first, window)
+        end = total_samples if last == len(partials) else boundary_sample(partial_starts, last, window)
+        segments.append({
+            'start': start,
+            'end': min(end, total_samples),
+            'embedding': mean / max(coherence, 1e-12),
+            'coherence': round(coherence, 3),
+            'low_coherence': len(partials) > 1 and coherence < min_coherence,
+        })
+    return segments
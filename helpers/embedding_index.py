@@ -0,0 +1,186 @@
+# embedding_index.py
+import numpy as np
+from helpers.quantization import check_storage, decode, encode, record_dim, record_dtype, score
+
+
+def normalize_rows(vectors):
+    """
+    Returns `vectors` as a float32 2-D array with every row scaled to unit L2 norm.
+    """
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def distance_to_similarity(distance):
+    """
+    Converts a Euclidean distance between unit vectors into the equivalent cosine similarity.
+    """
+    return 1.0 - (distance * distance) / 2.0
+
+
+def similarity_to_distance(similarity):
+    """
+    Converts a cosine similarity between unit vectors into the equivalent Euclidean distance.
+    """
+    return np.sqrt(np.maximum(0.0, 2.0 - 2.0 * np.asarray(similarity)))
+
+
+class EmbeddingMatrix:
+    """
+    One contiguous, L2-normalized matrix of embeddings with a parallel id list.
+
+    Rows are appended in place; the backing array doubles when it is full, so adding a profile
+    is amortized O(1) and matching is a single matrix product.
+
+    Rows are kept as float32, float16 or int8 with a per-row scale (see helpers.quantization).
+    Queries stay float32 and are scored directly against the stored records.
+    """
+
+    def __init__(self, dim=None, initial_capacity=64, storage='float32'):
+        """
+        Args:
+            dim (int): Embedding size; taken from the first embedding added when omitted.
+            initial_capacity (int): Rows allocated up front.
+            storage (str): 'float32', 'float16' or 'int8'.
+        """
+        self.dim = dim
+        self.count = 0
+        self.ids = []
+        self.storage = check_storage(storage)
+        self._matrix = np.empty(initial_capacity, dtype=record_dtype(storage, dim)) if dim else None
+        self._initial_capacity = initial_capacity
+
+    @classmethod
+    def from_normalized(cls, profile_ids, records, **kwargs):
+        """
+        Wraps an existing array of unit-norm records (e.g. a memory-mapped profile store) without copying it.
+        `records` must already be in the index's storage. The array is only copied once rows are added
+        beyond its length.
+        """
+        index = cls(dim=record_dim(records), initial_capacity=0, **kwargs)
+        index._matrix = records
+        index.ids = list(profile_ids)
+        index.count = len(records)
+        index.rebuild()
+        return index
+
+    def rebuild(self):
+        """
+        Hook for subclasses that keep structures derived from the rows.
+        """
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def records(self):
+        """
+        The populated rows in their stored form, as a view.
+        """
+        if self._matrix is None:
+            return np.empty(0, dtype=record_dtype(self.storage, self.dim or 0))
+        return self._matrix[:self.count]
+
+    @property
+    def matrix(self):
+        """
+        The populated rows as float32: a view for float32 storage, a decoded copy otherwise.
+        """
+        return decode(self.records, self.storage)
+
+    def get(self, rows):
+        """
+        Returns the float32 embedding of one row, or of a slice or array of rows.
+        """
+        return decode(self.records[rows], self.storage)
+
+    def score(self, queries, rows=None):
+        """
+        Cosine similarities of unit-norm float32 `queries` with every row, or only with `rows`.
+        """
+        records = self.records if rows is None else self.records[rows]
+        return score(queries, records, self.storage)
+
+    def _reserve(self, rows):
+        dtype = record_dtype(self.storage, self.dim)
+        if self._matrix is None:
+            self._matrix = np.empty(max(self._initial_capacity, rows), dtype=dtype)
+        elif rows > len(self._matrix):
+            grown = np.empty(max(rows, 2 * len(self._matrix)), dtype=dtype)
+            grown[:self.count] = self._matrix[:self.count]
+            self._matrix = grown
+
+    def add(self, profile_id, embedding):
+        """
+        Appends one embedding and returns its row index.
+        """
+        return self.add_many([profile_id], [embedding])
+
+    def add_many(self, profile_ids, embeddings):
+        """
+        Appends several embeddings at once and returns the row index of the first.
+        """
+        vectors = normalize_rows(embeddings)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        first = self.count
+        self._reserve(self.count + len(vectors))
+        self._matrix[first:first + len(vectors)] = encode(vectors, self.storage)
+        self.ids.extend(profile_ids)
+        self.count += len(vectors)
+        return first
+
+    def update(self, row, embedding):
+        """
+        Replaces the embedding stored in `row`.
+        """
+        self._matrix[row] = encode(normalize_rows(embedding), self.storage)[0]
+
+    def search(self, queries):
+        """
+        Finds the most similar stored embedding for each query.
+
+        Args:
+            queries (np.ndarray): One embedding or a (n, dim) batch.
+
+        Returns:
+            tuple: (row indices, cosine similarities), one per query.
+        """
+        queries = normalize_rows(queries)
+        if self.count == 0:
+            return np.full(len(queries), -1), np.full(len(queries), -np.inf, dtype=np.float32)
+        similarities = self.score(queries)
+        best = np.argmax(similarities, axis=1)
+        return best, similarities[np.arange(len(queries)), best]
+
+    def search_k(self, queries, k):
+        """
+        Finds the `k` most similar stored embeddings for each query, best first.
+
+        Returns:
+            tuple: (n, k) row indices and (n, k) cosine similarities; missing neighbours are -1 / -inf.
+        """
+        queries = normalize_rows(queries)
+        return top_k(self.score(queries), np.arange(self.count), k)
+
+
+def top_k(similarities, rows, k):
+    """
+    Picks the `k` best columns of each row of `similarities`, where column j stands for stored row `rows[j]`.
+    """
+    n = len(similarities)
+    best_rows = np.full((n, k), -1)
+    best_similarities = np.full((n, k), -np.inf, dtype=np.float32)
+    take = min(k, similarities.shape[1])
+    if take == 0:
+        return best_rows, best_similarities
+    if take < similarities.shape[1]:
+        columns = np.argpartition(-similarities, take - 1, axis=1)[:, :take]
+    else:
+        columns = np.tile(np.arange(take), (n, 1))
+    picked = np.take_along_axis(similarities, columns, axis=1)
+    order = np.argsort(-picked, axis=1)
+    best_rows[:, :take] = rows[np.take_along_axis(columns, order, axis=1)]
+    best_similarities[:, :take] = np.take_along_axis(picked, order, axis=1)
+    return best_rows, best_similarities
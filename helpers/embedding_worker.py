@@ -0,0 +1,328 @@
+# embedding_worker.py
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client
+from queue import Empty, Queue
+import numpy as np
+from helpers.Manage_Json_files import JSONManager
+
+
+def run_worker(shm_name, slots, slot_samples, connection):
+    """
+    Body of the embedding process (see helpers.embedding_worker_main): loads the encoder once, then embeds
+    chunks read from shared memory until the parent sends None or goes away.
+    """
+    from helpers.audio_encoding import pcm_to_float
+    from helpers.voice_encoder import get_encoder, load_report, preprocess_untrimmed
+    from helpers.voice_profiler import EmbeddingBatcher
+
+    try:
+        shm = shared_memory.SharedMemory(name=shm_name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=shm_name)
+        if os.name == 'posix':
+            # The parent owns the segment; keep this process's resource tracker from unlinking it on exit
+            resource_tracker.unregister(shm._name, 'shared_memory')
+    pcm_slots = np.ndarray((slots, slot_samples), dtype=np.int16, buffer=shm.buf)
+    send_lock = threading.Lock()
+
+    def send(message):
+        # Replies come from the batcher's thread as well as this one
+        with send_lock:
+            connection.send(message)
+
+    try:
+        try:
+            _, preprocess_wav = get_encoder()
+        except Exception as e:
+            send(('failed', None, repr(e)))
+            return
+        send(('ready', None, load_report()))
+        batcher = EmbeddingBatcher()
+
+        def reply(request_id, slot, future, scale):
+            error = future.exception()
+            if error is not None:
+                send(('error', (request_id, slot), repr(error)))
+            elif scale is None:
+                send(('done', (request_id, slot), future.result()))
+            else:
+                # Partial positions back in the caller's samples
+                embed, partials, starts, window = future.result()
+                send(('done', (request_id, slot), (embed, partials, starts / scale, window / scale)))
+
+        while True:
+            try:
+                request = connection.recv()
+            except EOFError:
+                break
+            if request is None:
+                break
+            request_id, slot, length, sample_rate, path, partials_rate = request
+            try:
+                scale = None
+                if path is not None:
+                    future = batcher.submit(preprocess_wav(path))
+                elif partials_rate:
+                    # pcm_to_float copies, so the slot can be reused as soon as this returns
+                    wav, scale = preprocess_untrimmed(pcm_to_float(pcm_slots[slot, :length]), sample_rate)
+                    future = batcher.submit(wav, rate=partials_rate, return_partials=True)
+                else:
+                    wav = preprocess_wav(pcm_to_float(pcm_slots[slot, :length]), source_sr=sample_rate)
+                    future = batcher.submit(wav)
+            except Exception as e:
+                send(('error', (request_id, slot), repr(e)))
+                continue
+            future.add_done_callback(lambda f, r=request_id, s=slot, k=scale: reply(r, s, f, k))
+        batcher.close()
+        send(('stats', None, batcher.stats()))
+    finally:
+        del pcm_slots
+        shm.close()
+
+
+class EmbeddingProcess:
+    """
+    Runs speaker embedding in a separate process, so preprocessing and inference never hold this
+    process's GIL.
+
+    The worker process loads the encoder once and keeps it warm. Chunks travel through a block of shared
+    memory divided into fixed-size int16 slots: the caller copies its samples into a free slot and sends
+    only the slot number and length over the connection. Embeddings (a few hundred floats) come back
+    the same way. Up to `slots` chunks can be in flight; further callers wait for a free slot.
+
+    The worker is a fresh interpreter running helpers.embedding_worker_main, not a multiprocessing child:
+    spawned children re-import the script that started the parent, which here is the Tkinter app with its
+    audio, GUI, database and API imports.
+    """
+
+    def __init__(self, slots=16, max_chunk_seconds=60, sample_rate=16000):
+        """
+        Args:
+            slots (int): Chunks that can be in flight at once.
+            max_chunk_seconds (float): Size of each slot; longer chunks are embedded from their first
+                `max_chunk_seconds` seconds.
+            sample_rate (int): Sample rate used to size the slots.
+        """
+        self.slots = slots
+        self.slot_samples = int(max_chunk_seconds * sample_rate)
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * self.slot_samples * 2)
+        self.pcm_slots = np.ndarray((slots, self.slot_samples), dtype=np.int16, buffer=self.shm.buf)
+        self.free_slots = Queue()
+        for slot in range(slots):
+            self.free_slots.put(slot)
+        self.ready = Future()
+        self.load_report = {}
+        self.worker_stats = {}
+        self.pending = {}  # request id -> (Future, submitted at, slot)
+        self.request_ids = itertools.count()
+        self.completed = 0
+        self.failed = 0
+        self.truncated = 0
+        self.slot_wait_total = 0.0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.closed = False
+        self.connection = None
+        self.connected = threading.Event()
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self.started_at = time.perf_counter()
+        self.authkey = os.urandom(32)
+        # The worker imports helpers.* from the project root, wherever the app was started from
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        python_path = [root] + [path for path in os.environ.get('PYTHONPATH', '').split(os.pathsep) if path]
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'helpers.embedding_worker_main'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(python_path)),
+        )
+        settings = {'authkey': self.authkey.hex(), 'shm_name': self.shm.name, 'slots': slots,
+                    'slot_samples': self.slot_samples}
+        self.process.stdin.write(json.dumps(settings).encode('utf-8') + b'\n')
+        self.process.stdin.close()
+        self.listener = threading.Thread(target=self.listen, name="EmbeddingWorkerListener", daemon=True)
+        self.listener.start()
+
+    def connect(self):
+        # The worker writes the address it listens on once it has started; EOF means it exited first
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError("The embedding worker process exited before it started.")
+        address = json.loads(line)
+        self.connection = Client(tuple(address) if isinstance(address, list) else address, authkey=self.authkey)
+        self.connected.set()
+
+    def listen(self):
+        # Connects to the worker, then resolves futures from its responses and notices if it dies
+        try:
+            self.connect()
+        except Exception as e:
+            JSONManager.log_event("EmbeddingWorker Error", f"Could not connect to the embedding worker: {e}")
+            self.fail_pending(RuntimeError(f"Could not connect to the embedding worker: {e}"))
+            return
+        while True:
+            try:
+                if not self.connection.poll(1.0):
+                    if self.process.poll() is not None:
+                        self.fail_pending(RuntimeError("The embedding worker process exited."))
+                        return
+                    continue
+                kind, key, payload = self.connection.recv()
+            except (EOFError, OSError):
+                self.fail_pending(RuntimeError("The embedding worker process exited."))
+                return
+            if kind == 'ready':
+                self.load_report = dict(payload, process_start=round(time.perf_counter() - self.started_at, 3))
+                JSONManager.log_event("EmbeddingWorker", f"Embedding worker ready: {self.load_report}")
+                self.ready.set_result(True)
+            elif kind == 'failed':
+                JSONManager.log_event(
+                    "EmbeddingWorker Error", f"Embedding worker could not load the encoder: {payload}"
+                )
+                self.fail_pending(RuntimeError(payload))
+                return
+            elif kind == 'stats':
+                self.worker_stats = payload
+                return
+            else:
+                request_id, slot = key
+                with self._lock:
+                    entry = self.pending.pop(request_id, None)
+                    if entry is None:
+                        continue
+                    future, submitted_at, _ = entry
+                    latency = time.monotonic() - submitted_at
+                    self.latency_total += latency
+                    self.latency_max = max(self.latency_max, latency)
+                    if kind == 'done':
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+                self.free_slots.put(slot)
+                if kind == 'done':
+                    future.set_result(payload)
+                else:
+                    future.set_exception(RuntimeError(payload))
+
+    def fail_pending(self, error):
+        """
+        Marks the worker as gone: fails every pending chunk and hands its slot back, so callers waiting
+        for a slot wake up and see that the worker is closed.
+        """
+        with self._lock:
+            self.closed = True
+            pending, self.pending = self.pending, {}
+        if not self.ready.done():
+            self.ready.set_exception(error)
+        for future, _, slot in pending.values():
+            self.free_slots.put(slot)
+            future.set_exception(error)
+
+    def take_slot(self):
+        # Waits for a free slot, giving up once the worker is closed
+        while True:
+            if self.closed:
+                raise RuntimeError("The embedding worker is not running.")
+            try:
+                return self.free_slots.get(timeout=0.5)
+            except Empty:
+                continue
+
+    def submit(self, audio, sample_rate=16000, partials_rate=None):
+        """
+        Sends one chunk to the worker.
+
+        Args:
+            audio (np.ndarray or str): int16 PCM samples, or the path to an audio file.
+            sample_rate (int): Sample rate of `audio` when it is an array.
+            partials_rate (float): When set, also compute partial embeddings at this many windows per second
+                over the untrimmed samples (see EmbeddingBatcher.submit).
+
+        Returns:
+            Future: Resolves to the chunk's embedding, or to (embedding, partials, partial starts, window)
+                in the chunk's samples when `partials_rate` is set.
+        """
+        waited = time.monotonic()
+        slot = self.take_slot()
+        while not self.connected.wait(0.5):
+            if self.closed:
+                self.free_slots.put(slot)
+                raise RuntimeError("The embedding worker is not running.")
+        submitted_at = time.monotonic()
+        path, length = None, 0
+        if isinstance(audio, np.ndarray):
+            length = min(len(audio), self.slot_samples)
+            self.pcm_slots[slot, :length] = audio[:length]
+        else:
+            path = str(audio)
+        future = Future()
+        request_id = next(self.request_ids)
+        with self._lock:
+            if self.closed:
+                self.free_slots.put(slot)
+                raise RuntimeError("The embedding worker is not running.")
+            self.slot_wait_total += submitted_at - waited
+            self.truncated += int(length < len(audio)) if path is None else 0
+            self.pending[request_id] = (future, submitted_at, slot)
+        try:
+            with self._send_lock:
+                self.connection.send((request_id, slot, length, sample_rate, path, partials_rate))
+        except OSError as e:
+            self.fail_pending(RuntimeError(f"The embedding worker process exited: {e}"))
+        return future
+
+    def embed(self, audio, sample_rate=16000, timeout=None, partials_rate=None):
+        """
+        Embeds one chunk in the worker process and waits for the result.
+        """
+        return self.submit(audio, sample_rate, partials_rate).result(timeout)
+
+    def close(self, timeout=10.0):
+        """
+        Lets the worker finish the queued chunks, stops it and releases the shared memory.
+        """
+        with self._lock:
+            self.closed = True
+        if self.process.poll() is None:
+            if self.connected.is_set():
+                try:
+                    with self._send_lock:
+                        self.connection.send(None)
+                except OSError:
+                    pass
+            else:
+                self.process.terminate()
+            try:
+                self.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.process.terminate()
+                self.process.wait()
+        self.listener.join(timeout)
+        self.fail_pending(RuntimeError("The embedding worker was closed."))
+        if self.connection is not None:
+            self.connection.close()
+        self.process.stdout.close()
+        del self.pcm_slots
+        self.shm.close()
+        self.shm.unlink()
+
+    def stats(self):
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                'completed': self.completed,
+                'failed': self.failed,
+                'in_flight': len(self.pending),
+                'truncated': self.truncated,
+                'slot_wait_total': round(self.slot_wait_total, 3),
+                'latency_avg': round(self.latency_total / finished, 4) if finished else 0,
+                'latency_max': round(self.latency_max, 4),
+                'worker_batches': self.worker_stats,
+            }
@@ -0,0 +1,28 @@
+# embedding_worker_main.py
+"""
+Entry point of the embedding worker process started by helpers.embedding_worker.EmbeddingProcess.
+
+Run as `python -m helpers.embedding_worker_main`, so the worker imports only this module and what it
+needs. It reads its settings as one JSON line on stdin, writes the address it listens on to stdout and
+serves the parent over that connection.
+"""
+import json
+import os
+import sys
+from multiprocessing.connection import Listener
+from helpers.embedding_worker import run_worker
+
+
+def main():
+    settings = json.loads(sys.stdin.readline())
+    with Listener(authkey=bytes.fromhex(settings['authkey'])) as listener:
+        print(json.dumps(listener.address), flush=True)
+        # The parent stops reading stdout after the address, so send anything printed later to stderr
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+        connection = listener.accept()
+    with connection:
+        run_worker(settings['shm_name'], settings['slots'], settings['slot_samples'], connection)
+
+
+if __name__ == '__main__':
+    main()
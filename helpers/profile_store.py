@@ -0,0 +1,256 @@
+# profile_store.py
+import os
+import struct
+import threading
+import time
+import numpy as np
+from helpers.Manage_Json_files import JSONManager
+from helpers.quantization import STORAGE_CODES, check_storage, decode, encode, record_dtype, storage_from_code
+
+MAGIC = b'VPRF'
+VERSION = 1
+HEADER = struct.Struct('<4sIII')  # magic, version, embedding size, storage code (0, float32, in older stores)
+ID_WIDTH = 36  # str(uuid.uuid4())
+
+
+class ProfileStore:
+    """
+    Append-only on-disk store of voice profile embeddings.
+
+    Two files live side by side: `<name>.vec` holds a small header followed by fixed-width records
+    (float32, float16 or int8 with a per-record scale, as recorded in the header), and `<name>.ids`
+    holds one fixed-width ASCII id per record, in the same order. Loading memory-maps the records
+    instead of unpickling them, and new profiles are appended to the end of both files and fsynced in
+    batches, so adding a speaker never rewrites the store.
+
+    `<name>.cnt` holds one uint32 per record: how many chunks a profile's embedding averages. Records
+    and counts can be overwritten in place with `update`; a record of zeros is a deleted profile.
+    """
+
+    def __init__(self, directory, name='voice_profiles', sync_every=16, sync_interval=2.0, storage='float32'):
+        """
+        Args:
+            directory (str or Path): Folder holding the store files.
+            name (str): Base name of the store files.
+            storage (str): Record format of a new store. An existing store keeps its own until `convert`ed.
+            sync_every (int): Appended records that force an fsync.
+            sync_interval (float): Seconds after which the next append fsyncs whatever is pending.
+        """
+        self.vectors_path = os.path.join(directory, f"{name}.vec")
+        self.ids_path = os.path.join(directory, f"{name}.ids")
+        self.counts_path = os.path.join(directory, f"{name}.cnt")
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.dim = None
+        self.storage = check_storage(storage)
+        self.count = 0
+        self.unsynced = 0
+        self.syncs = 0
+        self.last_sync = time.monotonic()
+        self.updates = 0
+        self._vectors_file = None
+        self._ids_file = None
+        self._update_file = None
+        self._counts_file = None
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) >= HEADER.size
+
+    def _read_header(self):
+        with open(self.vectors_path, 'rb') as f:
+            magic, version, dim, storage_code = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.vectors_path} is not a version {VERSION} profile store.")
+        self.dim = dim
+        self.storage = storage_from_code(storage_code)
+
+    @property
+    def record_size(self):
+        return record_dtype(self.storage, self.dim).itemsize
+
+    def load(self):
+        """
+        Memory-maps the stored records. Pages are copy-on-write, so the returned array can be updated
+        in memory without touching the file.
+
+        Returns:
+            tuple: (list of ids, array of records in the store's `storage`, uint32 counts), or
+                ([], None, None) if the store is empty.
+        """
+        with self._lock:
+            if not self.exists():
+                return [], None, None
+            self._read_header()
+            record_size = self.record_size
+            vector_records = (os.path.getsize(self.vectors_path) - HEADER.size) // record_size
+            id_records = os.path.getsize(self.ids_path) // ID_WIDTH if os.path.exists(self.ids_path) else 0
+            self.count = min(vector_records, id_records)
+            if vector_records != id_records or (os.path.getsize(self.vectors_path) - HEADER.size) % record_size:
+                # A write was cut short: drop the incomplete tail so both files line up again
+                JSONManager.log_event(
+                    "ProfileStore", f"Truncating {vector_records} vectors / {id_records} ids to {self.count} records."
+                )
+                os.truncate(self.vectors_path, HEADER.size + self.count * record_size)
+                os.truncate(self.ids_path, self.count * ID_WIDTH)
+            if self.count == 0:
+                return [], None, None
+            with open(self.ids_path, 'rb') as f:
+                raw_ids = f.read(self.count * ID_WIDTH)
+            ids = [
+                raw_ids[i:i + ID_WIDTH].rstrip(b'\0').decode('ascii') for i in range(0, len(raw_ids), ID_WIDTH)
+            ]
+            vectors = np.memmap(
+                self.vectors_path, dtype=record_dtype(self.storage, self.dim), mode='c', offset=HEADER.size,
+                shape=(self.count,),
+            )
+            counts = np.ones(self.count, dtype=np.uint32)
+            if os.path.exists(self.counts_path):
+                stored = np.fromfile(self.counts_path, dtype=np.uint32)[:self.count]
+                counts[:len(stored)] = stored
+            return ids, vectors, counts
+
+    def _open(self, dim):
+        # Called with the lock held
+        if self._vectors_file is None:
+            if self.dim is None and self.exists():
+                self._read_header()
+            self._vectors_file = open(self.vectors_path, 'ab', buffering=0)
+            self._ids_file = open(self.ids_path, 'ab', buffering=0)
+            if self._vectors_file.tell() == 0:
+                self.dim = dim
+                self._vectors_file.write(HEADER.pack(MAGIC, VERSION, dim, STORAGE_CODES[self.storage]))
+        if dim != self.dim:
+            raise ValueError(f"Embedding size {dim} does not match the store's {self.dim}.")
+
+    def append(self, profile_id, embedding, count=1):
+        """
+        Appends one profile.
+        """
+        self.extend([profile_id], [embedding], [count])
+
+    def extend(self, profile_ids, embeddings, counts=None):
+        """
+        Appends several profiles. They reach the OS immediately and are fsynced once `sync_every`
+        records or `sync_interval` seconds have accumulated.
+        """
+        vectors = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        encoded_ids = []
+        for profile_id in profile_ids:
+            encoded = profile_id.encode('ascii')
+            if len(encoded) > ID_WIDTH:
+                raise ValueError(f"Profile id {profile_id!r} is longer than {ID_WIDTH} characters.")
+            encoded_ids.append(encoded.ljust(ID_WIDTH, b'\0'))
+        with self._lock:
+            self._open(vectors.shape[1])
+            # Vectors first: on a crash the ids file is the shorter one and load() trims the vectors
+            self._vectors_file.write(encode(vectors, self.storage).tobytes())
+            self._ids_file.write(b''.join(encoded_ids))
+            if counts is not None:
+                self._write_counts(self.count, counts)
+            self.count += len(vectors)
+            self.unsynced += len(vectors)
+            if self.unsynced >= self.sync_every or time.monotonic() - self.last_sync >= self.sync_interval:
+                self._sync()
+
+    def _write_counts(self, row, counts):
+        # Called with the lock held; rows never written read back as 1
+        if self._counts_file is None:
+            mode = 'r+b' if os.path.exists(self.counts_path) else 'w+b'
+            self._counts_file = open(self.counts_path, mode, buffering=0)
+        self._counts_file.seek(row * 4)
+        self._counts_file.write(np.asarray(counts, dtype=np.uint32).tobytes())
+
+    def update(self, row, embedding, count=None):
+        """
+        Overwrites the embedding (and optionally the count) stored in `row`. Synced with the appends.
+        """
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        with self._lock:
+            if not 0 <= row < self.count:
+                raise IndexError(f"Profile row {row} is outside the store ({self.count} records).")
+            if len(vector) != self.dim:
+                raise ValueError(f"Embedding size {len(vector)} does not match the store's {self.dim}.")
+            if self._update_file is None:
+                self._update_file = open(self.vectors_path, 'r+b', buffering=0)
+            self._update_file.seek(HEADER.size + row * self.record_size)
+            self._update_file.write(encode(vector, self.storage).tobytes())
+            if count is not None:
+                self._write_counts(row, [count])
+            self.updates += 1
+            self.unsynced += 1
+            if self.unsynced >= self.sync_every or time.monotonic() - self.last_sync >= self.sync_interval:
+                self._sync()
+
+    def delete(self, row):
+        """
+        Marks a profile as deleted by zeroing its embedding.
+        """
+        self.update(row, np.zeros(self.dim, dtype=np.float32), 0)
+
+    def convert(self, storage):
+        """
+        Rewrites every record in another storage format. The new file is written next to the old one
+        and renamed over it, so a crash leaves one complete store or the other.
+        """
+        check_storage(storage)
+        ids, records, _ = self.load()
+        if records is None:
+            # Nothing stored yet: the next append writes a header in the new format
+            self.close()
+            if self.exists():
+                os.truncate(self.vectors_path, 0)
+            self.storage = storage
+            return
+        if storage == self.storage:
+            return
+        self.close()
+        with self._lock:
+            converted_path = f"{self.vectors_path}.converting"
+            with open(converted_path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, self.dim, STORAGE_CODES[storage]))
+                for first in range(0, len(records), 16384):
+                    f.write(encode(decode(records[first:first + 16384], self.storage), storage).tobytes())
+                os.fsync(f.fileno())
+            del records
+            old_storage, self.storage = self.storage, storage
+            os.replace(converted_path, self.vectors_path)
+        JSONManager.log_event(
+            "ProfileStore", f"Converted {len(ids)} profiles from {old_storage} to {storage} records."
+        )
+
+    def _sync(self):
+        # Called with the lock held
+        if self.unsynced == 0:
+            return
+        for f in (self._vectors_file, self._ids_file, self._update_file, self._counts_file):
+            if f is not None:
+                os.fsync(f.fileno())
+        self.unsynced = 0
+        self.syncs += 1
+        self.last_sync = time.monotonic()
+
+    def flush(self):
+        """
+        Fsyncs every appended record.
+        """
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            self._sync()
+            for f in (self._vectors_file, self._ids_file, self._update_file, self._counts_file):
+                if f is not None:
+                    f.close()
+            self._vectors_file = self._ids_file = self._update_file = self._counts_file = None
+
+    def stats(self):
+        return {
+            'records': self.count,
+            'storage': self.storage,
+            'bytes_per_record': self.record_size if self.dim else 0,
+            'updates': self.updates,
+            'unsynced': self.unsynced,
+            'fsyncs': self.syncs,
+        }
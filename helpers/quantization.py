@@ -0,0 +1,99 @@
+# quantization.py
+import numpy as np
+
+# Stored in the profile store header, so the codes must never change
+STORAGE_CODES = {
+    'float32': 0,
+    'float16': 1,
+    'int8': 2,
+}
+
+
+def check_storage(storage):
+    if storage not in STORAGE_CODES:
+        raise ValueError(f"Unknown embedding storage '{storage}'. Choose one of: {', '.join(STORAGE_CODES)}.")
+    return storage
+
+
+def storage_from_code(code):
+    for storage, storage_code in STORAGE_CODES.items():
+        if storage_code == code:
+            return storage
+    raise ValueError(f"Unknown embedding storage code {code}.")
+
+
+def record_dtype(storage, dim):
+    """
+    The numpy dtype of one stored embedding.
+
+    float32 and float16 records are plain vectors, so arrays of them are (n, dim). int8 records hold a
+    float32 scale followed by `dim` int8 values (the vector is values * scale), so arrays of them are
+    one-dimensional structured arrays.
+    """
+    check_storage(storage)
+    if storage == 'int8':
+        return np.dtype([('scale', '<f4'), ('values', 'i1', (dim,))])
+    return np.dtype(('<f4' if storage == 'float32' else '<f2', (dim,)))
+
+
+def record_dim(records):
+    """
+    Embedding size of an array of records.
+    """
+    if records.dtype.names:
+        return records.dtype['values'].shape[0]
+    return records.shape[-1]
+
+
+def encode(vectors, storage):
+    """
+    Converts float32 vectors into records of `storage`.
+
+    int8 uses one scale per vector (its largest magnitude / 127), so every vector keeps the full int8
+    range whatever its values.
+    """
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    dtype = record_dtype(storage, vectors.shape[1])
+    if storage != 'int8':
+        return vectors.astype(dtype.base)
+    records = np.empty(len(vectors), dtype=dtype)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    records['scale'] = scales
+    records['values'] = np.rint(vectors / np.maximum(scales, 1e-12)[:, None])
+    return records
+
+
+def decode(records, storage):
+    """
+    Converts records of `storage` (an array of them, or one record) back into float32 vectors.
+    """
+    if storage == 'int8':
+        return records['values'].astype(np.float32) * np.asarray(records['scale'], dtype=np.float32)[..., None]
+    return np.asarray(records, dtype=np.float32)
+
+
+def score(queries, records, storage, block=1024):
+    """
+    Dot products of float32 `queries` with every record, without decoding the whole array at once.
+
+    numpy has no float16 or int8 matrix product, so each block of records is widened to float32 before
+    its product; the int8 scale is applied to the products rather than to the values. Small blocks stay
+    in cache between the widening and the product. int8 then scores a little faster than float32 on large
+    stores, since a quarter of the bytes are read from memory. numpy's float16 conversion is slow, so
+    float16 scores several times slower than float32; VoiceManager only uses float16 on disk and matches
+    against float32 rows.
+
+    Returns:
+        np.ndarray: (len(queries), len(records)) float32 similarities.
+    """
+    if storage == 'float32':
+        return queries @ records.T
+    similarities = np.empty((len(queries), len(records)), dtype=np.float32)
+    for first in range(0, len(records), block):
+        chunk = records[first:first + block]
+        if storage == 'int8':
+            products = queries @ chunk['values'].astype(np.float32).T
+            similarities[:, first:first + block] = products * chunk['scale']
+        else:
+            similarities[:, first:first + block] = queries @ chunk.astype(np.float32).T
+    return similarities
@@ -0,0 +1,119 @@
+# reorder_buffer.py
+import threading
+import time
+from collections import deque
+from helpers.Manage_Json_files import JSONManager
+
+
+class ReorderBuffer:
+    """
+    Releases results of concurrently processed chunks in capture order.
+
+    Every chunk is tagged with a sequence number when it is captured. Workers report each sequence
+    number exactly once through `complete`, with the result or None when the chunk produced nothing
+    (silence, dropped under backpressure, failed). Results are passed to `on_release` strictly in
+    sequence order; a missing sequence number only holds back later results for `max_wait` seconds.
+    `on_release` runs outside the buffer's lock, one result at a time, so it may block (e.g. on a full
+    queue) without stopping other workers from completing their chunks.
+    """
+
+    def __init__(self, on_release, max_wait=60.0):
+        """
+        Args:
+            on_release (callable): Called with each result, in capture order.
+            max_wait (float): Seconds to wait for a missing sequence number before skipping it.
+        """
+        self.on_release = on_release
+        self.max_wait = max_wait
+        self.next_seq = 0
+        self.pending = {}  # seq -> result (None for chunks that produced nothing)
+        self.ready = deque()  # released results not yet passed to on_release, in order
+        self.delivering = False
+        self.blocked_since = None
+        self.released = 0
+        self.skipped = 0
+        self.timeouts = 0
+        self.max_pending = 0
+        self._lock = threading.Lock()
+
+    def complete(self, seqs, result=None):
+        """
+        Records the outcome of the chunk covering `seqs` (several when chunks were merged).
+        The result is attached to the first of them.
+        """
+        with self._lock:
+            for index, seq in enumerate(seqs):
+                if seq >= self.next_seq:
+                    self.pending[seq] = result if index == 0 else None
+            self.max_pending = max(self.max_pending, len(self.pending))
+            self._release_ready()
+            if self.pending and self.blocked_since is not None \
+                    and time.monotonic() - self.blocked_since > self.max_wait:
+                JSONManager.log_event("ReorderBuffer", f"Gave up waiting for chunk {self.next_seq}.")
+                self.timeouts += 1
+                self._skip_to(min(self.pending))
+        self._deliver()
+
+    def flush(self):
+        """
+        Releases everything still held, in order, e.g. once all workers have finished.
+        """
+        with self._lock:
+            if self.pending:
+                self._skip_to(max(self.pending) + 1)
+        self._deliver()
+
+    def _deliver(self):
+        # Passes released results to on_release without holding the lock. Only one thread delivers at a
+        # time, so results keep their order; a thread that finds another delivering leaves its results to it
+        with self._lock:
+            if self.delivering:
+                return
+            self.delivering = True
+        try:
+            while True:
+                with self._lock:
+                    if not self.ready:
+                        self.delivering = False
+                        return
+                    result = self.ready.popleft()
+                self.on_release(result)
+        except BaseException:
+            with self._lock:
+                self.delivering = False
+            raise
+
+    def _release_ready(self):
+        # Called with the lock held
+        advanced = False
+        while self.next_seq in self.pending:
+            result = self.pending.pop(self.next_seq)
+            self.next_seq += 1
+            advanced = True
+            if result is None:
+                self.skipped += 1
+            else:
+                self.released += 1
+                self.ready.append(result)
+        if not self.pending:
+            self.blocked_since = None
+        elif advanced or self.blocked_since is None:
+            self.blocked_since = time.monotonic()
+
+    def _skip_to(self, seq):
+        # Called with the lock held: treats every missing sequence number before `seq` as empty
+        for missing in range(self.next_seq, seq):
+            self.pending.setdefault(missing, None)
+        self.blocked_since = None
+        self._release_ready()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'next_seq': self.next_seq,
+                'released': self.released,
+                'skipped': self.skipped,
+                'timeouts': self.timeouts,
+                'held': len(self.pending),
+                'max_held': self.max_pending,
+            }
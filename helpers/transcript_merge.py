@@ -0,0 +1,90 @@
+# transcript_merge.py
+import re
+import threading
+
+_PUNCTUATION = re.compile(r"[^\w']+")
+
+
+def normalize_word(word):
+    """
+    Lowercases a word and strips punctuation so "Okay," and "okay" compare equal.
+    """
+    return _PUNCTUATION.sub("", word.lower())
+
+
+def remove_boundary_overlap(previous_text, next_text, max_overlap_words=15, min_match_words=2, max_edge_skip=2):
+    """
+    Removes the words at the start of `next_text` that repeat the end of `previous_text`.
+
+    Consecutive chunks share a little audio, so Whisper often transcribes the same words at the end of
+    one chunk and the start of the next. The longest run of words that ends at (or one word before) the
+    end of the previous text and starts within `max_edge_skip` words of the start of the next text is
+    treated as the duplicate; the skipped edge words are usually a word cut in half by the boundary.
+
+    Args:
+        previous_text (str): Transcription of the earlier chunk.
+        next_text (str): Transcription of the chunk that overlaps it.
+        max_overlap_words (int): How many words at each edge are compared.
+        min_match_words (int): Shortest run accepted as a duplicate. A single word is only accepted
+            when it sits exactly on both edges and is at least four letters long.
+        max_edge_skip (int): Words at the start of `next_text` that may precede the duplicate run.
+
+    Returns:
+        str: `next_text` without the duplicated words.
+    """
+    tail = [normalize_word(word) for word in previous_text.split()[-max_overlap_words:]]
+    next_words = next_text.split()
+    head = [normalize_word(word) for word in next_words[:max_overlap_words]]
+
+    for size in range(min(len(tail), len(head)), 0, -1):
+        for skip_tail in (0, 1):
+            tail_end = len(tail) - skip_tail
+            if tail_end - size < 0:
+                continue
+            candidate = tail[tail_end - size:tail_end]
+            if not all(candidate):
+                continue
+            for skip_head in range(0, max_edge_skip + 1):
+                if head[skip_head:skip_head + size] != candidate:
+                    continue
+                single_word_ok = size == 1 and skip_tail == 0 and skip_head == 0 and len(candidate[0]) >= 4
+                if size >= min_match_words or single_word_ok:
+                    return " ".join(next_words[skip_head + size:])
+    return next_text
+
+
+class BoundaryDeduplicator:
+    """
+    Applies remove_boundary_overlap to a stream of transcriptions released in capture order.
+    """
+
+    def __init__(self, max_overlap_words=15):
+        self.max_overlap_words = max_overlap_words
+        self.previous_text = ""
+        self.words_in = 0
+        self.words_removed = 0
+        self._lock = threading.Lock()
+
+    def process(self, text, overlaps_previous):
+        """
+        Returns `text` without the words it repeats from the previous transcription.
+
+        Args:
+            text (str): The next transcription.
+            overlaps_previous (bool): True when its audio starts with the end of the previous chunk's audio.
+        """
+        with self._lock:
+            deduped = text
+            if overlaps_previous and self.previous_text:
+                deduped = remove_boundary_overlap(self.previous_text, text, self.max_overlap_words)
+            self.previous_text = text
+            words = len(text.split())
+            self.words_in += words
+            self.words_removed += words - len(deduped.split())
+            return deduped
+
+    def stats(self):
+        return {
+            'words_in': self.words_in,
+            'words_removed': self.words_removed,
+        }
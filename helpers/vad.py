@@ -0,0 +1,309 @@
+# vad.py
+import numpy as np
+from helpers.Manage_Json_files import JSONManager
+from helpers.audio_buffer import merge_chunks
+
+
+class EnergyVAD:
+    """
+    Frame-level voice activity detector based on short-term energy and zero-crossing rate.
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=30, energy_threshold_db=-45.0,
+                 noise_margin_db=10.0, zcr_threshold=0.35, floor_rise=0.002, floor_fall=0.1):
+        """
+        Args:
+            sample_rate (int): Sample rate of the int16 PCM that will be analysed.
+            frame_ms (int): Analysis frame length in milliseconds.
+            energy_threshold_db (float): Absolute floor (dBFS) below which a frame is never speech.
+            noise_margin_db (float): How far above the tracked noise floor a frame must be to count as speech.
+            zcr_threshold (float): Frames crossing zero more often than this are treated as noise
+                unless they are also well above the energy threshold.
+            floor_rise (float): Per-frame rate at which the noise floor follows louder audio.
+            floor_fall (float): Per-frame rate at which the noise floor follows quieter audio.
+        """
+        self.sample_rate = sample_rate
+        self.frame_samples = int(sample_rate * frame_ms / 1000)
+        self.energy_threshold_db = energy_threshold_db
+        self.noise_margin_db = noise_margin_db
+        self.zcr_threshold = zcr_threshold
+        self.floor_rise = floor_rise
+        self.floor_fall = floor_fall
+        self.noise_floor_db = energy_threshold_db - noise_margin_db
+
+    def speech_frames(self, pcm):
+        """
+        Returns one boolean per full frame of `pcm`, True where the frame contains speech.
+        """
+        n_frames = len(pcm) // self.frame_samples
+        if n_frames == 0:
+            return np.zeros(0, dtype=bool)
+        frames = np.asarray(pcm[:n_frames * self.frame_samples]).reshape(n_frames, self.frame_samples)
+        samples = frames.astype(np.float32) / 32768.0
+        rms = np.sqrt(np.mean(samples * samples, axis=1))
+        energy_db = 20.0 * np.log10(rms + 1e-10)
+        zcr = np.mean(np.signbit(frames[:, 1:]) != np.signbit(frames[:, :-1]), axis=1)
+
+        threshold_db = max(self.energy_threshold_db, self.noise_floor_db + self.noise_margin_db)
+        loud = energy_db > threshold_db
+        speech = loud & ((zcr < self.zcr_threshold) | (energy_db > threshold_db + self.noise_margin_db))
+
+        # Track the noise floor from the quietest frames so the threshold follows the room. It falls
+        # quickly and rises slowly, per frame, so long stretches of speech don't pull it up to speech level.
+        quiet_db = float(np.percentile(energy_db, 10))
+        rate = self.floor_fall if quiet_db < self.noise_floor_db else self.floor_rise
+        self.noise_floor_db += (1.0 - (1.0 - rate) ** n_frames) * (quiet_db - self.noise_floor_db)
+        return speech
+
+
+class WebRTCVAD:
+    """
+    Model-based voice activity detector backed by the webrtcvad package (installed with resemblyzer).
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=30, aggressiveness=2):
+        """
+        Args:
+            sample_rate (int): 8000, 16000, 32000 or 48000.
+            frame_ms (int): 10, 20 or 30.
+            aggressiveness (int): 0 (least) to 3 (most aggressive at filtering out non-speech).
+        """
+        try:
+            import webrtcvad
+        except ImportError:
+            raise ImportError("The 'webrtc' detector requires webrtcvad. Install it with `pip install webrtcvad`.")
+        self.sample_rate = sample_rate
+        self.frame_samples = int(sample_rate * frame_ms / 1000)
+        self.vad = webrtcvad.Vad(aggressiveness)
+
+    def speech_frames(self, pcm):
+        """
+        Returns one boolean per full frame of `pcm`, True where the frame contains speech.
+        """
+        pcm = np.ascontiguousarray(pcm, dtype=np.int16)
+        n_frames = len(pcm) // self.frame_samples
+        return np.array([
+            self.vad.is_speech(pcm[i * self.frame_samples:(i + 1) * self.frame_samples].tobytes(), self.sample_rate)
+            for i in range(n_frames)
+        ], dtype=bool)
+
+
+VAD_DETECTORS = {
+    'energy': EnergyVAD,
+    'webrtc': WebRTCVAD,
+}
+
+
+def create_detector(name, sample_rate=16000, **kwargs):
+    """
+    Builds a frame-level detector by name ('energy' or 'webrtc').
+    """
+    if name not in VAD_DETECTORS:
+        raise ValueError(f"Unknown VAD detector '{name}'. Choose one of: {', '.join(VAD_DETECTORS)}.")
+    return VAD_DETECTORS[name](sample_rate=sample_rate, **kwargs)
+
+
+class VoiceActivityGate:
+    """
+    Drops silent windows and merges near-silent ones into their neighbour before they are queued.
+    """
+
+    def __init__(self, detector='energy', sample_rate=16000, min_speech_ratio=0.05, near_silence_ratio=0.25,
+                 **detector_kwargs):
+        """
+        Args:
+            detector (str): Name of the frame-level detector, see VAD_DETECTORS.
+            sample_rate (int): Sample rate of the incoming windows.
+            min_speech_ratio (float): Windows with less speech than this are dropped.
+            near_silence_ratio (float): Windows below this are held back and merged with the next window.
+        """
+        self.detector = create_detector(detector, sample_rate=sample_rate, **detector_kwargs)
+        self.min_speech_ratio = min_speech_ratio
+        self.near_silence_ratio = near_silence_ratio
+        self.pending = None
+        self.windows_seen = 0
+        self.windows_dropped = 0
+        self.windows_merged = 0
+        self.frames_total = 0
+        self.frames_suppressed = 0
+
+    def speech_ratio(self, pcm):
+        """
+        Fraction of frames in `pcm` that the detector marks as speech.
+        """
+        speech = self.detector.speech_frames(pcm)
+        self.frames_total += len(speech)
+        if len(speech) == 0:
+            return 0.0, 0
+        return float(np.mean(speech)), len(speech)
+
+    def process(self, chunk):
+        """
+        Gates one chunk (a dict with 'pcm' and 'overlap_samples').
+
+        Returns:
+            list: The chunks (zero or one) that should be queued. A merged chunk keeps the
+            metadata of the held-back chunk it starts with.
+        """
+        self.windows_seen += 1
+        ratio, n_frames = self.speech_ratio(chunk['pcm'])
+
+        if ratio < self.min_speech_ratio:
+            self.windows_dropped += 1
+            self.frames_suppressed += n_frames
+            return self.flush()
+
+        if self.pending is not None:
+            merged = merge_chunks(self.pending, chunk)
+            self.pending = None
+            self.windows_merged += 1
+            return [merged]
+
+        if ratio < self.near_silence_ratio:
+            # The chunk may be a view into the capture ring, and nothing is emitted until speech resumes,
+            # which can be long after the ring has reused its storage: keep a copy instead.
+            self.pending = dict(chunk, pcm=np.array(chunk['pcm']))
+            return []
+        return [chunk]
+
+    def flush(self):
+        """
+        Releases a held near-silent chunk, e.g. when recording stops.
+        """
+        if self.pending is None:
+            return []
+        pending, self.pending = self.pending, None
+        return [pending]
+
+    def stats(self):
+        """
+        Reports how much audio the gate kept away from embedding and transcription.
+        """
+        return {
+            'windows_seen': self.windows_seen,
+            'windows_dropped': self.windows_dropped,
+            'windows_merged': self.windows_merged,
+            'requests_saved': self.windows_dropped + self.windows_merged,
+            'frames_total': self.frames_total,
+            'frames_suppressed': self.frames_suppressed,
+        }
+
+    def log_stats(self):
+        JSONManager.log_event("VoiceActivityGate", f"VAD stats: {self.stats()}")
+
+
+class PauseAlignedChunker:
+    """
+    Ends segments at pauses instead of at fixed intervals.
+
+    A segment is closed at the first pause after `min_duration`, or forced closed at
+    `max_duration`. Only forced cuts carry an overlap into the next segment, because
+    pause-aligned cuts don't split words. Leading silence is skipped rather than emitted.
+    """
+
+    def __init__(self, detector='energy', sample_rate=16000, min_duration=2.0, max_duration=15.0,
+                 pause_duration=0.4, overlap_duration=0.5, **detector_kwargs):
+        """
+        Args:
+            detector (str): Name of the frame-level detector, see VAD_DETECTORS.
+            sample_rate (int): Sample rate of the audio in the ring buffer.
+            min_duration (float): Shortest segment (seconds) that may be closed at a pause.
+            max_duration (float): Longest segment (seconds) before a cut is forced.
+            pause_duration (float): Length of silence (seconds) that counts as a pause.
+            overlap_duration (float): Overlap (seconds) carried into the next segment after a forced cut.
+        """
+        self.detector = create_detector(detector, sample_rate=sample_rate, **detector_kwargs)
+        self.frame_samples = self.detector.frame_samples
+        self.min_samples = int(sample_rate * min_duration)
+        self.max_samples = int(sample_rate * max_duration)
+        self.pause_samples = int(sample_rate * pause_duration)
+        self.overlap_samples = int(sample_rate * overlap_duration)
+        self.segment_start = 0
+        self.segment_overlap = 0
+        self.analysed_pos = 0
+        self.silence_start = 0  # Start of the current run of silent frames, None while speech is ongoing
+        self.has_speech = False
+        self.pause_cuts = 0
+        self.forced_cuts = 0
+
+    def update(self, ring):
+        """
+        Analyses audio written to `ring` since the last call.
+
+        Returns:
+            list: (start, end, overlap_samples) windows, in absolute sample positions, ready to be queued.
+        """
+        windows = []
+        while True:
+            available = min(ring.write_pos - self.analysed_pos, ring.max_window)
+            available -= available % self.frame_samples
+            if available <= 0:
+                return windows
+            speech = self.detector.speech_frames(ring.window(self.analysed_pos, self.analysed_pos + available))
+            for index, is_speech in enumerate(speech):
+                frame_start = self.analysed_pos + index * self.frame_samples
+                if is_speech:
+                    self.silence_start = None
+                    self.has_speech = True
+                elif self.silence_start is None:
+                    self.silence_start = frame_start
+                window = self.check_cut(frame_start + self.frame_samples)
+                if window:
+                    windows.append(window)
+            self.analysed_pos += available
+
+    def check_cut(self, position):
+        """
+        Decides whether the current segment ends at `position`.
+        """
+        in_pause = self.silence_start is not None and position - self.silence_start >= self.pause_samples
+        if in_pause and not self.has_speech:
+            # Nothing said yet: slide the segment forward, keeping half a pause as lead-in
+            self.segment_start = position - self.pause_samples // 2
+            self.segment_overlap = 0
+            return None
+        if in_pause and position - self.segment_start >= self.min_samples:
+            cut = self.silence_start + self.pause_samples // 2
+            self.pause_cuts += 1
+            return self.close_segment(cut, 0)
+        if position - self.segment_start >= self.max_samples:
+            self.forced_cuts += 1
+            return self.close_segment(position, self.overlap_samples)
+        return None
+
+    def close_segment(self, cut, next_overlap):
+        window = (self.segment_start - self.segment_overlap, cut, self.segment_overlap)
+        self.segment_start = cut
+        self.segment_overlap = min(next_overlap, cut)
+        self.has_speech = False
+        return window
+
+    def oldest_needed(self):
+        """
+        Earliest absolute sample the chunker may still read from the ring.
+        """
+        return min(self.analysed_pos, self.segment_start - self.segment_overlap)
+
+    def resync(self, position):
+        """
+        Abandons the segment in progress and restarts analysis at `position`, after the audio
+        before it was overwritten or lost.
+        """
+        self.analysed_pos = self.segment_start = self.silence_start = position
+        self.segment_overlap = 0
+        self.has_speech = False
+
+    def flush(self, ring):
+        """
+        Closes the segment in progress, e.g. when recording stops.
+        """
+        windows = self.update(ring)
+        if self.has_speech and ring.write_pos > self.segment_start:
+            windows.append(self.close_segment(ring.write_pos, 0))
+        return windows
+
+    def stats(self):
+        return {
+            'pause_cuts': self.pause_cuts,
+            'forced_cuts': self.forced_cuts,
+        }
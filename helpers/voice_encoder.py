@@ -0,0 +1,89 @@
+# voice_encoder.py
+import threading
+import time
+from concurrent.futures import Future
+from helpers.Manage_Json_files import JSONManager
+
+# One resemblyzer model per process, shared by every VoiceManager
+_lock = threading.Lock()
+_ready = None
+_timings = {}
+
+
+def _load(future):
+    try:
+        started = time.perf_counter()
+        import torch  # noqa: F401  (timed separately, it is most of the import cost)
+        torch_imported = time.perf_counter()
+        import resemblyzer
+        resemblyzer_imported = time.perf_counter()
+        encoder = resemblyzer.VoiceEncoder(verbose=False)
+        loaded = time.perf_counter()
+        _timings.update({
+            'import_torch': round(torch_imported - started, 3),
+            'import_resemblyzer': round(resemblyzer_imported - torch_imported, 3),
+            'model_load': round(loaded - resemblyzer_imported, 3),
+            'total': round(loaded - started, 3),
+            'device': str(encoder.device),
+        })
+        JSONManager.log_event("VoiceEncoder", f"Speaker encoder ready: {_timings}")
+        future.set_result((encoder, resemblyzer.preprocess_wav))
+    except ImportError as e:
+        JSONManager.log_event("VoiceEncoder Error", f"{e}. Install it with: pip install resemblyzer")
+        future.set_exception(e)
+    except Exception as e:
+        JSONManager.log_event("VoiceEncoder Error", f"Error loading the speaker encoder: {e}")
+        future.set_exception(e)
+
+
+def load_encoder_async():
+    """
+    Starts loading the shared speaker encoder on a background thread, the first time it is called.
+
+    Returns:
+        Future: Resolves to (VoiceEncoder, preprocess_wav) once the model is loaded.
+    """
+    global _ready
+    with _lock:
+        if _ready is None:
+            _ready = Future()
+            _timings['requested_at'] = time.time()
+            threading.Thread(target=_load, args=(_ready,), name="VoiceEncoderLoader", daemon=True).start()
+        return _ready
+
+
+def get_encoder(timeout=None):
+    """
+    Returns (VoiceEncoder, preprocess_wav), waiting up to `timeout` seconds for the model to load.
+    Raises the loading error if the model could not be loaded.
+    """
+    return load_encoder_async().result(timeout)
+
+
+def encoder_ready():
+    return _ready is not None and _ready.done() and _ready.exception() is None
+
+
+def load_report():
+    """
+    Returns how long importing torch and resemblyzer and loading the model took, in seconds.
+    """
+    return dict(_timings)
+
+
+def preprocess_untrimmed(pcm_float, sample_rate):
+    """
+    Prepares audio for the encoder like resemblyzer.preprocess_wav (resampling and volume normalisation)
+    but without trimming silences, so positions in the result still map onto the input.
+
+    Returns:
+        tuple: (waveform at the encoder's sample rate, encoder rate / `sample_rate`)
+    """
+    from resemblyzer import audio, hparams
+
+    wav = pcm_float
+    if sample_rate != hparams.sampling_rate:
+        import librosa
+        wav = librosa.resample(wav, orig_sr=sample_rate, target_sr=hparams.sampling_rate)
+    wav = audio.normalize_volume(wav, hparams.audio_norm_target_dBFS, increase_only=True)
+    return wav, hparams.sampling_rate / sample_rate
@@ -1,96 +1,695 @@
 # VoiceIds.py
 import os
 import pickle
+import threading
+import time
+from collections import OrderedDict
+from queue import Queue, Empty
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 import numpy as np
-from resemblyzer import VoiceEncoder, preprocess_wav
 import uuid
 from helpers.Manage_Json_files import JSONManager  # Adjust the import based on your project structure
+from helpers.audio_encoding import pcm_to_float
+from helpers.embedding_index import normalize_rows, distance_to_similarity, similarity_to_distance
+from helpers.profile_store import ProfileStore
+from helpers.quantization import decode
+from helpers.ann_index import ANN_INDEXES, create_index
+from helpers.voice_encoder import load_encoder_async, get_encoder, load_report, preprocess_untrimmed
+from helpers.diarization import segment_partials
+from helpers.embedding_worker import EmbeddingProcess
 from pathlib import Path
 
 
+class EmbeddingBatcher:
+    """
+    Runs speaker embeddings for concurrent chunks through the encoder together.
+
+    resemblyzer embeds an utterance by cutting its mel spectrogram into fixed-width partial windows,
+    embedding each window and averaging. The windows of every chunk submitted within `max_wait`
+    seconds of each other are stacked into a single tensor, so the workers share one forward pass
+    instead of contending for the GIL and torch's thread pool with many small ones.
+    """
+
+    def __init__(self, max_batch=16, max_wait=0.005, encoder_timeout=120.0):
+        """
+        Args:
+            max_batch (int): Most chunks embedded in one forward pass.
+            max_wait (float): Seconds to keep collecting chunks after the first one arrives.
+            encoder_timeout (float): Seconds to wait for the shared encoder to finish loading.
+        """
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.encoder_timeout = encoder_timeout
+        self.requests = Queue()
+        self.thread = None
+        self.batches = 0
+        self.chunks = 0
+        self.partials = 0
+        self.largest_batch = 0
+        self.forward_seconds = 0.0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self._lock = threading.Lock()
+
+    def submit(self, wav, rate=1.3, min_coverage=0.75, return_partials=False):
+        """
+        Queues one preprocessed waveform (float32, at the encoder's sample rate) for embedding.
+        The mel spectrogram is computed on the calling thread; only the forward pass is batched.
+
+        Args:
+            wav (np.ndarray): The waveform.
+            rate (float): Partial windows per second.
+            min_coverage (float): Shortest fraction of a window the last partial may cover.
+            return_partials (bool): Also return the partial embeddings, like embed_utterance(return_partials=True).
+
+        Returns:
+            Future: Resolves to the chunk's unit-norm embedding, or with `return_partials` to
+                (embedding, (n, dim) partial embeddings, first sample of each partial's window, window length).
+        """
+        encoder, _ = get_encoder(self.encoder_timeout)
+        from resemblyzer.audio import wav_to_mel_spectrogram
+
+        # Same partial windows as VoiceEncoder.embed_utterance
+        wav_slices, mel_slices = encoder.compute_partial_slices(len(wav), rate, min_coverage)
+        if wav_slices[-1].stop >= len(wav):
+            wav = np.pad(wav, (0, wav_slices[-1].stop - len(wav)), "constant")
+        mel = wav_to_mel_spectrogram(wav)
+        mels = np.array([mel[s] for s in mel_slices])
+
+        future = Future()
+        with self._lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="EmbeddingBatcher", daemon=True)
+                self.thread.start()
+        slices = wav_slices if return_partials else None
+        self.requests.put((mels, future, time.monotonic(), slices))
+        return future
+
+    def embed(self, wav, timeout=None):
+        """
+        Embeds one preprocessed waveform, waiting for the batch it lands in.
+        """
+        return self.submit(wav).result(timeout)
+
+    def collect(self):
+        # Blocks for the first request, then gathers whatever else arrives within max_wait
+        first = self.requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=remaining)
+            except Empty:
+                break
+            if request is None:
+                self.requests.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def run(self):
+        import torch
+
+        encoder, _ = get_encoder(self.encoder_timeout)
+        while True:
+            batch = self.collect()
+            if batch is None:
+                return
+            started = time.monotonic()
+            try:
+                counts = [len(request[0]) for request in batch]
+                with torch.no_grad():
+                    stacked = torch.from_numpy(np.concatenate([request[0] for request in batch])).to(encoder.device)
+                    partial_embeds = encoder(stacked).cpu().numpy()
+            except Exception as e:
+                JSONManager.log_event("EmbeddingBatcher Error", f"Batch of {len(batch)} chunks failed: {e}")
+                for request in batch:
+                    request[1].set_exception(e)
+                continue
+            finished = time.monotonic()
+            first = 0
+            for (_, future, _, slices), count in zip(batch, counts):
+                partials = partial_embeds[first:first + count]
+                first += count
+                raw_embed = partials.mean(axis=0)
+                embed = raw_embed / np.linalg.norm(raw_embed, 2)
+                if slices is None:
+                    future.set_result(embed)
+                else:
+                    starts = np.array([s.start for s in slices])
+                    future.set_result((embed, partials.copy(), starts, slices[0].stop - slices[0].start))
+            with self._lock:
+                self.batches += 1
+                self.chunks += len(batch)
+                self.partials += first
+                self.largest_batch = max(self.largest_batch, len(batch))
+                self.forward_seconds += finished - started
+                for _, _, submitted_at, _ in batch:
+                    latency = finished - submitted_at
+                    self.latency_total += latency
+                    self.latency_max = max(self.latency_max, latency)
+
+    def close(self):
+        """
+        Stops the batching thread once the queued chunks are embedded.
+        """
+        with self._lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.requests.put(None)
+            thread.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'chunks': self.chunks,
+                'avg_batch': round(self.chunks / self.batches, 2) if self.batches else 0,
+                'max_batch': self.largest_batch,
+                'avg_partials': round(self.partials / self.batches, 2) if self.batches else 0,
+                'avg_forward': round(self.forward_seconds / self.batches, 4) if self.batches else 0,
+                'latency_avg': round(self.latency_total / self.chunks, 4) if self.chunks else 0,
+                'latency_max': round(self.latency_max, 4),
+            }
+
+
 class VoiceManager:
-    def __init__(self, profiles_dir='voice_profiles', profiles_file='voice_profiles.pkl'):
+    def __init__(self, profiles_dir='voice_profiles', profiles_file='voice_profiles.pkl', store_name='voice_profiles',
+                 encoder_timeout=120.0, clustering=True, confirm_after=3, provisional_ttl=300.0, max_provisional=32,
+                 merge_tolerance=0.4, min_merge_count=3, max_count=200, index='exact', session_cache_size=8,
+                 cache_margin=0.05, embedding_mode='thread', storage='float32'):
         """
         Initializes the VoiceManager with a directory and file to store voice profiles.
+
+        With `clustering` on, each profile is the running centroid of the chunks matched to it. A chunk
+        that matches nothing starts a provisional speaker that is only stored once `confirm_after` chunks
+        have matched it; provisional speakers not confirmed within `provisional_ttl` seconds are forgotten.
+        Two stored profiles whose centroids come within `merge_tolerance` of each other are merged, once each
+        averages at least `min_merge_count` chunks. Merged-away profiles stay in the store as deleted records
+        and are left out of the index the next time the store is loaded.
+
+        Args:
+            profiles_dir (str): Folder holding the profile store.
+            profiles_file (str): Legacy pickle of profiles, migrated into the store the first time.
+            store_name (str): Base name of the append-only store files.
+            encoder_timeout (float): Seconds a chunk waits for the speaker encoder to finish loading
+                before it is labelled without a speaker.
+            clustering (bool): Cluster chunks into speakers; when False every unmatched chunk is stored
+                as a new profile straight away.
+            confirm_after (int): Chunks that must match a provisional speaker before it is stored.
+            provisional_ttl (float): Seconds since its last chunk after which a provisional speaker expires.
+            max_provisional (int): Provisional speakers kept at once; the least recently heard is dropped.
+            merge_tolerance (float): Distance between two centroids below which they are one speaker.
+            min_merge_count (int): Chunks both profiles must average before they can be merged, so a
+                centroid built from a few chunks cannot drift into its neighbours and absorb them.
+            max_count (int): Cap on the weight of a centroid's history, so older chunks decay and the
+                centroid keeps following the voice.
+            index (str): Profile search structure, see helpers.ann_index.ANN_INDEXES. 'ivf' only searches
+                the closest partitions of large stores and is exact below a few thousand profiles.
+            session_cache_size (int): Speakers heard recently in this session that are checked before the
+                full profile index; 0 disables the cache.
+            cache_margin (float): Similarity a cached speaker needs above the match threshold, and above the
+                next-best cached speaker, to be accepted without a full search.
+            embedding_mode (str): 'thread' embeds in this process through the shared encoder; 'process'
+                embeds in a dedicated worker process (helpers.embedding_worker) so inference does not
+                compete with the recorder and the UI for the GIL.
+            storage (str): Precision profiles are stored in: 'float32', 'float16' (half the size on disk)
+                or 'int8' with a per-profile scale (a quarter, on disk and in memory). int8 profiles are
+                scored as stored; float16 ones are widened to float32 on load, since numpy converts float16
+                too slowly to score it directly. An existing store is converted on load.
         """
-        self.encoder = VoiceEncoder()
+        if embedding_mode not in ('thread', 'process'):
+            raise ValueError(f"Unknown embedding mode '{embedding_mode}'. Choose 'thread' or 'process'.")
+        # The model loads in the background; chunks that arrive first wait for it in get_embedding
+        self.embedding_mode = embedding_mode
+        self.encoder_timeout = encoder_timeout
+        if embedding_mode == 'process':
+            self.batcher = None
+            self.worker = EmbeddingProcess()
+            self.encoder_ready = self.worker.ready
+        else:
+            self.batcher = EmbeddingBatcher(encoder_timeout=encoder_timeout)
+            self.worker = None
+            self.encoder_ready = load_encoder_async()
         self.profiles_dir = Path(profiles_dir)
         self.profiles_dir.mkdir(exist_ok=True)
         self.profiles_path = self.profiles_dir / profiles_file
-        self.profiles = []
+        self.storage = storage
+        self.index_storage = 'float32' if storage == 'float16' else storage
+        self.store = ProfileStore(self.profiles_dir, store_name, storage=storage)
+        # Normalized embeddings of every profile, row for row with the store, used for matching
+        self.index_type = index
+        self.index = create_index(index, storage=self.index_storage)
+        self.counts = []  # chunks averaged into each row; 0 for merged-away rows
+        self.store_rows = []  # store record of each row; -1 for rows that could not be stored
+        self.clustering = clustering
+        self.confirm_after = confirm_after
+        self.provisional_ttl = provisional_ttl
+        self.max_provisional = max_provisional
+        self.merge_similarity = distance_to_similarity(merge_tolerance)
+        self.min_merge_count = min_merge_count
+        self.max_count = max_count
+        self.provisional = []  # {'id', 'centroid', 'count', 'last_seen'}
+        self.aliases = {}  # merged-away id -> id it was merged into
+        self.dirty_rows = set()
+        self.cluster_stats = {'matched': 0, 'provisional': 0, 'promoted': 0, 'expired': 0, 'merged': 0}
+        self.session_cache_size = session_cache_size
+        self.cache_margin = cache_margin
+        self.active_speakers = OrderedDict()  # index rows of this session's speakers, most recent last
+        self.cache_stats = {'hits': 0, 'misses': 0}
+        self.diarization_stats = {'chunks': 0, 'segments': 0, 'low_coherence': 0}
+        self.lock = threading.Lock()
         self.load_profiles()
 
+    @property
+    def encoder(self):
+        """
+        The shared VoiceEncoder, waiting for it to load if necessary.
+        """
+        return get_encoder(self.encoder_timeout)[0]
+
     def load_profiles(self):
         """
-        Loads existing voice profiles from the profiles file.
+        Memory-maps the existing voice profiles, migrating the legacy pickle on first use.
         """
-        if self.profiles_path.exists():
-            try:
-                with open(self.profiles_path, 'rb') as f:
-                    self.profiles = pickle.load(f)
-                JSONManager.log_event("VoiceManager", f"Loaded {len(self.profiles)} voice profiles.")
-            except Exception as e:
-                JSONManager.log_event("VoiceManager Error", f"Error loading voice profiles: {e}")
-                self.profiles = []
-        else:
-            self.profiles = []
+        try:
+            if not self.store.exists() and self.profiles_path.exists():
+                self.migrate_pickle()
+            self.store.convert(self.storage)
+            ids, vectors, counts = self.store.load()
+        except Exception as e:
+            JSONManager.log_event("VoiceManager Error", f"Error loading voice profiles: {e}")
+            ids, vectors, counts = [], None, None
+        live = np.flatnonzero(counts > 0) if vectors is not None else np.empty(0, dtype=np.int64)
+        if vectors is not None and len(live) < len(counts):
+            # Merged-away profiles are deleted records in the store; they are not matched against
+            JSONManager.log_event("VoiceManager", f"Skipping {len(counts) - len(live)} deleted voice profiles.")
+            ids, vectors, counts = [ids[row] for row in live], vectors[live], counts[live]
+        self.store_rows = live.tolist()
+        if not len(live):
+            self.index = create_index(self.index_type, storage=self.index_storage)
+            self.counts = []
             JSONManager.log_event("VoiceManager", "No existing voice profiles found. Starting fresh.")
+        else:
+            if self.index_storage != self.storage:
+                vectors = decode(vectors, self.storage)
+            self.index = ANN_INDEXES[self.index_type].from_normalized(ids, vectors, storage=self.index_storage)
+            self.counts = counts.tolist()
+            JSONManager.log_event("VoiceManager", f"Loaded {self.profile_count()} voice profiles.")
+
+    def migrate_pickle(self):
+        """
+        Copies the profiles from the legacy pickle into the store. The pickle itself is left in place.
+        """
+        with open(self.profiles_path, 'rb') as f:
+            profiles = pickle.load(f)
+        if profiles:
+            self.store.extend(
+                [profile['id'] for profile in profiles],
+                normalize_rows([profile['embedding'] for profile in profiles]),
+                [1] * len(profiles),
+            )
+        self.store.flush()
+        JSONManager.log_event("VoiceManager", f"Migrated {len(profiles)} voice profiles from {self.profiles_path}.")
 
     def save_profiles(self):
         """
-        Saves the current voice profiles to the profiles file.
+        Writes updated centroids and makes sure every voice profile is on disk.
         """
         try:
-            with open(self.profiles_path, 'wb') as f:
-                pickle.dump(self.profiles, f)
-            JSONManager.log_event("VoiceManager", "Voice profiles saved successfully.")
+            with self.lock:
+                self.write_dirty_rows()
+            self.store.flush()
         except Exception as e:
             JSONManager.log_event("VoiceManager Error", f"Error saving voice profiles: {e}")
 
-    def get_embedding(self, audio_file_path):
+    def close(self):
         """
-        Generates a voice embedding for a given audio file.
+        Flushes and closes the profile store.
         """
+        self.save_profiles()
         try:
-            wav = preprocess_wav(audio_file_path)
-            embedding = self.encoder.embed_utterance(wav)
+            if self.worker is not None:
+                self.worker.close()
+            else:
+                self.batcher.close()
+            JSONManager.log_event("VoiceManager", f"Embedding stats: {self.embedding_stats()}")
+            self.store.close()
+            JSONManager.log_event("VoiceManager", f"Profile store stats: {self.store.stats()}")
+        except Exception as e:
+            JSONManager.log_event("VoiceManager Error", f"Error closing voice profiles: {e}")
+
+    def embedding_stats(self):
+        return self.worker.stats() if self.worker is not None else self.batcher.stats()
+
+    def encoder_load_report(self):
+        """
+        Import and model-load timings of the speaker encoder, wherever it runs.
+        """
+        return self.worker.load_report if self.worker is not None else load_report()
+
+    def get_embedding(self, audio, sample_rate=16000):
+        """
+        Generates a voice embedding for an audio chunk.
+
+        Args:
+            audio (np.ndarray or str): int16 PCM samples, or the path to an audio file.
+            sample_rate (int): Sample rate of `audio` when it is an array.
+        """
+        try:
+            if self.worker is not None:
+                self.encoder_ready.result(self.encoder_timeout)
+                return self.worker.embed(audio, sample_rate)
+            _, preprocess_wav = get_encoder(self.encoder_timeout)
+            if isinstance(audio, np.ndarray):
+                # In-memory chunk: no decode, and no resampling when it is already at the encoder's rate
+                wav = preprocess_wav(pcm_to_float(audio), source_sr=sample_rate)
+            else:
+                wav = preprocess_wav(audio)
+            embedding = self.batcher.embed(wav)
             return embedding
+        except FutureTimeout:
+            JSONManager.log_event(
+                "VoiceManager Error",
+                f"Speaker encoder still loading after {self.encoder_timeout}s; chunk left unlabelled."
+            )
+            return None
         except Exception as e:
-            JSONManager.log_event("VoiceManager Error", f"Error getting embedding for {audio_file_path}: {e}")
+            source = "in-memory chunk" if isinstance(audio, np.ndarray) else audio
+            JSONManager.log_event("VoiceManager Error", f"Error getting embedding for {source}: {e}")
             return None
 
-    def match_voice(self, audio_file_path, tolerance=0.6):
+    def match_voice(self, audio, tolerance=0.6, sample_rate=16000):
         """
         Matches an audio chunk to existing voice profiles or creates a new profile if no match is found.
 
         Args:
-            audio_file_path (str): Path to the audio file.
+            audio (np.ndarray or str): int16 PCM samples, or the path to an audio file.
             tolerance (float): Distance threshold for matching.
+            sample_rate (int): Sample rate of `audio` when it is an array.
 
         Returns:
             str: The speaker ID.
         """
-        embedding = self.get_embedding(audio_file_path)
+        embedding = self.get_embedding(audio, sample_rate)
         if embedding is None:
             return None
-        # Compare with existing profiles
-        if not self.profiles:
-            # No profiles exist, create a new one
-            new_id = self.create_new_profile(embedding)
-            return new_id
-        embeddings = np.array([profile['embedding'] for profile in self.profiles])
-        distances = np.linalg.norm(embeddings - embedding, axis=1)
-        min_distance = np.min(distances)
-        min_index = np.argmin(distances)
-        if min_distance < tolerance:
-            # Match found
-            matched_id = self.profiles[min_index]['id']
-            JSONManager.log_event("VoiceManager", f"Voice matched with ID: {matched_id} (distance: {min_distance})")
-            return matched_id
+        return self.match_embeddings([embedding], tolerance)[0]
+
+    def get_partials(self, audio, sample_rate=16000, rate=4.0):
+        """
+        Computes sliding-window partial embeddings over an untrimmed chunk.
+
+        Returns:
+            tuple: ((n, dim) partial embeddings, first sample of each window, window length), with positions
+                in `audio`'s samples, or None if the chunk could not be embedded.
+        """
+        try:
+            if self.worker is not None:
+                self.encoder_ready.result(self.encoder_timeout)
+                _, partials, starts, window = self.worker.embed(audio, sample_rate, partials_rate=rate)
+                return partials, starts, window
+            get_encoder(self.encoder_timeout)
+            wav, scale = preprocess_untrimmed(pcm_to_float(audio), sample_rate)
+            _, partials, starts, window = self.batcher.submit(wav, rate=rate, return_partials=True).result()
+            return partials, starts / scale, window / scale
+        except FutureTimeout:
+            JSONManager.log_event(
+                "VoiceManager Error",
+                f"Speaker encoder still loading after {self.encoder_timeout}s; chunk left unlabelled."
+            )
+            return None
+        except Exception as e:
+            JSONManager.log_event("VoiceManager Error", f"Error getting partial embeddings for in-memory chunk: {e}")
+            return None
+
+    def diarize(self, audio, sample_rate=16000, tolerance=0.6, rate=4.0, skip_low_coherence=False, **segment_kwargs):
+        """
+        Splits a chunk at speaker changes and identifies the speaker of each part.
+
+        Partial embeddings are computed every 1/`rate` seconds over the chunk, boundaries are placed where
+        the voice before and after differ (helpers.diarization.segment_partials), and each segment is matched
+        with the mean of its partials. Segments whose partials disagree (possible crosstalk or noise) are not
+        matched and come back without a speaker, so their audio is still transcribed, unless
+        `skip_low_coherence` drops them.
+
+        Args:
+            audio (np.ndarray): int16 PCM samples.
+            sample_rate (int): Sample rate of `audio`.
+            tolerance (float): Distance threshold for matching.
+            rate (float): Partial windows per second.
+            skip_low_coherence (bool): Leave low-coherence segments out instead of returning them unlabelled.
+            **segment_kwargs: Passed to segment_partials (change_similarity, min_segment_partials, min_coherence).
+
+        Returns:
+            list: {'start', 'end', 'speaker_id'} per segment, in `audio`'s samples and covering all of it
+                unless segments were skipped; speaker_id is None for low-coherence segments. None if the chunk
+                could not be embedded.
+        """
+        result = self.get_partials(audio, sample_rate, rate)
+        if result is None:
+            return None
+        partials, starts, window = result
+        segments = segment_partials(partials, starts, window, len(audio), **segment_kwargs)
+        matched = [segment for segment in segments if not segment['low_coherence']]
+        speaker_ids = self.match_embeddings([segment['embedding'] for segment in matched], tolerance) if matched else []
+        for segment, speaker_id in zip(matched, speaker_ids):
+            segment['speaker_id'] = speaker_id
+        for segment in segments:
+            if segment['low_coherence']:
+                JSONManager.log_event(
+                    "VoiceManager",
+                    f"Low-coherence segment ({segment['coherence']}) at samples {segment['start']}-{segment['end']}; "
+                    f"{'skipped' if skip_low_coherence else 'transcribed without a speaker'}."
+                )
+        with self.lock:
+            self.diarization_stats['chunks'] += 1
+            self.diarization_stats['segments'] += len(segments)
+            self.diarization_stats['low_coherence'] += len(segments) - len(matched)
+        if skip_low_coherence:
+            segments = matched
+        return [{'start': s['start'], 'end': s['end'], 'speaker_id': s.get('speaker_id')} for s in segments]
+
+    def match_embeddings(self, embeddings, tolerance=0.6):
+        """
+        Matches a batch of embeddings against the stored profiles with a single matrix product.
+        Unmatched embeddings become provisional speakers (or new profiles when clustering is off).
+
+        Args:
+            embeddings (list or np.ndarray): Voice embeddings, one per chunk.
+            tolerance (float): Euclidean distance threshold for matching (between unit vectors).
+
+        Returns:
+            list: The speaker ID for each embedding.
+        """
+        min_similarity = distance_to_similarity(tolerance)
+        embeddings = normalize_rows(embeddings)
+        with self.lock:
+            self.expire_provisional()
+            rows, similarities = self.search_active(embeddings, min_similarity)
+            misses = np.flatnonzero(rows < 0)
+            if len(misses):
+                rows[misses], similarities[misses] = self.index.search(embeddings[misses])
+            speaker_ids = []
+            changed = False
+            for embedding, row, similarity in zip(embeddings, rows, similarities):
+                if changed and (similarity < min_similarity or self.counts[row] == 0):
+                    # Profiles created, moved or merged earlier in this batch
+                    row, similarity = (value[0] for value in self.index.search(embedding))
+                if similarity >= min_similarity:
+                    matched_id = self.index.ids[row]
+                    JSONManager.log_event(
+                        "VoiceManager",
+                        f"Voice matched with ID: {matched_id} (distance: {similarity_to_distance(similarity)})"
+                    )
+                    if self.clustering:
+                        row = self.update_centroid(row, embedding)
+                        matched_id = self.index.ids[row]
+                    self.remember_speaker(row)
+                    self.cluster_stats['matched'] += 1
+                    speaker_ids.append(matched_id)
+                elif self.clustering:
+                    speaker_ids.append(self.match_provisional(embedding, min_similarity))
+                else:
+                    speaker_ids.append(self.create_new_profile(embedding))
+                changed = changed or self.clustering or similarity < min_similarity
+            if len(self.dirty_rows) >= self.store.sync_every:
+                self.write_dirty_rows()
+            return speaker_ids
+
+    def start_session(self):
+        """
+        Forgets the speakers of the previous session (meeting or recording).
+        """
+        with self.lock:
+            self.active_speakers.clear()
+            self.cache_stats = {'hits': 0, 'misses': 0}
+
+    def search_active(self, embeddings, min_similarity):
+        # Called with the lock held. Matches embeddings against the speakers already heard this session.
+        # Returns (rows, similarities) with -1 / -inf where the full index has to be searched.
+        rows = np.full(len(embeddings), -1)
+        similarities = np.full(len(embeddings), -np.inf, dtype=np.float32)
+        active = np.array([row for row in self.active_speakers if self.counts[row] > 0], dtype=np.int64)
+        if self.session_cache_size and len(active):
+            scores = self.index.score(embeddings, active)
+            order = np.argsort(-scores, axis=1)
+            best = np.take_along_axis(scores, order[:, :1], axis=1)[:, 0]
+            runner_up = np.take_along_axis(scores, order[:, 1:2], axis=1)[:, 0] if len(active) > 1 else -np.inf
+            hits = (best >= min_similarity + self.cache_margin) & (best - runner_up >= self.cache_margin)
+            rows[hits] = active[order[hits, 0]]
+            similarities[hits] = best[hits]
+        hit_count = int(np.count_nonzero(rows >= 0))
+        self.cache_stats['hits'] += hit_count
+        self.cache_stats['misses'] += len(embeddings) - hit_count
+        return rows, similarities
+
+    def remember_speaker(self, row):
+        # Called with the lock held
+        if not self.session_cache_size:
+            return
+        self.active_speakers[row] = None
+        self.active_speakers.move_to_end(row)
+        while len(self.active_speakers) > self.session_cache_size:
+            self.active_speakers.popitem(last=False)
+
+    def resolve(self, speaker_id):
+        """
+        Returns the id a speaker ended up under after merges, or None for a provisional speaker that was
+        never confirmed.
+        """
+        return self.resolve_many([speaker_id])[0]
+
+    def resolve_many(self, speaker_ids):
+        """
+        Resolves a list of speaker ids at once, e.g. every entry of a transcript, see resolve.
+        """
+        with self.lock:
+            stored = set(self.index.ids)
+            resolved = []
+            for speaker_id in speaker_ids:
+                while speaker_id in self.aliases:
+                    speaker_id = self.aliases[speaker_id]
+                resolved.append(speaker_id if speaker_id in stored else None)
+            return resolved
+
+    def update_centroid(self, row, embedding):
+        # Called with the lock held. Folds a matched embedding into the row's centroid, then merges the row
+        # into another of this session's speakers if the two have converged. Only the session's speakers are
+        # checked, so a match the session cache resolved never searches the full index; duplicates among the
+        # rest of the store are caught when a speaker is promoted. Returns the row the speaker now lives in.
+        weight = min(self.counts[row], self.max_count)
+        self.index.update(row, self.index.get(row) * weight + embedding)
+        self.counts[row] += 1
+        self.dirty_rows.add(row)
+        return self.merge_nearest(row, self.active_speakers)
+
+    def merge_nearest(self, row, candidates=None):
+        # Called with the lock held. Merges the row with its nearest neighbour among `candidates` (rows),
+        # or in the whole index when omitted, if the two are closer than merge_tolerance.
+        if candidates is None:
+            rows, similarities = self.index.search_k(self.index.get(row), 2)
+            neighbours = [(r, similarity) for r, similarity in zip(rows[0], similarities[0]) if r not in (row, -1)]
         else:
-            # No match, create a new profile
-            new_id = self.create_new_profile(embedding)
-            return new_id
+            rows = np.array([r for r in candidates if r != row and self.counts[r] > 0], dtype=np.int64)
+            similarities = self.index.score(normalize_rows(self.index.get(row)), rows)[0] if len(rows) else []
+            neighbours = sorted(zip(rows, similarities), key=lambda neighbour: -neighbour[1])
+        if not neighbours or neighbours[0][1] < self.merge_similarity:
+            return row
+        nearest = int(neighbours[0][0])
+        if min(self.counts[row], self.counts[nearest]) < self.min_merge_count:
+            return row
+        keep, drop = (row, nearest) if (self.counts[row], -row) > (self.counts[nearest], -nearest) else (nearest, row)
+        keep_weight = min(self.counts[keep], self.max_count)
+        drop_weight = min(self.counts[drop], self.max_count)
+        self.index.update(keep, self.index.get(keep) * keep_weight + self.index.get(drop) * drop_weight)
+        self.index.update(drop, np.zeros(self.index.dim, dtype=np.float32))
+        self.counts[keep] += self.counts[drop]
+        self.counts[drop] = 0
+        self.aliases[self.index.ids[drop]] = self.index.ids[keep]
+        self.dirty_rows.update((keep, drop))
+        self.cluster_stats['merged'] += 1
+        JSONManager.log_event(
+            "VoiceManager", f"Merged voice profile {self.index.ids[drop]} into {self.index.ids[keep]}."
+        )
+        return keep
+
+    def match_provisional(self, embedding, min_similarity):
+        # Called with the lock held. Matches an embedding that no stored profile claimed against the
+        # provisional speakers, storing a provisional speaker once it has been heard often enough.
+        now = time.monotonic()
+        if self.provisional:
+            similarities = np.stack([speaker['centroid'] for speaker in self.provisional]) @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] >= min_similarity:
+                speaker = self.provisional[best]
+                speaker['centroid'] = normalize_rows(speaker['centroid'] * speaker['count'] + embedding)[0]
+                speaker['count'] += 1
+                speaker['last_seen'] = now
+                if speaker['count'] >= self.confirm_after:
+                    self.provisional.pop(best)
+                    return self.promote(speaker)
+                return speaker['id']
+        if len(self.provisional) >= self.max_provisional:
+            self.provisional.remove(min(self.provisional, key=lambda speaker: speaker['last_seen']))
+            self.cluster_stats['expired'] += 1
+        speaker = {'id': str(uuid.uuid4()), 'centroid': embedding, 'count': 1, 'last_seen': now}
+        self.provisional.append(speaker)
+        self.cluster_stats['provisional'] += 1
+        if speaker['count'] >= self.confirm_after:
+            self.provisional.pop()
+            return self.promote(speaker)
+        return speaker['id']
+
+    def promote(self, speaker):
+        # Called with the lock held
+        row = self.index.add(speaker['id'], speaker['centroid'])
+        self.counts.append(speaker['count'])
+        self.store_rows.append(-1)
+        self.cluster_stats['promoted'] += 1
+        JSONManager.log_event(
+            "VoiceManager", f"Confirmed voice profile {speaker['id']} after {speaker['count']} chunks."
+        )
+        try:
+            self.store.append(speaker['id'], self.index.get(row), speaker['count'])
+            self.store_rows[row] = self.store.count - 1
+        except Exception as e:
+            JSONManager.log_event("VoiceManager Error", f"Error saving voice profile {speaker['id']}: {e}")
+        row = self.merge_nearest(row)
+        self.remember_speaker(row)
+        return self.index.ids[row]
+
+    def expire_provisional(self):
+        # Called with the lock held
+        cutoff = time.monotonic() - self.provisional_ttl
+        kept = [speaker for speaker in self.provisional if speaker['last_seen'] >= cutoff]
+        self.cluster_stats['expired'] += len(self.provisional) - len(kept)
+        self.provisional = kept
+
+    def write_dirty_rows(self):
+        # Called with the lock held
+        for row in sorted(self.dirty_rows):
+            if self.store_rows[row] >= 0:
+                self.store.update(self.store_rows[row], self.index.get(row), self.counts[row])
+        self.dirty_rows = set()
+
+    def profile_count(self):
+        return sum(1 for count in self.counts if count > 0)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.cache_stats['hits'] + self.cache_stats['misses']
+            return dict(
+                self.cluster_stats, profiles=self.profile_count(), pending=len(self.provisional),
+                cache_hits=self.cache_stats['hits'], cache_misses=self.cache_stats['misses'],
+                cache_hit_rate=round(self.cache_stats['hits'] / lookups, 3) if lookups else 0,
+                diarization=dict(self.diarization_stats),
+            )
 
     def create_new_profile(self, embedding):
         """
@@ -103,7 +702,14 @@ class VoiceManager:
             str: The new speaker ID.
         """
         new_id = str(uuid.uuid4())
-        self.profiles.append({'id': new_id, 'embedding': embedding})
-        self.save_profiles()
+        row = self.index.add(new_id, embedding)
+        self.counts.append(1)
+        self.store_rows.append(-1)
+        self.remember_speaker(row)
+        try:
+            self.store.append(new_id, self.index.get(row))
+            self.store_rows[row] = self.store.count - 1
+        except Exception as e:
+            JSONManager.log_event("VoiceManager Error", f"Error saving voice profile {new_id}: {e}")
         JSONManager.log_event("VoiceManager", f"Created new voice profile with ID: {new_id}")
         return new_id
@@ -0,0 +1,80 @@
+# test_ai_models_clients_async.py
+import asyncio
+import weakref
+import httpx
+import pytest
+from LLMs import client_pool
+from LLMs.AI_models_clients_async import gather_bounded, map_bounded, run_bounded
+
+
+class Tracker:
+    """Counts the calls running at once."""
+
+    def __init__(self):
+        self.running = 0
+        self.most = 0
+
+    async def call(self, item):
+        self.running += 1
+        self.most = max(self.most, self.running)
+        # Later items finish first, so results only come back in order if gathered in order
+        await asyncio.sleep(0.001 * (10 - item % 10))
+        self.running -= 1
+        return item * 2
+
+
+def test_gather_bounded_keeps_to_the_limit_and_the_order():
+    tracker = Tracker()
+    results = asyncio.run(gather_bounded([tracker.call(item) for item in range(20)], limit=3))
+    assert results == [item * 2 for item in range(20)]
+    assert tracker.most == 3
+
+
+def test_map_bounded_keeps_to_the_limit_and_the_order():
+    tracker = Tracker()
+    results = asyncio.run(map_bounded(tracker.call, range(20), limit=4))
+    assert results == [item * 2 for item in range(20)]
+    assert tracker.most == 4
+
+
+def test_limit_defaults_to_the_async_pool_size(monkeypatch):
+    monkeypatch.setitem(client_pool.ASYNC_POOL_LIMITS, 'max_connections', 5)
+    tracker = Tracker()
+    asyncio.run(map_bounded(tracker.call, range(20)))
+    assert tracker.most == 5
+
+
+def test_failures_in_place_of_results():
+    tracker = Tracker()
+
+    async def call(item):
+        if item == 2:
+            raise ValueError(item)
+        return await tracker.call(item)
+
+    results = asyncio.run(map_bounded(call, range(4), limit=2, return_exceptions=True))
+    assert results[:2] == [0, 2] and isinstance(results[2], ValueError) and results[3] == 6
+    with pytest.raises(ValueError):
+        asyncio.run(map_bounded(call, range(4), limit=2))
+
+
+def test_run_bounded_closes_the_loops_clients(monkeypatch):
+    monkeypatch.setattr(client_pool, '_async_clients', weakref.WeakKeyDictionary())
+    monkeypatch.setattr(client_pool, '_transports', weakref.WeakSet())
+    monkeypatch.setattr(client_pool, '_closed', dict.fromkeys(client_pool._closed, 0))
+    models = httpx.MockTransport(lambda request: httpx.Response(200, json={'object': 'list', 'data': []}))
+    monkeypatch.setattr(client_pool.AsyncPoolStatsTransport, 'make_transport', lambda self, limits: models)
+    tracker = Tracker()
+    clients = []
+
+    async def call(item):
+        client = client_pool.get_async_openai_client('test-key')
+        clients.append(client)
+        await client.models.list()
+        return await tracker.call(item)
+
+    assert run_bounded(call, range(6), limit=2) == [item * 2 for item in range(6)]
+    assert tracker.most == 2
+    assert len(set(map(id, clients))) == 1 and clients[0].is_closed()
+    stats = client_pool.client_pool_stats()
+    assert stats['requests'] == 6 and stats['clients'] == 0 and stats['closed_clients'] == 1
@@ -0,0 +1,60 @@
+# test_ann_index.py
+import numpy as np
+import pytest
+from helpers.ann_index import IVFIndex, create_index
+from helpers.embedding_index import EmbeddingMatrix, normalize_rows
+
+
+def clustered(count, dim=32, clusters=40, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    return normalize_rows(centers[rng.integers(clusters, size=count)] + 0.3 * rng.normal(size=(count, dim)))
+
+
+def ids(count, first=0):
+    return [str(i) for i in range(first, first + count)]
+
+
+def test_small_index_searches_exactly():
+    vectors = clustered(100)
+    index = IVFIndex(min_train_size=2048)
+    index.add_many(ids(100), vectors)
+    exact = EmbeddingMatrix()
+    exact.add_many(ids(100), vectors)
+    assert not index.trained
+    queries = clustered(10, seed=1)
+    assert np.array_equal(index.search(queries)[0], exact.search(queries)[0])
+
+
+def test_ivf_search_matches_exact_search_on_most_queries():
+    vectors = clustered(3000)
+    index = IVFIndex(min_train_size=1000, nprobe=8)
+    index.add_many(ids(3000), vectors)
+    exact = EmbeddingMatrix()
+    exact.add_many(ids(3000), vectors)
+    queries = normalize_rows(vectors[:200] + 0.05 * np.random.default_rng(2).normal(size=(200, 32)))
+
+    rows, _ = index.search(queries)
+    recall = np.mean(rows == exact.search(queries)[0])
+    assert index.trained
+    assert recall >= 0.95
+    assert index.stats()['avg_candidates'] < 3000 / 2
+
+
+def test_added_and_updated_rows_are_found():
+    vectors = clustered(1200)
+    index = IVFIndex(min_train_size=1000, nprobe=2)
+    index.add_many(ids(1000), vectors[:1000])
+    index.add_many(ids(200, 1000), vectors[1000:])
+    assert index.search(vectors[1100])[0][0] == 1100
+
+    moved = clustered(1, seed=5)[0]
+    index.update(5, moved)
+    assert index.search(moved)[0][0] == 5
+    assert sum(index.list_sizes) == index.count
+
+
+def test_unknown_index_is_rejected():
+    assert isinstance(create_index('ivf'), IVFIndex)
+    with pytest.raises(ValueError):
+        create_index('hnsw')
@@ -0,0 +1,76 @@
+# test_audio_buffer.py
+import numpy as np
+import pytest
+from helpers.audio_buffer import PCMRingBuffer, merge_chunks
+
+
+def samples(start, count):
+    return (np.arange(start, start + count) % 30000).astype(np.int16)
+
+
+def test_window_across_the_wrap_is_a_contiguous_view():
+    ring = PCMRingBuffer(capacity_samples=100, max_window_samples=40)
+    ring.write(samples(0, 90))
+    ring.write(samples(90, 30).tobytes())
+    window = ring.window(80, 120)
+    assert np.array_equal(window, samples(80, 40))
+    assert np.may_share_memory(window, ring._buffer)
+    assert not window.flags.writeable
+    assert ring.stats()['allocations'] == 1
+    assert ring.stats()['window_copies'] == 0
+
+
+def test_overwritten_window_is_refused():
+    ring = PCMRingBuffer(capacity_samples=100, max_window_samples=40)
+    ring.write(samples(0, 150))
+    with pytest.raises(ValueError):
+        ring.window(10, 40)
+    assert ring.stats()['overruns'] == 1
+    with pytest.raises(ValueError):
+        ring.window(140, 160)
+
+
+def test_detach_copies_until_the_writer_laps_the_window():
+    ring = PCMRingBuffer(capacity_samples=100, max_window_samples=40)
+    ring.write(samples(0, 60))
+    window = ring.window(20, 60)
+    copy = ring.detach(window, 20)
+    assert not np.may_share_memory(copy, ring._buffer)
+    ring.write(samples(60, 100))
+    assert np.array_equal(copy, samples(20, 40))
+    assert ring.detach(window, 20) is None
+    assert ring.detach(copy, 20) is copy
+    assert ring.stats()['detached_copies'] == 1
+
+
+def test_detach_during_a_write_that_laps_the_window_fails():
+    ring = PCMRingBuffer(capacity_samples=100, max_window_samples=40)
+    ring.write(samples(0, 60))
+    window = ring.window(20, 60)
+    store = ring._store
+    detached = []
+
+    def store_while_detaching(index, data):
+        # The reader copies while the writer is part-way through overwriting the window
+        detached.append(ring.detach(window, 20))
+        store(index, data)
+
+    ring._store = store_while_detaching
+    ring.write(samples(60, 70))
+    assert detached[0] is None
+
+
+def test_merge_chunks_drops_the_repeated_overlap():
+    first = {'pcm': samples(0, 10), 'overlap_samples': 0, 'seqs': [0]}
+    second = {'pcm': samples(7, 10), 'overlap_samples': 3, 'seqs': [1]}
+    merged = merge_chunks(first, second)
+    assert np.array_equal(merged['pcm'], samples(0, 17))
+    assert merged['seqs'] == [0, 1]
+    assert merge_chunks(first, second, max_samples=16) is None
+
+
+def test_write_longer_than_the_ring_keeps_positions_absolute():
+    ring = PCMRingBuffer(capacity_samples=100, max_window_samples=40)
+    ring.write(samples(0, 250))
+    assert ring.write_pos == 250
+    assert np.array_equal(ring.window(210, 250), samples(210, 40))
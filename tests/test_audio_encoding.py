@@ -0,0 +1,44 @@
+# test_audio_encoding.py
+import wave
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from helpers import audio_encoding
+from helpers.audio_encoding import ChunkEncoder
+
+PCM = (np.sin(np.arange(16000) / 10) * 3000).astype(np.int16)
+
+
+def test_unusable_codec_is_replaced_once_on_construction(monkeypatch):
+    def encode_pcm(pcm, sample_rate=16000, codec='wav', name='audio_chunk'):
+        if codec != 'wav':
+            raise ImportError("no encoder")
+        return real_encode(pcm, sample_rate, codec, name)
+
+    real_encode = audio_encoding.encode_pcm
+    monkeypatch.setattr(audio_encoding, 'encode_pcm', encode_pcm)
+    encoder = ChunkEncoder('flac')
+    assert encoder.codec == 'wav'
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        names = {encoded.name for encoded in executor.map(encoder.encode, [PCM] * 32)}
+    assert names == {'audio_chunk.wav'}
+    assert encoder.stats()['chunks'] == 32
+    assert encoder.stats()['fallbacks'] == 0
+
+
+def test_failed_chunk_is_sent_as_wav_without_changing_the_codec(monkeypatch):
+    def encode_pcm(pcm, sample_rate=16000, codec='wav', name='audio_chunk'):
+        if codec == 'flac':
+            if len(pcm) > 8000:
+                raise RuntimeError("encoder error")
+            return real_encode(pcm, sample_rate, 'wav', name)
+        return real_encode(pcm, sample_rate, codec, name)
+
+    real_encode = audio_encoding.encode_pcm
+    monkeypatch.setattr(audio_encoding, 'encode_pcm', encode_pcm)
+    encoder = ChunkEncoder('flac')
+    encoded = encoder.encode(PCM)
+    with wave.open(encoded, 'rb') as wf:
+        assert wf.getnframes() == len(PCM)
+    assert encoded.name == 'audio_chunk.wav'
+    assert encoder.codec == 'flac'
+    assert encoder.stats()['fallbacks'] == 1
@@ -0,0 +1,73 @@
+# test_batch_transcriber.py
+import wave
+import numpy as np
+import batch_transcriber
+from batch_transcriber import BatchTranscriber
+
+
+class FixedSpeaker:
+    """Stands in for VoiceManager: every chunk is the same speaker."""
+
+    def start_session(self):
+        pass
+
+    def match_voice(self, audio, sample_rate=16000):
+        return "1"
+
+    def resolve_many(self, speaker_ids):
+        return speaker_ids
+
+    def save_profiles(self):
+        pass
+
+    def embedding_stats(self):
+        return {}
+
+    def stats(self):
+        return {}
+
+
+def write_speech_wav(path, channels, seconds=30, sample_rate=16000):
+    # Noise bursts with a pause every 4 seconds, so the chunker has somewhere to cut
+    rng = np.random.default_rng(0)
+    mono = (rng.normal(size=seconds * sample_rate) * 3000).astype(np.int16)
+    for pause in range(4 * sample_rate, len(mono), 4 * sample_rate):
+        mono[pause - sample_rate // 2:pause] = 0
+    frames = np.repeat(mono[:, None], channels, axis=1)
+    with wave.open(str(path), 'wb') as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(frames.tobytes())
+
+
+def test_stereo_recording_transcribes_every_chunk(tmp_path, monkeypatch):
+    uploads = []
+
+    def transcribe(audio_file):
+        with wave.open(audio_file, 'rb') as wf:
+            uploads.append(wf.getnframes())
+        return f"chunk {len(uploads)}"
+
+    monkeypatch.setattr(batch_transcriber, 'transcribe_voice_to_text', transcribe)
+    path = tmp_path / 'stereo.wav'
+    write_speech_wav(path, channels=2)
+    transcriber = BatchTranscriber(max_workers=4, codec='wav', voice_manager=FixedSpeaker())
+    entries, duration = transcriber.transcribe_file(str(path))
+
+    chunks = transcriber.split(batch_transcriber.MappedPCM.from_wav(str(path)))
+    assert duration == 30
+    assert len(chunks) > 1
+    assert len(entries) == len(uploads) == len(chunks)
+
+
+def test_summary_tokens_are_recorded(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_transcriber, 'transcribe_voice_to_text', lambda audio_file: "we agreed to ship")
+    monkeypatch.setattr(batch_transcriber.summary_analysis, 'generate_text', lambda *args: ("Shipping.", 123))
+    path = tmp_path / 'mono.wav'
+    write_speech_wav(path, channels=1, seconds=10)
+    transcriber = BatchTranscriber(max_workers=2, codec='wav', voice_manager=FixedSpeaker())
+    meeting_data = transcriber.run(str(path), meeting_title="Sync", date="2026-01-01", save=False)
+
+    assert meeting_data['summary'] == "Shipping."
+    assert meeting_data['tokens_used'] == 123
@@ -0,0 +1,77 @@
+# test_bounded_queue.py
+import threading
+import time
+import pytest
+from helpers.bounded_queue import BackpressureQueue
+
+
+def drain(queue):
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+def test_block_waits_for_space():
+    queue = BackpressureQueue(1, policy='block')
+    queue.put(1)
+    threading.Timer(0.05, queue.get).start()
+    queue.put(2)
+    assert drain(queue) == [2]
+    assert queue.stats()['blocked_seconds'] > 0
+    assert queue.stats()['dropped'] == 0
+
+
+def test_drop_oldest_hands_the_dropped_item_over():
+    dropped = []
+    queue = BackpressureQueue(2, policy='drop_oldest', on_drop=dropped.append)
+    for item in range(5):
+        queue.put(item)
+    assert drain(queue) == [3, 4]
+    assert dropped == [0, 1, 2]
+    assert queue.stats()['dropped'] == 3
+    assert queue.stats()['high_water'] == 2
+
+
+def test_coalesce_merges_into_the_newest_item():
+    queue = BackpressureQueue(2, policy='coalesce', coalesce=lambda older, newer: older + newer)
+    for item in ([0], [1], [2], [3]):
+        queue.put(item)
+    assert drain(queue) == [[0], [1, 2, 3]]
+    assert queue.stats()['coalesced'] == 2
+
+
+def test_coalesce_drops_the_oldest_when_items_cannot_merge():
+    dropped = []
+    queue = BackpressureQueue(2, policy='coalesce', coalesce=lambda older, newer: None, on_drop=dropped.append)
+    for item in range(3):
+        queue.put(item)
+    assert drain(queue) == [1, 2]
+    assert dropped == [0]
+
+
+def test_unfinished_tasks_follow_the_policy():
+    queue = BackpressureQueue(1, policy='drop_oldest')
+    queue.put(0)
+    queue.put(1)
+    queue.get()
+    queue.task_done()
+    # The dropped item was never handed out, so join must not wait for it
+    done = threading.Event()
+    threading.Thread(target=lambda: (queue.join(), done.set()), daemon=True).start()
+    assert done.wait(1)
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        BackpressureQueue(1, policy='spill')
+    with pytest.raises(ValueError):
+        BackpressureQueue(1, policy='coalesce')
+
+
+def test_wait_time_is_measured():
+    queue = BackpressureQueue(4)
+    queue.put(0)
+    time.sleep(0.02)
+    queue.get()
+    assert queue.stats()['max_wait_seconds'] >= 0.02
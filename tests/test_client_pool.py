@@ -0,0 +1,159 @@
+# test_client_pool.py
+import asyncio
+import weakref
+import httpx
+import pytest
+from LLMs import client_pool
+from LLMs.client_pool import (
+    AsyncPoolStatsTransport, PoolStatsTransport, client_pool_stats, close_async_clients, get_async_openai_client,
+    get_openai_client
+)
+
+
+class KeepAlivePool(httpx.BaseTransport):
+    """
+    Stands in for httpx's connection pool: a request opens a connection (with httpcore's connect and TLS
+    trace events) unless an idle one is kept alive, and gives it back once answered.
+    """
+
+    def __init__(self):
+        self.idle = 0
+        self.closed = False
+
+    def acquire(self, request):
+        if self.idle:
+            self.idle -= 1
+            return []
+        return ['connection.connect_tcp.started', 'connection.connect_tcp.complete',
+                'connection.start_tls.started', 'connection.start_tls.complete']
+
+    def respond(self, request):
+        if request.url.path == '/fail':
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, json={'object': 'list', 'data': []}, request=request)
+
+    def handle_request(self, request):
+        trace = request.extensions.get('trace')
+        for event in self.acquire(request):
+            trace(event, {})
+        response = self.respond(request)
+        self.idle += 1
+        return response
+
+    def close(self):
+        self.closed = True
+
+
+class AsyncKeepAlivePool(KeepAlivePool, httpx.AsyncBaseTransport):
+    async def handle_async_request(self, request):
+        trace = request.extensions.get('trace')
+        for event in self.acquire(request):
+            await trace(event, {})
+        # Hold the connection for a while so that requests overlap
+        await asyncio.sleep(0.01)
+        response = self.respond(request)
+        self.idle += 1
+        return response
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakePoolStatsTransport(PoolStatsTransport):
+    def make_transport(self, limits):
+        return KeepAlivePool()
+
+
+class FakeAsyncPoolStatsTransport(AsyncPoolStatsTransport):
+    def make_transport(self, limits):
+        return AsyncKeepAlivePool()
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool(monkeypatch):
+    # Every test counts its own clients only
+    monkeypatch.setattr(client_pool, '_clients', {})
+    monkeypatch.setattr(client_pool, '_async_clients', weakref.WeakKeyDictionary())
+    monkeypatch.setattr(client_pool, '_transports', weakref.WeakSet())
+    monkeypatch.setattr(client_pool, '_closed', dict.fromkeys(client_pool._closed, 0))
+
+
+def test_requests_on_a_kept_alive_connection_count_as_reused():
+    transport = FakePoolStatsTransport(httpx.Limits(max_connections=1))
+    with httpx.Client(transport=transport) as client:
+        for _ in range(3):
+            assert client.get('https://api.test/v1/models').status_code == 200
+    stats = transport.stats()
+    assert stats['requests'] == 3
+    assert stats['new_connections'] == 1 and stats['tls_handshakes'] == 1
+    assert stats['reused'] == 2 and stats['reuse_rate'] == 0.667
+    assert transport.transport.closed
+
+
+def test_failed_requests_are_counted_apart():
+    transport = FakePoolStatsTransport(httpx.Limits(max_connections=1))
+    client = httpx.Client(transport=transport)
+    with pytest.raises(httpx.ConnectError):
+        client.get('https://api.test/fail')
+    client.get('https://api.test/v1/models')
+    stats = transport.stats()
+    assert stats['errors'] == 1 and stats['requests'] == 1
+
+
+def test_callers_trace_still_sees_the_events():
+    events = []
+    client = httpx.Client(transport=FakePoolStatsTransport(httpx.Limits(max_connections=1)))
+    client.get('https://api.test/v1/models', extensions={'trace': lambda event, info: events.append(event)})
+    assert events[0] == 'connection.connect_tcp.started' and len(events) == 4
+
+
+def test_stats_add_up_open_and_closed_clients(monkeypatch):
+    monkeypatch.setattr(client_pool, 'PoolStatsTransport', FakePoolStatsTransport)
+    client = get_openai_client('test-key')
+    assert get_openai_client('test-key') is client
+    for _ in range(4):
+        client.models.list()
+    other = get_openai_client('other-key')
+    other.models.list()
+
+    stats = client_pool_stats()
+    assert stats['requests'] == 5 and stats['new_connections'] == 2 and stats['reused'] == 3
+    assert stats['clients'] == 2 and stats['closed_clients'] == 0
+
+    client_pool.close_clients()
+    stats = client_pool_stats()
+    assert stats['requests'] == 5 and stats['reused'] == 3
+    assert stats['clients'] == 0 and stats['closed_clients'] == 2
+    assert get_openai_client('test-key') is not client
+
+
+def test_async_requests_reuse_the_connections_left_idle():
+    async def main():
+        transport = FakeAsyncPoolStatsTransport(httpx.Limits(max_connections=2))
+        async with httpx.AsyncClient(transport=transport) as client:
+            await asyncio.gather(*(client.get('https://api.test/v1/models') for _ in range(2)))
+            await asyncio.gather(*(client.get('https://api.test/v1/models') for _ in range(3)))
+        return transport
+
+    transport = asyncio.run(main())
+    stats = transport.stats()
+    # Two overlapping requests open two connections; the next three find two idle and open one more
+    assert stats['requests'] == 5 and stats['new_connections'] == 3 and stats['reused'] == 2
+    assert transport.transport.closed
+
+
+def test_each_event_loop_gets_its_own_async_client(monkeypatch):
+    monkeypatch.setattr(client_pool, 'AsyncPoolStatsTransport', FakeAsyncPoolStatsTransport)
+
+    async def main():
+        client = get_async_openai_client('test-key')
+        assert get_async_openai_client('test-key') is client
+        await client.models.list()
+        await close_async_clients()
+        return client
+
+    first = asyncio.run(main())
+    second = asyncio.run(main())
+    assert first is not second and first.is_closed() and second.is_closed()
+    stats = client_pool_stats()
+    assert stats['requests'] == 2 and stats['closed_clients'] == 2 and stats['clients'] == 0
@@ -0,0 +1,80 @@
+# test_diarization.py
+import numpy as np
+from helpers.diarization import segment_partials
+from helpers.voice_profiler import VoiceManager
+
+WINDOW = 16000
+STEP = 4000
+
+
+def unit(seed, dim=256):
+    vector = np.random.default_rng(seed).normal(size=dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def voice_partials(voice, count, seed, noise=0.1):
+    # Partials of one speaker: the voice plus a little per-window noise
+    rng = np.random.default_rng(seed)
+    partials = voice + noise * rng.normal(size=(count, voice.size)).astype(np.float32) / np.sqrt(voice.size)
+    return partials / np.linalg.norm(partials, axis=1, keepdims=True)
+
+
+def segment(partials, **kwargs):
+    starts = np.arange(len(partials)) * STEP
+    return segment_partials(partials, starts, WINDOW, int(starts[-1]) + WINDOW, **kwargs)
+
+
+def test_one_speaker_has_no_change_point():
+    segments = segment(voice_partials(unit(0), 24, seed=1))
+    assert len(segments) == 1
+    assert segments[0]['start'] == 0 and segments[0]['end'] == 23 * STEP + WINDOW
+    assert not segments[0]['low_coherence']
+    assert segments[0]['embedding'] @ unit(0) > 0.99
+
+
+def test_speaker_change_is_cut_near_the_boundary():
+    partials = np.vstack([voice_partials(unit(0), 12, seed=1), voice_partials(unit(1), 12, seed=2)])
+    segments = segment(partials)
+    assert len(segments) == 2
+    # The voices change between partial 11 and partial 12
+    boundary = (11 * STEP + 12 * STEP + WINDOW) // 2
+    assert abs(segments[0]['end'] - boundary) <= STEP
+    assert segments[1]['start'] == segments[0]['end']
+    assert segments[0]['embedding'] @ unit(0) > 0.99 and segments[1]['embedding'] @ unit(1) > 0.99
+    assert not any(s['low_coherence'] for s in segments)
+
+
+def test_segments_shorter_than_the_minimum_are_not_cut():
+    # A two-partial interruption by B inside A
+    partials = np.vstack([
+        voice_partials(unit(0), 10, seed=1), voice_partials(unit(1), 2, seed=2), voice_partials(unit(0), 10, seed=3),
+    ])
+    for minimum in (3, 8, 11):
+        cut = segment(partials, min_segment_partials=minimum)
+        assert all(s['end'] - s['start'] >= minimum * STEP for s in cut)
+    # Too long a minimum for a segment of its own: B is merged into the A around it
+    assert len(segment(partials, min_segment_partials=8)) == 2
+    assert len(segment(partials, min_segment_partials=11)) == 1
+
+def test_disagreeing_partials_are_flagged_low_coherence():
+    partials = np.vstack([unit(seed) for seed in range(12)])
+    segments = segment(partials, change_similarity=-1.0)
+    assert len(segments) == 1 and segments[0]['low_coherence']
+
+
+def test_diarize_skips_low_coherence_segments_only_when_asked(tmp_path):
+    manager = VoiceManager(profiles_dir=tmp_path, embedding_mode='thread', confirm_after=1)
+    # A, then B and C talking over each other
+    crosstalk = np.vstack([unit(1 + i % 2) for i in range(12)])
+    partials = np.vstack([voice_partials(unit(0), 12, seed=1), crosstalk])
+    starts = np.arange(len(partials)) * STEP
+    manager.get_partials = lambda audio, sample_rate, rate: (partials, starts, WINDOW)
+    audio = np.zeros(int(starts[-1]) + WINDOW, dtype=np.int16)
+
+    kept = manager.diarize(audio, min_coherence=0.8)
+    assert [s['speaker_id'] is None for s in kept] == [False, True]
+    assert kept[-1]['end'] == len(audio)
+
+    skipped = manager.diarize(audio, min_coherence=0.8, skip_low_coherence=True)
+    assert skipped == kept[:1]
+    assert manager.stats()['diarization']['low_coherence'] == 2
@@ -0,0 +1,54 @@
+# test_embedding_worker.py
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+import pytest
+from helpers.embedding_worker import EmbeddingProcess
+
+
+@pytest.fixture
+def worker():
+    worker = EmbeddingProcess(slots=1, max_chunk_seconds=1)
+    yield worker
+    worker.close()
+
+
+def test_waiting_caller_is_released_when_the_worker_fails(worker):
+    held = worker.take_slot()
+    errors = []
+
+    def submit():
+        try:
+            worker.submit(np.zeros(100, dtype=np.int16))
+        except RuntimeError as e:
+            errors.append(e)
+
+    caller = threading.Thread(target=submit)
+    caller.start()
+    time.sleep(0.1)
+    worker.fail_pending(RuntimeError("gone"))
+    caller.join(5)
+    assert not caller.is_alive()
+    assert len(errors) == 1
+    worker.free_slots.put(held)
+
+
+def test_failed_chunks_hand_their_slots_back(worker):
+    slot = worker.take_slot()
+    future = Future()
+    worker.pending[0] = (future, time.monotonic(), slot)
+    worker.fail_pending(RuntimeError("gone"))
+    assert isinstance(future.exception(), RuntimeError)
+    assert worker.free_slots.get_nowait() == slot
+    with pytest.raises(RuntimeError):
+        worker.submit(np.zeros(100, dtype=np.int16))
+
+
+def test_dead_worker_is_noticed(worker):
+    worker.process.kill()
+    deadline = time.monotonic() + 10
+    while not worker.closed and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert worker.closed
+    assert worker.ready.done()
@@ -0,0 +1,63 @@
+# test_profile_store.py
+import uuid
+import numpy as np
+import pytest
+from helpers.profile_store import HEADER, ProfileStore
+
+
+def unit_rows(count, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_appended_profiles_load_back(tmp_path):
+    store = ProfileStore(tmp_path)
+    ids = [str(uuid.uuid4()) for _ in range(3)]
+    vectors = unit_rows(3)
+    store.append(ids[0], vectors[0])
+    store.extend(ids[1:], vectors[1:], counts=[4, 5])
+    store.close()
+
+    loaded_ids, records, counts = ProfileStore(tmp_path).load()
+    assert loaded_ids == ids
+    assert np.array_equal(records, vectors)
+    assert counts.tolist() == [1, 4, 5]
+
+
+def test_update_and_delete_rewrite_one_record_in_place(tmp_path):
+    store = ProfileStore(tmp_path)
+    vectors = unit_rows(3)
+    store.extend(['a', 'b', 'c'], vectors)
+    size = (tmp_path / 'voice_profiles.vec').stat().st_size
+    store.update(1, vectors[2], count=7)
+    store.delete(0)
+    store.close()
+
+    _, records, counts = ProfileStore(tmp_path).load()
+    assert (tmp_path / 'voice_profiles.vec').stat().st_size == size
+    assert np.array_equal(records[1], vectors[2])
+    assert not records[0].any()
+    assert counts.tolist() == [0, 7, 1]
+    with pytest.raises(IndexError):
+        store.update(3, vectors[0])
+
+
+def test_torn_append_is_trimmed_on_load(tmp_path):
+    store = ProfileStore(tmp_path)
+    store.extend(['a', 'b'], unit_rows(2))
+    store.close()
+    # A crash between the two writes leaves a vector without its id
+    with open(tmp_path / 'voice_profiles.vec', 'ab') as f:
+        f.write(unit_rows(1, seed=1).tobytes()[:20])
+
+    ids, records, _ = ProfileStore(tmp_path).load()
+    assert ids == ['a', 'b']
+    assert (tmp_path / 'voice_profiles.vec').stat().st_size == HEADER.size + records.nbytes
+
+
+def test_embedding_size_must_match(tmp_path):
+    store = ProfileStore(tmp_path)
+    store.append('a', unit_rows(1)[0])
+    with pytest.raises(ValueError):
+        store.append('b', unit_rows(1, dim=8)[0])
+    store.close()
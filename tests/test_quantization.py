@@ -0,0 +1,57 @@
+# test_quantization.py
+import numpy as np
+import pytest
+from helpers import quantization
+from helpers.profile_store import ProfileStore
+
+
+def unit_rows(count, dim=256, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize('storage, tolerance', [('float32', 0), ('float16', 1e-3), ('int8', 2e-2)])
+def test_round_trip_stays_close(storage, tolerance):
+    vectors = unit_rows(50)
+    decoded = quantization.decode(quantization.encode(vectors, storage), storage)
+    assert decoded.dtype == np.float32
+    assert np.max(np.abs(decoded - vectors)) <= tolerance
+
+
+@pytest.mark.parametrize('storage', ['float16', 'int8'])
+def test_blocked_scores_match_decoded_products(storage):
+    records = quantization.encode(unit_rows(3000), storage)
+    queries = unit_rows(4, seed=1)
+    expected = queries @ quantization.decode(records, storage).T
+    assert np.allclose(quantization.score(queries, records, storage, block=512), expected, atol=1e-5)
+
+
+def test_int8_keeps_the_nearest_neighbour():
+    vectors = unit_rows(500)
+    queries = vectors[:100] + 0.1 * unit_rows(100, seed=2)
+    records = quantization.encode(vectors, 'int8')
+    assert np.array_equal(np.argmax(quantization.score(queries, records, 'int8'), axis=1), np.arange(100))
+
+
+def test_store_converts_between_storages(tmp_path):
+    vectors = unit_rows(20)
+    store = ProfileStore(tmp_path, storage='float32')
+    store.extend([str(i) for i in range(20)], vectors, counts=list(range(1, 21)))
+    store.convert('int8')
+    store.append('20', vectors[0])
+    store.close()
+
+    reloaded = ProfileStore(tmp_path, storage='float32')
+    ids, records, counts = reloaded.load()
+    assert reloaded.storage == 'int8'
+    assert reloaded.stats()['bytes_per_record'] == 4 + 256
+    assert len(ids) == 21
+    assert np.allclose(quantization.decode(records, 'int8')[:20], vectors, atol=2e-2)
+    assert counts[:20].tolist() == list(range(1, 21))
+
+
+def test_unknown_storage_is_rejected():
+    with pytest.raises(ValueError):
+        quantization.check_storage('int4')
+    with pytest.raises(ValueError):
+        quantization.storage_from_code(9)
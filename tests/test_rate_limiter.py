@@ -0,0 +1,107 @@
+# test_rate_limiter.py
+import asyncio
+import pytest
+from LLMs.rate_limiter import RateLimiter, estimate_tokens, is_retryable, parse_rate_limits, retry_after
+
+
+class FakeResponse:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class APIError(Exception):
+    def __init__(self, status_code, headers=None, code=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.code = code
+        self.response = FakeResponse(headers or {})
+
+
+def test_parse_rate_limits():
+    assert parse_rate_limits("default=500:30000, gpt-4o-mini=500:,fast=:1000") == {
+        'default': {'rpm': 500, 'tpm': 30000},
+        'gpt-4o-mini': {'rpm': 500, 'tpm': None},
+        'fast': {'rpm': None, 'tpm': 1000},
+    }
+    assert parse_rate_limits("") == {}
+
+
+def test_estimate_reserves_a_typical_completion():
+    assert estimate_tokens("x" * 400, None, max_tokens=16300) == 100 + 1000
+    assert estimate_tokens("x" * 400, max_tokens=50) == 150
+
+
+def test_requests_beyond_the_bucket_wait_in_turn():
+    limiter = RateLimiter(rpm=60)
+    limiter.requests_available = 1.0
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == pytest.approx(1.0, abs=0.01)
+    assert limiter.reserve() == pytest.approx(2.0, abs=0.01)
+    assert limiter.stats()['queued'] == 2
+
+
+def test_unused_tokens_are_returned():
+    limiter = RateLimiter(rpm=None, tpm=6000)
+    assert limiter.reserve(6000) == 0
+    assert limiter.reserve(600) == pytest.approx(6.0, abs=0.01)
+    limiter.settle(6000, 600)
+    assert limiter.reserve(0) == 0
+
+
+def test_retry_after_headers():
+    assert retry_after(APIError(429, {'retry-after-ms': '1500'})) == 1.5
+    assert retry_after(APIError(429, {'retry-after': '3'})) == 3.0
+    assert retry_after(APIError(429)) is None
+
+
+def test_quota_errors_are_not_retried():
+    assert is_retryable(APIError(503))
+    assert not is_retryable(APIError(400))
+    assert not is_retryable(APIError(429, code='insufficient_quota'))
+
+
+def test_retryable_errors_are_retried_until_the_call_succeeds():
+    limiter = RateLimiter(rpm=None, base_delay=0.001)
+    outcomes = [APIError(503), APIError(429, {'retry-after-ms': '10'}), "ok"]
+
+    def request():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert limiter.call(request) == "ok"
+    stats = limiter.stats()
+    assert stats['retries'] == 2
+    assert stats['server_throttled'] == 1
+    assert stats['failures'] == 0
+
+
+def test_errors_are_raised_once_retries_are_used_up():
+    limiter = RateLimiter(rpm=None, max_retries=2, base_delay=0.001)
+    calls = []
+
+    def request():
+        calls.append(1)
+        raise APIError(500)
+
+    with pytest.raises(APIError):
+        limiter.call(request)
+    assert len(calls) == 3
+    with pytest.raises(APIError):
+        limiter.call(lambda: (_ for _ in ()).throw(APIError(400)))
+    assert limiter.stats()['failures'] == 2
+
+
+def test_async_calls_are_limited_and_retried():
+    limiter = RateLimiter(rpm=None, tpm=10000, base_delay=0.001)
+    outcomes = [APIError(502), 42]
+
+    async def request():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert asyncio.run(limiter.call_async(request, tokens=100, usage=lambda response: 10)) == 42
+    assert limiter.tokens_available == pytest.approx(9990, abs=5)
@@ -0,0 +1,67 @@
+# test_reorder_buffer.py
+import random
+import threading
+import time
+from helpers.reorder_buffer import ReorderBuffer
+
+
+def test_results_are_released_in_sequence_order():
+    released = []
+    buffer = ReorderBuffer(released.append)
+    buffer.complete([2], 'c')
+    buffer.complete([1], 'b')
+    assert released == []
+    buffer.complete([0], 'a')
+    assert released == ['a', 'b', 'c']
+    assert buffer.stats()['max_held'] == 3
+
+
+def test_empty_and_merged_chunks_release_the_ones_behind_them():
+    released = []
+    buffer = ReorderBuffer(released.append)
+    buffer.complete([3], 'd')
+    buffer.complete([1, 2], 'bc')
+    buffer.complete([0], None)
+    assert released == ['bc', 'd']
+    assert buffer.stats()['skipped'] == 2
+
+
+def test_missing_chunk_is_skipped_after_max_wait():
+    released = []
+    buffer = ReorderBuffer(released.append, max_wait=0.05)
+    buffer.complete([1], 'b')
+    time.sleep(0.1)
+    buffer.complete([2], 'c')
+    assert released == ['b', 'c']
+    assert buffer.stats()['timeouts'] == 1
+    # A late result for the skipped chunk is ignored
+    buffer.complete([0], 'a')
+    assert released == ['b', 'c']
+
+
+def test_flush_releases_everything_held():
+    released = []
+    buffer = ReorderBuffer(released.append)
+    buffer.complete([2], 'c')
+    buffer.complete([4], 'e')
+    buffer.flush()
+    assert released == ['c', 'e']
+    assert buffer.stats()['held'] == 0
+
+
+def test_concurrent_workers_deliver_in_order():
+    released = []
+    buffer = ReorderBuffer(lambda result: (time.sleep(0.001), released.append(result)))
+    seqs = list(range(200))
+    random.Random(0).shuffle(seqs)
+
+    def worker(part):
+        for seq in part:
+            buffer.complete([seq], seq)
+
+    threads = [threading.Thread(target=worker, args=(seqs[i::8],)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert released == list(range(200))
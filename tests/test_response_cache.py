@@ -0,0 +1,123 @@
+# test_response_cache.py
+import asyncio
+import time
+import pytest
+from LLMs import response_cache
+from LLMs.response_cache import ResponseCache, cached_response, enable_response_cache, disable_response_cache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = enable_response_cache(directory=str(tmp_path), ttl=0.2)
+    yield cache
+    disable_response_cache()
+
+
+def counted(calls):
+    @cached_response("test-model", temperature=0)
+    def generate(system_context, assistant_context, initial_prompt):
+        calls.append(initial_prompt)
+        return f"answer to {initial_prompt}", 10
+    return generate
+
+
+def test_identical_requests_hit_the_cache(cache):
+    calls = []
+    generate = counted(calls)
+    assert generate("system", "", "hello") == ("answer to hello", 10)
+    assert generate("system", "", "hello") == ("answer to hello", 10)
+    assert generate("system", "", "bye") == ("answer to bye", 10)
+    assert calls == ["hello", "bye"]
+    assert cache.stats()['memory_hits'] == 1
+    assert cache.stats()['tokens_saved'] == 10
+
+
+def test_disk_tier_survives_a_new_cache(cache, tmp_path):
+    calls = []
+    generate = counted(calls)
+    generate("system", "", "hello")
+    restarted = enable_response_cache(directory=str(tmp_path), ttl=0.2)
+    assert generate("system", "", "hello") == ("answer to hello", 10)
+    assert calls == ["hello"]
+    assert restarted.stats()['disk_hits'] == 1
+
+
+def test_expired_responses_are_regenerated(cache):
+    calls = []
+    generate = counted(calls)
+    generate("system", "", "hello")
+    time.sleep(0.25)
+    generate("system", "", "hello")
+    assert calls == ["hello", "hello"]
+    assert cache.stats()['expired'] == 1
+
+
+def test_failed_calls_are_not_stored(cache):
+    calls = []
+
+    @cached_response("test-model")
+    def generate(system_context, assistant_context, initial_prompt):
+        calls.append(initial_prompt)
+        return "An error occurred", 0
+
+    generate("system", "", "hello")
+    generate("system", "", "hello")
+    assert len(calls) == 2
+    assert cache.stats()['stores'] == 0
+
+
+def test_async_calls_are_cached(cache):
+    calls = []
+
+    @cached_response("test-model")
+    async def generate(system_context, assistant_context, initial_prompt):
+        calls.append(initial_prompt)
+        return "async answer", 5
+
+    async def twice():
+        return [await generate("system", "", "hello") for _ in range(2)]
+
+    assert asyncio.run(twice()) == [("async answer", 5)] * 2
+    assert calls == ["hello"]
+
+
+def test_streamed_calls_are_cached_and_replayed_in_one_piece(cache):
+    calls = []
+
+    @cached_response("test-model")
+    def stream(system_context, assistant_context, initial_prompt, model="test-model"):
+        calls.append(model)
+        yield "stream"
+        yield "ed"
+        return "streamed", 7, None
+
+    def consume(generator):
+        pieces = []
+        while True:
+            try:
+                pieces.append(next(generator))
+            except StopIteration as done:
+                return pieces, done.value
+
+    assert consume(stream("system", "", "hello")) == (["stream", "ed"], ("streamed", 7, None))
+    assert consume(stream("system", "", "hello")) == (["streamed"], ("streamed", 7, None))
+    # A different model is a different request
+    consume(stream("system", "", "hello", model="other"))
+    assert calls == ["test-model", "other"]
+
+
+def test_calls_go_straight_through_while_disabled():
+    assert response_cache._cache is None
+    calls = []
+    generate = counted(calls)
+    generate("system", "", "hello")
+    generate("system", "", "hello")
+    assert len(calls) == 2
+
+
+def test_disk_tier_is_trimmed_to_its_limit(tmp_path):
+    cache = ResponseCache(directory=str(tmp_path), max_disk_bytes=2000, ttl=None)
+    for i in range(30):
+        cache.put(f"{i:064x}", "x" * 100, 1)
+    assert cache.stats()['evicted'] > 0
+    assert cache.stats()['disk_bytes'] <= 2000
@@ -0,0 +1,27 @@
+# test_transcript_merge.py
+from helpers.transcript_merge import BoundaryDeduplicator, remove_boundary_overlap
+
+
+def test_repeated_words_are_removed():
+    assert remove_boundary_overlap(
+        "so the plan is to ship on Friday", "ship on Friday, and then review it"
+    ) == "and then review it"
+
+
+def test_half_word_at_the_boundary_is_skipped():
+    assert remove_boundary_overlap(
+        "we should move the deadline", "dline the deadline to next week"
+    ) == "to next week"
+
+
+def test_short_single_word_is_not_treated_as_a_duplicate():
+    assert remove_boundary_overlap("it is what it is", "is that right") == "is that right"
+    assert remove_boundary_overlap("let's talk budget", "Budget is tight") == "is tight"
+
+
+def test_deduplicator_only_trims_overlapping_chunks():
+    deduplicator = BoundaryDeduplicator()
+    assert deduplicator.process("we agreed on the budget", False) == "we agreed on the budget"
+    assert deduplicator.process("on the budget for March", True) == "for March"
+    assert deduplicator.process("for March we need more", False) == "for March we need more"
+    assert deduplicator.stats() == {'words_in': 15, 'words_removed': 3}
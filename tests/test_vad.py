@@ -0,0 +1,94 @@
+# test_vad.py
+import numpy as np
+from helpers.audio_buffer import PCMRingBuffer
+from helpers.vad import PauseAlignedChunker, VoiceActivityGate
+
+RATE = 16000
+
+
+def tone(seconds, amplitude=3000, frequency=200):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+
+
+def mostly_silent(seconds=1.0, speech_seconds=0.15):
+    pcm = np.zeros(int(seconds * RATE), dtype=np.int16)
+    pcm[:int(speech_seconds * RATE)] = tone(speech_seconds)
+    return pcm
+
+
+def chunk(pcm, seq, overlap=0):
+    return {'pcm': pcm, 'overlap_samples': overlap, 'seqs': [seq]}
+
+
+def test_gate_passes_speech_and_drops_silence():
+    gate = VoiceActivityGate(sample_rate=RATE)
+    speech = chunk(tone(1), 0)
+    assert gate.process(speech) == [speech]
+    assert gate.process(chunk(np.zeros(RATE, dtype=np.int16), 1)) == []
+    assert gate.stats()['windows_dropped'] == 1
+
+
+def test_gate_merges_held_chunk_into_the_next():
+    gate = VoiceActivityGate(sample_rate=RATE)
+    quiet = mostly_silent()
+    assert gate.process(chunk(quiet, 0)) == []
+    speech = tone(1)
+    merged, = gate.process(chunk(speech, 1, overlap=RATE // 4))
+    assert merged['seqs'] == [0, 1]
+    assert np.array_equal(merged['pcm'], np.concatenate([quiet, speech[RATE // 4:]]))
+    assert gate.stats()['windows_merged'] == 1
+
+
+def test_gate_flushes_held_chunk_when_silence_follows():
+    gate = VoiceActivityGate(sample_rate=RATE)
+    held = chunk(mostly_silent(), 0)
+    gate.process(held)
+    released, = gate.process(chunk(np.zeros(RATE, dtype=np.int16), 1))
+    assert np.array_equal(released['pcm'], held['pcm'])
+    assert gate.flush() == []
+
+
+def test_held_chunk_survives_the_ring_wrapping():
+    ring = PCMRingBuffer(capacity_samples=4 * RATE, max_window_samples=2 * RATE)
+    gate = VoiceActivityGate(sample_rate=RATE)
+    quiet = mostly_silent()
+    ring.write(quiet)
+    assert gate.process(chunk(ring.window(0, RATE), 0)) == []
+    # Long enough for the ring to overwrite the held window several times
+    for _ in range(10):
+        ring.write(np.full(RATE, 7, dtype=np.int16))
+    start = ring.write_pos
+    ring.write(tone(1))
+    merged, = gate.process(chunk(ring.window(start, start + RATE), 1))
+    assert np.array_equal(merged['pcm'][:RATE], quiet)
+
+
+def test_chunker_cuts_at_pauses_and_skips_leading_silence():
+    ring = PCMRingBuffer(capacity_samples=60 * RATE, max_window_samples=20 * RATE)
+    chunker = PauseAlignedChunker(sample_rate=RATE, min_duration=2, max_duration=15, pause_duration=0.4)
+    silence = np.zeros(RATE, dtype=np.int16)
+    for part in (silence, tone(3), silence, tone(3), silence):
+        ring.write(part)
+    windows = chunker.flush(ring)
+    assert len(windows) == 2
+    (first_start, first_end, first_overlap), (second_start, second_end, second_overlap) = windows
+    # Each segment starts inside the silence before its speech and ends inside the pause after it
+    assert 0.5 * RATE <= first_start < RATE and 4 * RATE < first_end < 5 * RATE
+    assert first_end <= second_start < 5 * RATE and 8 * RATE < second_end < 9 * RATE
+    assert first_overlap == second_overlap == 0
+    assert chunker.stats() == {'pause_cuts': 2, 'forced_cuts': 0}
+
+
+def test_chunker_forces_a_cut_with_overlap_in_long_speech():
+    ring = PCMRingBuffer(capacity_samples=60 * RATE, max_window_samples=20 * RATE)
+    chunker = PauseAlignedChunker(sample_rate=RATE, min_duration=2, max_duration=5, overlap_duration=0.5)
+    ring.write(tone(12))
+    windows = chunker.flush(ring)
+    # Cuts fall on the first frame boundary past max_duration; after a forced cut the next window
+    # repeats the last half second
+    cut = -(-5 * RATE // chunker.frame_samples) * chunker.frame_samples
+    assert windows[:2] == [(0, cut, 0), (cut - RATE // 2, 2 * cut, RATE // 2)]
+    assert windows[2][2] == RATE // 2
+    assert windows[-1][1] == 12 * RATE
+    assert chunker.stats()['forced_cuts'] == 2
@@ -0,0 +1,64 @@
+# test_voice_profiler.py
+import numpy as np
+from helpers.voice_profiler import VoiceManager
+
+
+def unit(seed, dim=256):
+    vector = np.random.default_rng(seed).normal(size=dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_cache_hit_does_no_full_index_search(tmp_path):
+    manager = VoiceManager(profiles_dir=tmp_path, embedding_mode='thread', confirm_after=1)
+    for seed in range(20):
+        manager.create_new_profile(unit(seed))
+    voice = unit(100)
+    speaker_id = manager.match_embeddings([voice])[0]
+
+    searches = []
+    for name in ('search', 'search_k'):
+        search = getattr(manager.index, name)
+        setattr(manager.index, name, lambda *args, _search=search, _name=name: searches.append(_name) or _search(*args))
+
+    noisy = voice + 0.05 * unit(101)
+    assert manager.match_embeddings([noisy / np.linalg.norm(noisy)]) == [speaker_id]
+    assert manager.stats()['cache_hits'] == 1
+    assert searches == []
+
+
+def test_merged_profiles_are_left_out_on_reload(tmp_path):
+    manager = VoiceManager(profiles_dir=tmp_path, embedding_mode='thread', confirm_after=1, min_merge_count=2)
+    voice = unit(0)
+    first = manager.create_new_profile(voice)
+    noisy = voice + 0.1 * unit(1)
+    second = manager.create_new_profile(noisy / np.linalg.norm(noisy))
+    manager.create_new_profile(unit(2))
+    # Both profiles average a single chunk, below min_merge_count
+    assert manager.merge_nearest(1) == 1
+    manager.counts[0] = manager.counts[1] = 2
+    assert manager.merge_nearest(1) == 0
+    assert manager.resolve(second) == first
+    manager.close()
+
+    reloaded = VoiceManager(profiles_dir=tmp_path, embedding_mode='thread')
+    assert reloaded.index.ids == [first, manager.index.ids[2]]
+    assert reloaded.store_rows == [0, 2]
+    reloaded.match_embeddings([unit(2)])
+    reloaded.save_profiles()
+    assert reloaded.store.load()[2].tolist() == [4, 0, 2]
+
+
+def test_resolve_maps_merged_and_unconfirmed_speakers(tmp_path):
+    manager = VoiceManager(profiles_dir=tmp_path, embedding_mode='thread', confirm_after=2, min_merge_count=1)
+    voice = unit(0)
+    first = manager.create_new_profile(voice)
+    noisy = voice + 0.1 * unit(1)
+    second = manager.create_new_profile(noisy / np.linalg.norm(noisy))
+    assert manager.merge_nearest(1) == 0
+    provisional = manager.match_embeddings([unit(2)])[0]
+    assert manager.resolve_many([first, second, provisional, "Unknown"]) == [first, first, None, None]
+
+    confirmed = manager.match_embeddings([unit(2)])[0]
+    assert confirmed == provisional
+    assert manager.resolve(provisional) == provisional
+    manager.close()